@@ -6,12 +6,14 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
+import math
 import inspect
 import uuid
 import uvicorn
 from main.tools import all_tools
 from database.store_chat import store_message, retrieve_chat_history
 from main.main import search_web, get_product_data
+from main.finder import catalog
 
 # --- init ---
 load_dotenv()
@@ -60,6 +62,18 @@ class ChatResponse(BaseModel):
     products: Optional[List[Dict[str, Any]]] = None
     end_chat: bool = False
 
+class BrowseResponse(BaseModel):
+    products: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str
+    weight: float
+
+class AutocompleteResponse(BaseModel):
+    suggestions: List[Suggestion]
+
 def initialize_session(session_id: str):
     """Initialize a new chat session"""
     sessions[session_id] = [
@@ -198,6 +212,45 @@ async def get_history(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/browse", response_model=BrowseResponse)
+def browse(brand: Optional[str] = None,
+           min_price: Optional[float] = None,
+           max_price: Optional[float] = None,
+           availability: Optional[bool] = None,
+           sort_by: str = "relevance",
+           limit: int = 50,
+           cursor: Optional[str] = None):
+    """
+    Browse the catalog page by page (pass next_cursor back as cursor).
+
+    A plain def: FastAPI runs it in its threadpool, so the blocking
+    catalog load/sync in get_engine() doesn't stall the event loop.
+    """
+    limit = max(1, min(limit, 100))
+    filters = {
+        "brand": brand,
+        "min_price": min_price,
+        "max_price": max_price,
+        "availability": availability,
+        "sort_by": sort_by,
+    }
+    try:
+        result = catalog.get_engine().browse(filters, limit=limit, search_after=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Missing prices/ratings are NaN, which the JSON response can't encode
+    products = [
+        {key: None if isinstance(value, float) and math.isnan(value) else value for key, value in product.items()}
+        for product in result.results
+    ]
+    return BrowseResponse(products=products, next_cursor=result.next_cursor)
+
+@app.get("/api/autocomplete", response_model=AutocompleteResponse)
+def autocomplete(q: str = "", limit: int = 8):
+    """Search-box completions for a partially typed query (a plain def, run in the threadpool like browse)"""
+    limit = max(1, min(limit, 20))
+    return AutocompleteResponse(suggestions=catalog.get_engine().autocomplete(q, limit=limit))
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -322,7 +322,7 @@ class ProductSearchRanker:
         order = np.argsort(-scores)[:max(pool, topk)]
         top_idx = order[:topk]
 
-        cols = [c for c in ["title", "brand", "final_price", "currency", "availability", "reviews_count", "url"] if c in self.df.columns]
+        cols = [c for c in ["title", "brand", "final_price", "currency", "availability", "reviews_count", "url", "parent_asin"] if c in self.df.columns]
         res = self.df.iloc[top_idx][cols].copy()
         res.insert(0, "score", scores[top_idx])
         res["score"] = res["score"].round(4)
@@ -0,0 +1,281 @@
+"""
+Prefix index for search-box autocomplete.
+
+Suggestions come from title word n-grams, brands and popular queries. Each
+set is held as a sorted array of suggestion strings with parallel weight and
+kind arrays, so the completions of a prefix are one contiguous range found
+by binary search; the top N of that range are picked by weight. Ranges of
+very short prefixes are large, so their answers are memoized.
+
+Catalog suggestions are weighted by the products they occur in, each
+product counting 1 + log(1 + rating_count). Popular queries are weighted by
+how often they were searched, times query_weight.
+
+The per-suggestion weights and product counts are kept, so adding or
+removing products updates them without re-reading the catalog; only the
+sorted arrays are rebuilt. Copies share the popular queries, so searches
+recorded on an engine still count after a copy of it is published.
+"""
+from bisect import bisect_left
+import copy
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Suggestion kinds, by id
+KINDS = ('query', 'brand', 'title')
+_QUERY, _BRAND, _TITLE = range(len(KINDS))
+
+# Sorts after every character a suggestion can contain
+_PREFIX_END = '\U0010ffff'
+
+
+class _SortedSuggestions:
+    """Suggestion strings in sorted order with weights, answering top-N prefix queries"""
+
+    def __init__(self, weighted: Dict[str, Tuple[float, int]], memo_prefix_length: int = 2):
+        """
+        Args:
+            weighted: suggestion -> (weight, kind id)
+            memo_prefix_length: Prefixes up to this length have their answers memoized
+        """
+        self.texts = sorted(weighted)
+        self.weights = np.fromiter((weighted[text][0] for text in self.texts), dtype=np.float64, count=len(self.texts))
+        self.kinds = np.fromiter((weighted[text][1] for text in self.texts), dtype=np.int8, count=len(self.texts))
+        self.memo_prefix_length = memo_prefix_length
+        self._memo: Dict[Tuple[str, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def top(self, prefix: str, limit: int) -> List[int]:
+        """Positions of the `limit` heaviest suggestions starting with prefix (ties alphabetical)"""
+        memoize = len(prefix) <= self.memo_prefix_length
+        if memoize and (prefix, limit) in self._memo:
+            return self._memo[(prefix, limit)]
+
+        start = bisect_left(self.texts, prefix)
+        end = bisect_left(self.texts, prefix + _PREFIX_END, start)
+        weights = self.weights[start:end]
+        if len(weights) > limit:
+            threshold = np.partition(weights, len(weights) - limit)[len(weights) - limit]
+            candidates = np.flatnonzero(weights >= threshold)
+        else:
+            candidates = np.arange(len(weights))
+        # Candidates are in alphabetical order, so the stable sort breaks ties alphabetically
+        positions = (start + candidates[np.argsort(-weights[candidates], kind='stable')][:limit]).tolist()
+
+        if memoize:
+            self._memo[(prefix, limit)] = positions
+        return positions
+
+
+class _CatalogStats:
+    """Product weight and product count of every title n-gram and brand"""
+
+    def __init__(self):
+        self.ngram_weights: Dict[str, float] = {}
+        self.ngram_products: Dict[str, int] = {}
+        self.brand_weights: Dict[str, float] = {}
+        self.brand_products: Dict[str, int] = {}
+
+    def copy(self) -> '_CatalogStats':
+        clone = _CatalogStats()
+        clone.ngram_weights = dict(self.ngram_weights)
+        clone.ngram_products = dict(self.ngram_products)
+        clone.brand_weights = dict(self.brand_weights)
+        clone.brand_products = dict(self.brand_products)
+        return clone
+
+    def count(self, title_tokens: Sequence[List[str]], brands: Sequence[str], rating_counts: np.ndarray,
+              max_ngram: int, sign: int = 1):
+        """Add (sign 1) or remove (sign -1) the contributions of products"""
+        product_weights = (1.0 + np.log1p(np.maximum(rating_counts, 0))).tolist()
+        for tokens, weight in zip(title_tokens, product_weights):
+            seen = set()
+            for n in range(1, max_ngram + 1):
+                for i in range(len(tokens) - n + 1):
+                    seen.add(' '.join(tokens[i:i + n]) if n > 1 else tokens[i])
+            for ngram in seen:
+                self._add(self.ngram_weights, self.ngram_products, ngram, sign * weight, sign)
+        for brand, weight in zip(brands, product_weights):
+            if brand:
+                self._add(self.brand_weights, self.brand_products, brand, sign * weight, sign)
+
+    @staticmethod
+    def _add(weights: Dict[str, float], products: Dict[str, int], key: str, weight: float, count: int):
+        remaining = products.get(key, 0) + count
+        if remaining > 0:
+            weights[key] = weights.get(key, 0.0) + weight
+            products[key] = remaining
+        else:
+            weights.pop(key, None)
+            products.pop(key, None)
+
+
+class _PopularQueries:
+    """Search counts of normalized queries, shared by an AutocompleteIndex and its copies"""
+
+    def __init__(self, query_weight: float, max_queries: int, query_refresh: float):
+        self.query_weight = query_weight
+        self.max_queries = max_queries
+        self.query_refresh = query_refresh
+        self.counts: Dict[str, int] = {}
+        self.suggestions = _SortedSuggestions({})
+        self._dirty = False
+        self._sorted_at = 0.0
+        # Searches on several threads record queries; the sorted arrays are
+        # replaced, never modified, so completing needs no lock
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, query: str):
+        with self._lock:
+            self.counts[query] = self.counts.get(query, 0) + 1
+            self._dirty = True
+            if len(self.counts) > self.max_queries:
+                ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+                self.counts = dict(ranked[:self.max_queries // 2])
+
+    def refresh(self, now: Optional[float] = None):
+        """Re-sort the queries if they changed and the last sort is old enough"""
+        now = time.monotonic() if now is None else now
+        if not self._dirty or now - self._sorted_at < self.query_refresh:
+            return
+        with self._lock:
+            weighted = {query: (count * self.query_weight, _QUERY) for query, count in self.counts.items()}
+            self._dirty = False
+            self._sorted_at = now
+        self.suggestions = _SortedSuggestions(weighted)
+
+
+class AutocompleteIndex:
+    """Top-N completions of a typed prefix over catalog suggestions and popular queries"""
+
+    def __init__(self,
+                 max_ngram: int = 3,
+                 min_ngram_docs: int = 2,
+                 query_weight: float = 5.0,
+                 max_queries: int = 10000,
+                 query_refresh: float = 10.0):
+        """
+        Args:
+            max_ngram: Longest title n-gram suggested (in words)
+            min_ngram_docs: Multi-word n-grams must occur in this many products
+            query_weight: Weight of one search of a popular query
+            max_queries: Distinct queries tracked; the least searched half is
+                         dropped when exceeded
+            query_refresh: Seconds between re-sorts of the popular queries
+        """
+        self.max_ngram = max_ngram
+        self.min_ngram_docs = min_ngram_docs
+
+        self._stats: Optional[_CatalogStats] = None  # None until load_catalog
+        self._stats_changed = False
+        self._catalog = _SortedSuggestions({})
+        self._queries = _PopularQueries(query_weight, max_queries, query_refresh)
+
+    @property
+    def catalog_loaded(self) -> bool:
+        """Whether load_catalog ran, so that products can be added and removed"""
+        return self._stats is not None
+
+    @property
+    def catalog_current(self) -> bool:
+        """Whether the catalog suggestions reflect every product added and removed"""
+        return self._stats is not None and not self._stats_changed
+
+    def copy(self) -> 'AutocompleteIndex':
+        """Copy whose catalog changes leave this index unchanged; both count the same popular queries"""
+        clone = copy.copy(self)
+        if self._stats is not None:
+            clone._stats = self._stats.copy()
+        return clone
+
+    def load_catalog(self, title_tokens: Sequence[List[str]], brands: Sequence[str], rating_counts: np.ndarray):
+        """
+        Replace the catalog suggestions.
+
+        Args:
+            title_tokens: Analyzed title tokens of each product
+            brands: Normalized brand of each product ('' if missing)
+            rating_counts: Rating count of each product
+        """
+        stats = _CatalogStats()
+        stats.count(title_tokens, brands, rating_counts, self.max_ngram)
+        catalog = self._sorted_catalog(stats)
+        self._stats, self._stats_changed, self._catalog = stats, False, catalog
+
+    def unload_catalog(self):
+        """Drop the catalog suggestions (until the next load_catalog); popular queries are kept"""
+        self._stats = None
+        self._stats_changed = False
+        self._catalog = _SortedSuggestions({})
+
+    def add_products(self, title_tokens: Sequence[List[str]], brands: Sequence[str], rating_counts: np.ndarray):
+        """Count new products (same arguments as load_catalog); refresh_catalog publishes them"""
+        self._stats.count(title_tokens, brands, rating_counts, self.max_ngram)
+        self._stats_changed = True
+
+    def remove_products(self, title_tokens: Sequence[List[str]], brands: Sequence[str], rating_counts: np.ndarray):
+        """Uncount products as they were added; refresh_catalog publishes the change"""
+        self._stats.count(title_tokens, brands, rating_counts, self.max_ngram, sign=-1)
+        self._stats_changed = True
+
+    def refresh_catalog(self):
+        """Rebuild the sorted catalog suggestions after products were added or removed"""
+        if self._stats is None or not self._stats_changed:
+            return
+        self._stats_changed = False
+        self._catalog = self._sorted_catalog(self._stats)
+
+    def _sorted_catalog(self, stats: _CatalogStats) -> _SortedSuggestions:
+        weighted: Dict[str, Tuple[float, int]] = {
+            ngram: (weight, _TITLE) for ngram, weight in stats.ngram_weights.items()
+            if ' ' not in ngram or stats.ngram_products[ngram] >= self.min_ngram_docs
+        }
+        for brand, weight in stats.brand_weights.items():
+            # A brand outranks the same text as a title n-gram
+            weighted[brand] = (max(weight, weighted.get(brand, (0.0, _BRAND))[0]), _BRAND)
+        return _SortedSuggestions(weighted)
+
+    def record_query(self, query: str):
+        """Count a search for a normalized query that found results"""
+        if not query:
+            return
+        self._queries.record(query)
+
+    def complete(self, prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Completions of a normalized prefix, heaviest first.
+
+        Returns:
+            Dicts with the suggestion 'text', its 'kind' (query, brand or title)
+            and its 'weight'; each text appears once, under its heaviest entry
+        """
+        if not prefix or limit <= 0:
+            return []
+        self._queries.refresh()
+
+        completions: Dict[str, Tuple[float, int]] = {}
+        for suggestions in (self._queries.suggestions, self._catalog):
+            for position in suggestions.top(prefix, limit):
+                text = suggestions.texts[position]
+                weight = float(suggestions.weights[position])
+                if text not in completions or weight > completions[text][0]:
+                    completions[text] = (weight, int(suggestions.kinds[position]))
+
+        ranked = sorted(completions.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+        return [{'text': text, 'kind': KINDS[kind], 'weight': round(weight, 2)} for text, (weight, kind) in ranked]
+
+    def num_suggestions(self) -> int:
+        return len(self._catalog) + len(self._queries.suggestions)
@@ -0,0 +1,63 @@
+"""
+Sparse-matrix BM25 scoring for batches of queries.
+
+The index is laid out once as a term x doc matrix of BM25 contributions.
+A batch of queries becomes a query x term matrix of term counts, and one
+sparse product yields the BM25 score of every (query, matching doc) pair.
+"""
+from typing import Dict, List, Mapping, Tuple
+import numpy as np
+import scipy.sparse as sp
+from main.postings import flatten_postings
+from utils import calculate_idf, calculate_bm25_term_score
+
+
+def bm25_matrix(postings: Mapping,
+                term_doc_freq: Dict[str, int],
+                doc_lengths: np.ndarray,
+                avg_doc_length: float,
+                total_docs: int) -> Tuple[sp.csr_matrix, Dict[str, int]]:
+    """
+    Term x doc matrix of BM25 term contributions.
+
+    Args:
+        postings: term -> {doc_id: tf}
+        term_doc_freq: Document frequency per term
+        doc_lengths: Length per doc id (one matrix column each, deleted ones included)
+        avg_doc_length: Average document length
+        total_docs: Document count for IDF
+
+    Returns:
+        (matrix, term -> matrix row)
+    """
+    terms, offsets, doc_ids, tfs = flatten_postings(postings)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    lengths = np.asarray(doc_lengths, dtype=np.float64)
+
+    # Same helpers, and so the same floating point results, as term-at-a-time scoring
+    idf = np.array([calculate_idf(term_doc_freq.get(term, 0), total_docs) for term in terms],
+                   dtype=np.float64)
+    weights = calculate_bm25_term_score(
+        np.asarray(tfs, dtype=np.float64),
+        np.repeat(idf, np.diff(offsets)),
+        lengths[doc_ids],
+        avg_doc_length
+    )
+
+    matrix = sp.csr_matrix((weights, doc_ids, offsets), shape=(len(terms), len(lengths)))
+    return matrix, {term: i for i, term in enumerate(terms)}
+
+
+def query_matrix(query_terms: List[List[str]], vocabulary: Dict[str, int]) -> sp.csr_matrix:
+    """Query x term matrix of term counts (repeated query terms count once per occurrence)"""
+    rows, cols = [], []
+    for row, terms in enumerate(query_terms):
+        for term in terms:
+            col = vocabulary.get(term)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    data = np.ones(len(rows), dtype=np.float64)
+    # Duplicate (row, col) entries are summed into counts
+    return sp.csr_matrix((data, (rows, cols)), shape=(len(query_terms), len(vocabulary)))
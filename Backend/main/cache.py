@@ -0,0 +1,167 @@
+"""
+Bounded result cache for search responses.
+
+Entries are evicted least-recently-used, but a new entry only displaces a
+victim that has been requested at most as often (frequency-aware admission),
+so a burst of one-off queries cannot flush the popular ones. Every entry
+carries a TTL and the index generation it was computed against; entries
+from an older generation are dropped on access.
+
+Every operation holds the cache's lock, so searches on several threads
+(and index updates invalidating entries) may share one cache.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, NamedTuple, Optional
+import threading
+import time
+
+
+class _Entry(NamedTuple):
+    value: Any
+    generation: int
+    expires_at: float
+    size_bytes: int
+
+
+class ResultCache:
+    """
+    LRU cache bounded by entry count and estimated memory, with TTL,
+    generation checks and frequency-aware admission.
+    """
+
+    def __init__(self, max_entries: int = 100, ttl: float = 300.0, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Maximum number of cached entries (0 disables caching)
+            ttl: Seconds an entry stays valid
+            max_bytes: Upper bound on the summed size estimates of all entries
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._bytes = 0
+
+        # Access frequencies, halved periodically so old popularity fades
+        self._frequency: Dict[Hashable, int] = {}
+        self._accesses = 0
+        self._frequency_window = max(10 * max_entries, 100)
+
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """Return the live value for key, or None on a miss"""
+        with self._lock:
+            self._record_access(key)
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not self._is_live(entry, generation):
+                self._remove(key)
+                self.expirations += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return the stored value without touching recency, frequency or validity"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def put(self, key: Hashable, value: Any, generation: int, size_bytes: int = 0) -> bool:
+        """
+        Insert a value computed against the given index generation.
+
+        Returns:
+            Whether the entry was admitted
+        """
+        with self._lock:
+            if self.max_entries <= 0 or size_bytes > self.max_bytes:
+                self.rejections += 1
+                return False
+
+            if key in self._entries:
+                self._remove(key)
+
+            # Make room, oldest first; expired and stale entries always go
+            frequency = self._frequency.get(key, 0)
+            while self._entries and (len(self._entries) >= self.max_entries or
+                                     self._bytes + size_bytes > self.max_bytes):
+                victim_key, victim = next(iter(self._entries.items()))
+                if self._is_live(victim, generation):
+                    if self._frequency.get(victim_key, 0) > frequency:
+                        self.rejections += 1
+                        return False
+                    self.evictions += 1
+                else:
+                    self.expirations += 1
+                self._remove(victim_key)
+
+            self._entries[key] = _Entry(value, generation, time.monotonic() + self.ttl, size_bytes)
+            self._bytes += size_bytes
+            return True
+
+    def discard(self, key: Hashable):
+        """Remove key if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def snapshot(self) -> Dict[Hashable, Any]:
+        """The stored values by key, taken atomically"""
+        with self._lock:
+            return {key: entry.value for key, entry in self._entries.items()}
+
+    def carry_forward(self, kept: Dict[Hashable, Any], from_generation: int, to_generation: int):
+        """
+        Re-stamp entries still valid after an index change so they survive the generation bump.
+
+        Only the entries in kept (a snapshot) are re-stamped, and only if they
+        were not replaced since: a copied engine shares this cache, so the
+        engine it was copied from may have put results meanwhile.
+        """
+        with self._lock:
+            for key, value in kept.items():
+                entry = self._entries.get(key)
+                if entry is not None and entry.value is value and entry.generation == from_generation:
+                    self._entries[key] = entry._replace(generation=to_generation)
+
+    def clear(self):
+        """Drop all entries and access history"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._frequency.clear()
+            self._accesses = 0
+
+    def _is_live(self, entry: _Entry, generation: int) -> bool:
+        return entry.generation == generation and entry.expires_at > time.monotonic()
+
+    def _remove(self, key: Hashable):
+        self._bytes -= self._entries.pop(key).size_bytes
+
+    def _record_access(self, key: Hashable):
+        self._frequency[key] = self._frequency.get(key, 0) + 1
+        self._accesses += 1
+        if self._accesses >= self._frequency_window:
+            # Age: halve every count, forgetting keys that fall to zero
+            self._frequency = {k: count // 2 for k, count in self._frequency.items() if count > 1}
+            self._accesses = 0
@@ -1,32 +1,192 @@
 import pandas as pd
-from typing import Dict, List, Set, Tuple, Optional, Any
+import numpy as np
+from typing import Dict, FrozenSet, List, NamedTuple, Set, Tuple, Optional, Any
 from collections import defaultdict, OrderedDict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import time
 import json
+import math
+import base64
+import binascii
+import copy
+import logging
+import sys
+import threading
 from crawler.crawl import crawl
 from supabase import create_client, Client
 import os
+from main.indexer import build_inverted_index, index_partition, searchable_fields
+from main.snapshot import save_snapshot, load_snapshot
+from main.postings import CompactPostings, DocLengths
+from main.positions import TitlePositions, word_tokens, has_bounded_occurrence
+from main.metrics import LatencyTracker, ShardedCounter, StageTimer
+from main.rows import ProductRow, RESULT_KEYS
+from main.topk import TermScores, accumulate, max_score_top_k, min_score
+from main.cache import ResultCache
+from main.similarity import MinHashLSH
+from main.spelling import SpellingIndex
+from main.autocomplete import AutocompleteIndex
+from main.batch import bm25_matrix, query_matrix
 from utils import (
-    tokenize_text,
-    normalize_score,
-    calculate_bm25_score,
-    detect_exact_matches,
-    calculate_price_competitiveness,
+    Analyzer,
+    normalize_query,
+    calculate_idf,
+    calculate_bm25_term_score,
     calculate_popularity_score
 )
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")  # or your Supabase URL
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # or your Supabase anon key
+CATALOG_TABLE = 'testing'
+CATALOG_SYNC_INTERVAL = float(os.getenv("CATALOG_SYNC_INTERVAL", "60"))  # Seconds between delta syncs
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))  # Seconds a cached search stays valid
+SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))  # Searches at least this slow are logged
+
+# EcommerceSearchEngine.copy(): attributes the copy shares with the original,
+# and memos it rebuilds lazily instead of copying
+_SHARED_ON_COPY = frozenset({
+    'analyzer', 'cache', 'latency', '_searches', '_cache_hit_count', '_timed_searches', '_search_seconds'
+})
+_REBUILT_ON_COPY = frozenset({
+    '_memo_lock', '_spelling', '_term_scores_cache', '_filter_bitmaps', '_sort_orders',
+    '_live_bitmap', '_bm25_matrix', '_columns', '_brand_labels', 'autocomplete_index'
+})
+
+# Facets search(facets=[...]) can count over the full match set
+FACETS = ('brand', 'price')
+FACET_SIZE = 20  # Brands listed per brand facet, most frequent first
+PRICE_FACET_EDGES = (25.0, 50.0, 100.0, 200.0, 500.0, 1000.0)  # Price bucket boundaries
+
+# Multi-signal ranking weights (each signal is scored 0-100)
+RANKING_WEIGHTS = {
+    'bm25': 0.40,
+    'exact_match': 0.20,
+    'brand': 0.15,
+    'popularity': 0.15,
+    'price': 0.10,
+}
 
 @dataclass
 class SearchResult:
     """Container for search results with metadata"""
-    results: List[Dict]
+    results: List[Dict]  # product dicts, or ProductRow views when fields were requested
     search_time: float
     total_results: int
     from_cache: bool
     cache_hit_rate: float
+    next_cursor: Optional[str] = None  # browse(): pass as search_after for the next page
+    stage_timings: Dict[str, float] = field(default_factory=dict)  # milliseconds per search stage
+    corrected_query: Optional[str] = None  # query actually run, when misspelled terms were corrected
+    facets: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)  # facet -> buckets over all matches
+
+@dataclass(frozen=True)
+class CachedSearch:
+    """Immutable snapshot of a search response held by the result cache"""
+    results: Tuple[Tuple[Tuple[str, Any], ...], ...]  # products as (field, value) pairs
+    search_time: float
+    terms: FrozenSet[str]  # query terms, for selective invalidation
+    doc_ids: FrozenSet[int]  # returned doc ids, for selective invalidation
+    facets: Tuple[Tuple[str, Tuple[Tuple[Tuple[str, Any], ...], ...]], ...] = ()  # facet buckets as (field, value) pairs
+    
+    @classmethod
+    def from_results(cls,
+                     results: List[Dict],
+                     search_time: float,
+                     terms: List[str],
+                     facets: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> 'CachedSearch':
+        return cls(
+            results=tuple(tuple(product.items()) for product in results),
+            search_time=search_time,
+            terms=frozenset(terms),
+            doc_ids=frozenset(product['id'] for product in results),
+            facets=tuple(
+                (name, tuple(tuple(bucket.items()) for bucket in buckets))
+                for name, buckets in (facets or {}).items()
+            ),
+        )
+    
+    def to_result(self, cache_hit_rate: float) -> SearchResult:
+        """Fresh, caller-owned SearchResult built from the snapshot"""
+        return SearchResult(
+            results=[dict(product) for product in self.results],
+            search_time=self.search_time,
+            total_results=len(self.results),
+            from_cache=True,
+            cache_hit_rate=cache_hit_rate,
+            facets={name: [dict(bucket) for bucket in buckets] for name, buckets in self.facets}
+        )
+    
+    def size_bytes(self) -> int:
+        """Rough memory footprint of the snapshot"""
+        size = sys.getsizeof(self.results) + sys.getsizeof(self.facets)
+        for product in self.results + tuple(bucket for _, buckets in self.facets for bucket in buckets):
+            size += sys.getsizeof(product)
+            for pair in product:
+                size += sys.getsizeof(pair) + sys.getsizeof(pair[1])
+        return size
+
+@dataclass
+class FeatureStore:
+    """
+    Columnar per-document ranking features, aligned with doc ids.
+    
+    Built once in load_data so the ranker never touches the DataFrame
+    or recomputes catalog-wide aggregates at query time.
+    """
+    price: np.ndarray = field(default_factory=lambda: np.empty(0))
+    rating_count: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    popularity: np.ndarray = field(default_factory=lambda: np.empty(0))  # log-popularity score (0-100)
+    price_score: np.ndarray = field(default_factory=lambda: np.empty(0))  # price competitiveness (0-100)
+    brand_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    brands: List[str] = field(default_factory=list)  # brand id -> lowercased brand ('' if missing)
+    titles: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=object))  # lowercased titles
+    descriptions: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=object))  # lowercased descriptions
+
+class CollectionStats(NamedTuple):
+    """Catalog-wide statistics behind BM25 and the catalog-relative feature scores"""
+    doc_freq: Dict[str, int]  # term -> number of documents containing it
+    num_docs: int
+    total_doc_length: int  # summed document lengths (avgdl = total_doc_length / num_docs)
+    price_range: Tuple[float, float]  # as get_price_range()
+    max_rating_count: int
+    
+    @classmethod
+    def merge(cls, parts: List['CollectionStats']) -> 'CollectionStats':
+        """Statistics of the union of disjoint document sets"""
+        doc_freq: Dict[str, int] = {}
+        for part in parts:
+            for term, df in part.doc_freq.items():
+                doc_freq[term] = doc_freq.get(term, 0) + df
+        
+        # get_price_range() reads the ends of the price index, where missing prices sort last
+        min_prices = [part.price_range[0] for part in parts if not math.isnan(part.price_range[0])]
+        max_prices = [part.price_range[1] for part in parts]
+        max_price = math.nan if any(math.isnan(price) for price in max_prices) else max(max_prices)
+        
+        return cls(
+            doc_freq=doc_freq,
+            num_docs=sum(part.num_docs for part in parts),
+            total_doc_length=sum(part.total_doc_length for part in parts),
+            price_range=(min(min_prices) if min_prices else math.nan, max_price),
+            max_rating_count=max(part.max_rating_count for part in parts),
+        )
+
+class SortOrder(NamedTuple):
+    """Global doc-id ordering for one sort_by option"""
+    doc_ids: np.ndarray  # doc ids in sort order, ties by doc id
+    ranks: np.ndarray  # doc id -> dense rank of its sort key (equal keys share a rank)
+    keys: np.ndarray  # rank -> sort key (distinct keys, ascending)
+    rank_starts: np.ndarray  # rank -> position in doc_ids where that rank begins
+
+# Sort keys of the non-relevance sort_by options; missing prices sort last
+SORT_KEYS = {
+    'price_low': lambda features: features.price,
+    'price_high': lambda features: -features.price,
+    'reviews': lambda features: -features.rating_count,
+}
 
 class EcommerceSearchEngine:
     """
@@ -35,143 +195,834 @@ class EcommerceSearchEngine:
     Features:
     - BM25 algorithm (superior to TF-IDF)
     - Multi-signal ranking (relevance + exact matches + brand + popularity + price)
-    - Inverted index for fast search
-    - LRU caching system
+    - Inverted index with term-frequency postings for fast search
+    - Result cache with normalized keys, TTL and index-generation checks
     - Multiple specialized indexes
+    
+    Searches may run concurrently on several threads. Index updates
+    (load_data, add_products, update_product, ...) must not overlap with
+    searches on the same engine: apply them to copy() and publish the copy
+    by swapping references, as CatalogSync does.
     """
     
-    def __init__(self, cache_size: int = 100):
+    def __init__(self,
+                 cache_size: int = 100,
+                 index_workers: int = 1,
+                 index_batch_size: int = 10000,
+                 cache_ttl: float = SEARCH_CACHE_TTL,
+                 cache_max_bytes: int = SEARCH_CACHE_MAX_BYTES,
+                 slow_query_ms: Optional[float] = SLOW_QUERY_MS,
+                 analyzer: Optional[Analyzer] = None,
+                 typo_tolerance: bool = True):
         # Core data structures
         self.products = pd.DataFrame()
-        self.inverted_index: Dict[str, Set[int]] = defaultdict(set)
+        # Tokenizer for documents and queries; pass one in to share its cache (e.g. with the crawler)
+        self.analyzer = analyzer if analyzer is not None else Analyzer()
+        # Postings: term -> {doc_id: term frequency}, as compact delta-encoded arrays
+        self.inverted_index = CompactPostings()
         self.brand_index: Dict[str, List[int]] = defaultdict(list)
-        self.price_index: List[Tuple[int, float]] = []
+        # Prices in ascending order (unpriced NaNs last) and the doc id of each
+        self.price_index_prices = np.empty(0, dtype=np.float64)
+        self.price_index_docs = np.empty(0, dtype=np.int64)
+        self.asin_index: Dict[str, int] = {}  # ASIN -> doc id
         
         # BM25 specific data
         self.term_doc_freq: Dict[str, int] = {}  # Document frequency for each term
-        self.doc_lengths: Dict[int, int] = {}  # Length of each document
+        self.doc_lengths = DocLengths()  # Length of each document, one flat array
         self.avg_doc_length: float = 0.0
         
-        # Caching system
-        self.cache = OrderedDict()
+        # Columnar ranking features
+        self.features = FeatureStore()
+        # Title token positions for the exact/phrase match signals
+        self.title_positions = TitlePositions()
+        self._feature_bounds: Tuple[float, float, int] = (0.0, 0.0, 0)  # min/max price, max rating count
+        
+        # Deleted doc ids; their rows are reclaimed by compact()
+        self.deleted_docs: Set[int] = set()
+        self.compaction_threshold = 0.25  # Compact once this fraction of rows is deleted
+        self.postings_repack_ratio = 0.125  # Repack once this fraction of postings sits in edited dicts
+        
+        # Guards the recency bookkeeping of the LRU memos below, which concurrent searches share
+        self._memo_lock = threading.Lock()
+        
+        # Per-term BM25 contribution arrays for top-k retrieval (LRU)
+        self._term_scores_cache: OrderedDict = OrderedDict()
+        self.term_scores_cache_size = 4096
+        
+        # Per-value filter bitmaps over doc ids, e.g. ('availability', True) (LRU)
+        self._filter_bitmaps: OrderedDict = OrderedDict()
+        self.filter_bitmaps_size = 256
+        
+        # Global orderings for price/review sorts, rebuilt lazily after updates
+        self._sort_orders: Dict[str, SortOrder] = {}
+        self._live_bitmap: Optional[np.ndarray] = None  # doc id -> not deleted
+        # Product column arrays behind projected (fields=...) results
+        self._columns: Dict[str, np.ndarray] = {}
+        # Facet settings, and brand id -> brand as spelled in the catalog (filterable by filters['brand'])
+        self.facet_size = FACET_SIZE
+        self.price_facet_edges = PRICE_FACET_EDGES
+        self._brand_labels: Optional[List[str]] = None
+        # Bumped whenever doc ids are renumbered, invalidating browse cursors
+        self.doc_id_epoch = 0
+        
+        # Similar-product lookup: MinHash/LSH candidates, optional precomputed neighbours
+        self.similarity_index: Optional[MinHashLSH] = None
+        
+        # Typo correction of out-of-vocabulary query terms; the deletion index
+        # is built on the first misspelled term and extended as terms are added
+        self.typo_tolerance = typo_tolerance
+        self._spelling: Optional[SpellingIndex] = None
+        
+        # Search-box completions; catalog suggestions are loaded on first use, then
+        # updated with every product change and re-sorted by refresh_autocomplete
+        self.autocomplete_index = AutocompleteIndex()
+        
+        # Term x doc BM25 matrix for search_many, built on first use after an index change
+        self._bm25_matrix = None
+        
+        # Catalog-wide statistics to score against when this engine holds one shard of a catalog
+        self.collection_stats: Optional[CollectionStats] = None
+        self.neighbours: Optional[Dict[int, List[Tuple[int, float]]]] = None
+        self._neighbours_limit = 0
+        self._neighbours_generation = -1
+        
+        # Caching system; entries are tied to the index generation they were computed on
+        self.cache = ResultCache(max_entries=cache_size, ttl=cache_ttl, max_bytes=cache_max_bytes)
         self.cache_size = cache_size
-        self.cache_hits = 0
-        self.total_searches = 0
+        self.index_generation = 0
+        # Search counters, bumped by concurrent searches without a shared lock
+        self._searches = ShardedCounter()
+        self._cache_hit_count = ShardedCounter()
+        self._timed_searches = ShardedCounter()  # searches that ran (not served from cache)
+        self._search_seconds = ShardedCounter()
+        
+        # Index build settings
+        self.index_workers = index_workers
+        self.index_batch_size = index_batch_size
+        
+        # Content hash of the snapshot this index was saved to / loaded from
+        self.content_hash: Optional[str] = None
         
         # Performance metrics
         self.index_build_time = 0
-        self.avg_search_time = 0
+        self.index_build_throughput = 0.0  # Documents indexed per second
+        # Rolling per-stage latency histograms and the slow-query log (None disables the log)
+        self.latency = LatencyTracker(slow_query_ms=slow_query_ms)
         
+    @property
+    def total_searches(self) -> int:
+        return int(self._searches.value())
+    
+    @property
+    def cache_hits(self) -> int:
+        return int(self._cache_hit_count.value())
+    
+    @property
+    def avg_search_time(self) -> float:
+        """Mean seconds per search that was not served from the cache"""
+        timed = self._timed_searches.value()
+        return self._search_seconds.value() / timed if timed else 0.0
+    
     def load_data(self, csv_path: str = None, df: pd.DataFrame = None):
-        """Load product data from CSV or DataFrame"""
+        """
+        Load product data from CSV or DataFrame.
+        
+        Rows are re-indexed 0..N-1 so that doc ids double as positions
+        into the columnar feature arrays.
+        """
         start_time = time.time()
         
         if csv_path:
             self.products = pd.read_csv(csv_path)
         elif df is not None:
-            self.products = df
+            self.products = df.reset_index(drop=True)
         else:
             raise ValueError("Either csv_path or df must be provided")
         
         # Ensure required columns exist
         self._validate_data()
+        self.deleted_docs = set()
+        self.doc_id_epoch += 1
         
         # Build all indexes
         self._build_indexes()
+        self._build_features()
+        # Built on the first similarity search, so loading doesn't pay for MinHash signatures
+        self.similarity_index = None
+        self.autocomplete_index.unload_catalog()
+        self._on_index_change()
+        self._build_sort_orders()
         
         self.index_build_time = time.time() - start_time
+        if self.index_build_time > 0:
+            self.index_build_throughput = len(self.products) / self.index_build_time
     
-    def _validate_data(self):
-        """Validate that required columns exist"""
+    def save(self, path: str) -> str:
+        """
+        Save the built index to a versioned binary snapshot.
+        
+        Args:
+            path: Destination file path
+            
+        Returns:
+            Content hash of the snapshot (pass it to load() to reject stale files)
+        """
+        # Snapshots store dense doc ids; compact a copy, so this engine keeps
+        # serving with its doc ids (and browse cursors) unchanged
+        engine = self
+        if self.deleted_docs:
+            engine = self.copy()
+            engine.cache = ResultCache(max_entries=0)  # compact() clears the cache, which copies share
+            engine.compact()
+        self.content_hash = save_snapshot(engine, path)
+        return self.content_hash
+    
+    @classmethod
+    def load(cls,
+             path: str,
+             cache_size: int = 100,
+             verify: bool = True,
+             expected_hash: Optional[str] = None) -> 'EcommerceSearchEngine':
+        """
+        Load an engine from a snapshot written by save().
+        
+        Postings, doc lengths, feature columns and title positions are
+        memory-mapped rather than rebuilt, so a fresh process gets a warm
+        index without re-indexing.
+        
+        Args:
+            path: Snapshot file path
+            cache_size: Search result cache size
+            verify: Recompute the content hash and reject corrupted files
+            expected_hash: Reject the snapshot unless its content hash matches
+        
+        Returns:
+            Ready-to-search engine
+        
+        Raises:
+            ValueError: If the file is not a snapshot, has a different schema
+                        version, is corrupted, or does not match expected_hash
+        """
+        start_time = time.time()
+        snapshot = load_snapshot(path, verify=verify, expected_hash=expected_hash)
+        
+        engine = cls(cache_size=cache_size)
+        engine.products = snapshot['products']
+        
+        engine.inverted_index = snapshot['postings']
+        engine.term_doc_freq = engine.inverted_index.doc_freqs()
+        engine.doc_lengths = DocLengths(snapshot['doc_lengths'])
+        engine.avg_doc_length = snapshot['meta']['avg_doc_length']
+        engine._build_catalog_indexes()
+        
+        features = snapshot['features']
+        engine.features = FeatureStore(
+            price=engine.products['price'].astype(float).to_numpy(),
+            rating_count=cls._rating_counts(engine.products),
+            popularity=features['popularity'],
+            price_score=features['price_score'],
+            brand_ids=features['brand_ids'],
+            brands=features['brands'],
+            titles=engine._lowercased('title'),
+            descriptions=engine._lowercased('product_description'),
+        )
+        engine.title_positions = snapshot['title_positions']
+        
+        min_price, max_price = engine.get_price_range()
+        engine._feature_bounds = (min_price, max_price, int(engine.features.rating_count.max(initial=0)))
+        engine._build_sort_orders()
+        engine.content_hash = snapshot['content_hash']
+        engine.index_build_time = time.time() - start_time
+        return engine
+    
+    def _validate_data(self, products: Optional[pd.DataFrame] = None):
+        """Validate that required columns exist (on self.products by default)"""
+        if products is None:
+            products = self.products
+        
         required_columns = ['title', 'price', 'brand']
         for col in required_columns:
-            if col not in self.products.columns:
+            if col not in products.columns:
                 raise ValueError(f"Missing required column: {col}")
         
         # Add optional columns with defaults if missing
-        if 'product_description' not in self.products.columns:
-            self.products['product_description'] = ''
-        if 'rating_count' not in self.products.columns:
-            self.products['rating_count'] = 0
-        if 'availability' not in self.products.columns:
-            self.products['availability'] = True
+        if 'product_description' not in products.columns:
+            products['product_description'] = ''
+        if 'rating_count' not in products.columns:
+            products['rating_count'] = 0
+        if 'availability' not in products.columns:
+            products['availability'] = True
     
-    def _build_indexes(self):
-        """Build all search indexes including BM25 data structures"""
-        total_length = 0
+    def copy(self) -> 'EcommerceSearchEngine':
+        """
+        Independent copy of the index, for copy-on-write updates.
         
-        for idx, row in self.products.iterrows():
-            # Get searchable text
-            searchable_text = f"{row['title']} {row['product_description']} {row['brand']}"
-            tokens = tokenize_text(searchable_text)
-            
-            # Store document length
-            self.doc_lengths[idx] = len(tokens)
-            total_length += len(tokens)
+        Searches may keep running on this engine while the copy is updated
+        (add_products, update_product, ...); the copy is then published with
+        one reference swap (see CatalogSync), so no search ever reads a
+        partly applied update.
+        
+        The copy shares the analyzer, result cache, search counters and
+        latency histograms with this engine, so statistics and still-valid
+        cached results carry over; the spelling and autocomplete indexes are
+        copied (popular queries stay shared), and other memos derived from
+        the index start empty.
+        """
+        clone = copy.copy(self)
+        # Containers of immutable entries: a shallow copy is a full copy, and much faster
+        memo: Dict[int, Any] = {
+            id(value): value.copy()
+            for value in (self.features.titles, self.features.descriptions)
+        }
+        for name, value in vars(self).items():
+            if name not in _SHARED_ON_COPY and name not in _REBUILT_ON_COPY:
+                setattr(clone, name, copy.deepcopy(value, memo))
+        clone._memo_lock = threading.Lock()
+        # Extended by the copy's updates like the original's, instead of rebuilt on a search
+        clone._spelling = self._spelling.copy() if self._spelling is not None else None
+        clone.autocomplete_index = self.autocomplete_index.copy()
+        clone._reset_memos()
+        return clone
+    
+    def add_products(self, df: pd.DataFrame) -> List[int]:
+        """
+        Index new products into the live index without a full rebuild.
+        
+        Only the new rows are tokenized; their postings are appended to the
+        existing ones and the catalog-relative feature scores are refreshed.
+        
+        Args:
+            df: New products (same columns as load_data)
             
-            # Build inverted index and count term document frequency
-            unique_terms = set(tokens)
-            for term in unique_terms:
-                self.inverted_index[term].add(idx)
-                self.term_doc_freq[term] = self.term_doc_freq.get(term, 0) + 1
+        Returns:
+            Doc ids assigned to the new products
+        """
+        new_products = df.reset_index(drop=True)
+        self._validate_data(new_products)
+        if new_products.empty:
+            return []
+        
+        start_id = len(self.products)
+        self.products = pd.concat([self.products, new_products], ignore_index=True)
+        doc_ids = list(range(start_id, len(self.products)))
+        
+        # Postings, document frequencies and lengths for the new rows only
+        self._ensure_mutable()
+        postings, doc_lengths = index_partition(start_id, searchable_fields(new_products), self.analyzer)
+        for term, term_postings in postings.items():
+            self.inverted_index.edit(term).update(term_postings)
+            if self._spelling is not None and term not in self.term_doc_freq:
+                self._spelling.add(term)
+            self.term_doc_freq[term] = self.term_doc_freq.get(term, 0) + len(term_postings)
+        self.doc_lengths.extend(doc_lengths)
+        self._update_avg_doc_length()
+        self._repack_postings()
+        
+        self._index_catalog_fields(doc_ids)
+        
+        self._append_features(new_products)
+        self.title_positions.repack_if_needed()
+        self._count_suggestions(doc_ids)
+        bounds_changed = self._refresh_feature_scores()
+        
+        self._invalidate_cache(set(postings), set(doc_ids), bounds_changed)
+        return doc_ids
+    
+    def update_product(self, asin: str, fields: Dict[str, Any]) -> bool:
+        """
+        Update fields of an indexed product in place, keeping its doc id.
+        
+        Text fields (title, description, brand) are re-tokenized for this
+        product only; price and rating changes refresh its feature columns.
+        
+        Args:
+            asin: ASIN of the product to update
+            fields: Column -> new value
             
-            # Build brand index
-            if row['brand']:
-                self.brand_index[str(row['brand'])].append(idx)
+        Returns:
+            True if the product was found and updated
+        """
+        doc_id = self.asin_index.get(str(asin))
+        if doc_id is None:
+            return False
+        
+        self._ensure_mutable()
+        old_terms = self._unindex_document(doc_id)
+        self._unindex_catalog_fields(doc_id)
+        self._count_suggestions([doc_id], removed=True)
+        
+        for column, value in fields.items():
+            if column not in self.products.columns:
+                self.products[column] = None
+            if self.products[column].dtype != object and not pd.api.types.is_scalar(value):
+                self.products[column] = self.products[column].astype(object)
+            self.products.at[doc_id, column] = value
+        
+        new_terms = self._index_document(doc_id)
+        self._update_avg_doc_length()
+        self._repack_postings()
+        self._index_catalog_fields([doc_id])
+        
+        # Refresh this product's feature columns
+        row = self.products.loc[[doc_id]]
+        features = self.features
+        lookup = {brand: i for i, brand in enumerate(features.brands)}
+        brand_ids, features.brands = self._brand_ids(row['brand'].tolist(), lookup)
+        features.brand_ids[doc_id] = brand_ids[0]
+        features.price[doc_id] = float(row['price'].iloc[0])
+        features.rating_count[doc_id] = self._rating_counts(row)[0]
+        features.titles[doc_id] = self._lowercased('title', row)[0]
+        self.title_positions.set(doc_id, features.titles[doc_id])
+        self.title_positions.repack_if_needed()
+        features.descriptions[doc_id] = self._lowercased('product_description', row)[0]
+        self._count_suggestions([doc_id])
+        bounds_changed = self._refresh_feature_scores()
+        
+        self._invalidate_cache(old_terms | new_terms, {doc_id}, bounds_changed)
+        return True
+    
+    def remove_product(self, asin: str) -> bool:
+        """
+        Remove a product from search results.
+        
+        Its postings, length, brand and price entries are dropped right away;
+        the row itself is tombstoned and reclaimed by the next compaction.
+        
+        Args:
+            asin: ASIN of the product to remove
             
-            # Build price index
-            self.price_index.append((idx, float(row['price'])))
+        Returns:
+            True if the product was found and removed
+        """
+        doc_id = self.asin_index.get(str(asin))
+        if doc_id is None:
+            return False
+        
+        self._ensure_mutable()
+        old_terms = self._unindex_document(doc_id)
+        self._update_avg_doc_length()
+        self._repack_postings()
+        self._unindex_catalog_fields(doc_id)
+        self._count_suggestions([doc_id], removed=True)
+        self.title_positions.remove(doc_id)
+        self.title_positions.repack_if_needed()
+        self.deleted_docs.add(doc_id)
+        bounds_changed = self._refresh_feature_scores()
+        
+        self._invalidate_cache(old_terms, {doc_id}, bounds_changed)
+        
+        if len(self.deleted_docs) > self.compaction_threshold * len(self.products):
+            self.compact()
+        return True
+    
+    def compact(self):
+        """
+        Reclaim tombstoned rows and renumber doc ids densely.
+        
+        Postings are remapped rather than re-tokenized. Doc ids change, so
+        the whole result cache is dropped.
+        """
+        if not self.deleted_docs:
+            return
+        
+        keep = np.ones(len(self.products), dtype=bool)
+        keep[list(self.deleted_docs)] = False
+        remap = np.cumsum(keep) - 1
+        
+        self.products = self.products[keep].reset_index(drop=True)
+        self.inverted_index = self.inverted_index.remap(remap)
+        self.doc_lengths = DocLengths(self.doc_lengths.array[keep])
+        
+        features = self.features
+        for name in ('price', 'rating_count', 'popularity', 'price_score', 'brand_ids', 'titles', 'descriptions'):
+            setattr(features, name, getattr(features, name)[keep])
+        
+        if self.similarity_index is not None:
+            self.similarity_index.compact(keep)
+        self.title_positions.compact(keep)
+        
+        self.deleted_docs = set()
+        self.doc_id_epoch += 1
+        self._build_catalog_indexes()
+        self._on_index_change()
+        self._build_sort_orders()
+        self.cache.clear()
+    
+    def _ensure_mutable(self):
+        """Copy snapshot-backed (read-only) feature columns before an update"""
+        features = self.features
+        for name in ('price', 'rating_count', 'brand_ids'):
+            values = getattr(features, name)
+            if not values.flags.writeable:
+                setattr(features, name, values.copy())
+    
+    def _index_document(self, doc_id: int) -> Set[str]:
+        """Add one product's postings and length; returns its terms"""
+        postings, doc_lengths = index_partition(doc_id, searchable_fields(self.products.loc[[doc_id]]), self.analyzer)
+        for term, term_postings in postings.items():
+            self.inverted_index.edit(term).update(term_postings)
+            if self._spelling is not None and term not in self.term_doc_freq:
+                self._spelling.add(term)
+            self.term_doc_freq[term] = self.term_doc_freq.get(term, 0) + 1
+        self.doc_lengths[doc_id] = doc_lengths[0]
+        return set(postings)
+    
+    def _unindex_document(self, doc_id: int) -> Set[str]:
+        """Remove one product's postings and length; returns its terms"""
+        postings, _ = index_partition(doc_id, searchable_fields(self.products.loc[[doc_id]]), self.analyzer)
+        for term in postings:
+            term_postings = self.inverted_index.get(term)
+            if term_postings is None or doc_id not in term_postings:
+                continue
+            # Emptying a term's edited postings removes the term
+            term_postings = self.inverted_index.edit(term)
+            del term_postings[doc_id]
+            if term_postings:
+                self.term_doc_freq[term] -= 1
+            else:
+                del self.term_doc_freq[term]
+        self.doc_lengths.pop(doc_id, None)
+        return set(postings)
+    
+    def _index_catalog_fields(self, doc_ids: List[int]):
+        """Add products to the brand, price and ASIN indexes"""
+        rows = self.products.loc[doc_ids]
+        has_asin = 'asin' in self.products.columns
+        for doc_id, brand, asin in zip(doc_ids, rows['brand'].tolist(),
+                                       rows['asin'].tolist() if has_asin else [None] * len(doc_ids)):
+            if brand:
+                self.brand_index[str(brand)].append(doc_id)
+            if has_asin and pd.notna(asin):
+                self.asin_index[str(asin)] = doc_id
+        
+        # One merge into the sorted price arrays for the whole batch
+        prices = rows['price'].astype(float).to_numpy()
+        positions = np.searchsorted(self.price_index_prices, prices)
+        # Unpriced products stay at the end of the price index
+        positions[np.isnan(prices)] = len(self.price_index_prices)
+        self.price_index_prices = np.insert(self.price_index_prices, positions, prices)
+        self.price_index_docs = np.insert(self.price_index_docs, positions, np.asarray(doc_ids, dtype=np.int64))
+        
+        if self.similarity_index is not None:
+            signatures = self.similarity_index.signatures_for(self._similarity_tokens(doc_ids))
+            self.similarity_index.add(doc_ids, signatures)
+    
+    def _unindex_catalog_fields(self, doc_id: int):
+        """Remove one product from the brand, price and ASIN indexes"""
+        row = self.products.loc[doc_id]
+        brand = str(row['brand'])
+        if row['brand'] and doc_id in self.brand_index.get(brand, []):
+            self.brand_index[brand].remove(doc_id)
+            if not self.brand_index[brand]:
+                del self.brand_index[brand]
+        
+        # Equal prices (or NaNs) form one run of the price index; find the doc in it
+        price = float(row['price'])
+        start = np.searchsorted(self.price_index_prices, price, side='left')
+        end = np.searchsorted(self.price_index_prices, price, side='right')
+        matches = np.flatnonzero(self.price_index_docs[start:end] == doc_id)
+        if len(matches):
+            self.price_index_prices = np.delete(self.price_index_prices, start + matches[0])
+            self.price_index_docs = np.delete(self.price_index_docs, start + matches[0])
+        
+        if 'asin' in self.products.columns and self.asin_index.get(str(row['asin'])) == doc_id:
+            del self.asin_index[str(row['asin'])]
+        if self.similarity_index is not None:
+            self.similarity_index.remove(doc_id)
+    
+    def _update_avg_doc_length(self):
+        if self.collection_stats is not None:
+            stats = self.collection_stats
+            self.avg_doc_length = stats.total_doc_length / stats.num_docs if stats.num_docs else 0.0
+            return
+        self.avg_doc_length = (
+            self.doc_lengths.total / len(self.doc_lengths) if self.doc_lengths else 0.0
+        )
+    
+    def _repack_postings(self):
+        """Fold edited posting lists back into compact arrays once they make up a large share"""
+        if self.inverted_index.pending_postings > self.postings_repack_ratio * max(self.inverted_index.num_postings, 1024):
+            self.inverted_index = self.inverted_index.repack()
+    
+    def local_stats(self) -> CollectionStats:
+        """Statistics of the documents held by this engine"""
+        return CollectionStats(
+            doc_freq=dict(self.term_doc_freq),
+            num_docs=len(self.doc_lengths),
+            total_doc_length=self.doc_lengths.total,
+            price_range=self.get_price_range(),
+            max_rating_count=self._max_rating_count(),
+        )
+    
+    def _max_rating_count(self) -> int:
+        """Largest rating count among live products (1 if there are none)"""
+        live_counts = self.features.rating_count
+        if self.deleted_docs:
+            live_counts = np.delete(live_counts, list(self.deleted_docs))
+        return int(live_counts.max()) if len(live_counts) > 0 else 1
+    
+    def set_collection_stats(self, stats: Optional[CollectionStats]):
+        """
+        Score against catalog-wide statistics instead of this engine's own.
+        
+        A shard ranking with the statistics of the whole catalog produces the
+        same scores as one engine over the whole catalog. Pass None to go back
+        to local statistics.
+        """
+        self.collection_stats = stats
+        self._update_avg_doc_length()
+        self._refresh_feature_scores()
+        self._on_index_change()
+        self.cache.clear()
+    
+    def _idf_stats(self) -> Tuple[Dict[str, int], int]:
+        """(document frequencies, document count) that IDF is computed from"""
+        if self.collection_stats is not None:
+            return self.collection_stats.doc_freq, self.collection_stats.num_docs
+        return self.term_doc_freq, len(self.doc_lengths)
+    
+    def _invalidate_cache(self, terms: Set[str], doc_ids: Set[int], bounds_changed: bool = False):
+        """
+        Drop cached searches that changed documents could affect.
+        
+        An entry is dropped if it browses the catalog (empty query), shares a
+        term with a changed document, or returned one of the changed documents.
+        Global BM25 statistics drift slightly with every update; entries outside
+        those cases keep their scores until they age out. If the catalog-wide
+        price or popularity bounds moved, every entry is dropped.
+        """
+        previous_generation = self.index_generation
+        self._on_index_change()
+        
+        if bounds_changed:
+            self.cache.clear()
+            return
+        
+        # Decide on a snapshot: entries put after it (e.g. by the engine this
+        # one was copied from, which shares the cache) must not be carried over
+        kept = self.cache.snapshot()
+        for key, entry in list(kept.items()):
+            if not entry.terms or entry.terms & terms or entry.doc_ids & doc_ids:
+                self.cache.discard(key)
+                del kept[key]
+        
+        # Whatever is left is still valid on the new index
+        self.cache.carry_forward(kept, previous_generation, self.index_generation)
+    
+    def _on_index_change(self):
+        """
+        Advance the index generation and drop derived per-term state.
+        
+        Called after postings or collection statistics change; cached searches
+        from earlier generations are no longer served.
+        """
+        self.index_generation += 1
+        # BM25 contributions depend on the document count and average length
+        self._reset_memos()
+    
+    def _reset_memos(self):
+        """
+        Drop state derived from the index; it is rebuilt lazily on first use.
+        
+        Memos are replaced rather than cleared, so a search still holding the
+        old ones is unaffected.
+        """
+        with self._memo_lock:
+            self._term_scores_cache = OrderedDict()
+            self._filter_bitmaps = OrderedDict()
+        self._sort_orders = {}
+        self._live_bitmap = None
+        self._bm25_matrix = None
+        self._columns = {}
+        self._brand_labels = None
+    
+    def _build_indexes(self):
+        """
+        Build all search indexes including BM25 data structures.
+        
+        Searchable text is tokenized in batches by the bulk index builder,
+        across index_workers processes when more than one is configured.
+        """
+        postings, _, doc_lengths = build_inverted_index(
+            searchable_fields(self.products),
+            workers=self.index_workers,
+            batch_size=self.index_batch_size,
+            analyzer=self.analyzer
+        )
+        self.inverted_index = CompactPostings.from_postings(postings)
+        # Keyed by the postings' interned terms rather than a second copy of each string
+        self.term_doc_freq = self.inverted_index.doc_freqs()
+        self._spelling = None
+        self.doc_lengths = DocLengths(
+            np.fromiter((doc_lengths[doc_id] for doc_id in range(len(doc_lengths))), dtype=np.uint32, count=len(doc_lengths))
+        )
         
         # Calculate average document length for BM25
-        if self.doc_lengths:
-            self.avg_doc_length = total_length / len(self.doc_lengths)
-        
-        # Sort price index for range queries
-        self.price_index.sort(key=lambda x: x[1])
-    
-    def _calculate_bm25_scores(self, query_terms: List[str]) -> Dict[int, float]:
-        """Calculate BM25 scores for all matching documents"""
-        doc_scores = defaultdict(float)
-        
-        # Find all documents that contain at least one query term
-        candidate_docs = set()
-        for term in query_terms:
-            if term in self.inverted_index:
-                candidate_docs.update(self.inverted_index[term])
-        
-        # Calculate BM25 score for each candidate
-        total_docs = len(self.products)
-        
-        for doc_id in candidate_docs:
-            # Get document tokens
-            row = self.products.loc[doc_id]
-            searchable_text = f"{row['title']} {row['product_description']} {row['brand']}"
-            doc_terms = tokenize_text(searchable_text)
-            doc_length = self.doc_lengths.get(doc_id, len(doc_terms))
-            
-            # Calculate BM25 score
-            score = calculate_bm25_score(
-                query_terms=query_terms,
-                doc_terms=doc_terms,
-                doc_length=doc_length,
-                avg_doc_length=self.avg_doc_length,
-                term_doc_freq=self.term_doc_freq,
-                total_docs=total_docs
+        self._update_avg_doc_length()
+        
+        self._build_catalog_indexes()
+    
+    def _build_catalog_indexes(self):
+        """Build the brand, price and ASIN indexes from the product columns"""
+        # Build brand index
+        self.brand_index = defaultdict(list)
+        for idx, brand in enumerate(self.products['brand'].tolist()):
+            if brand:
+                self.brand_index[str(brand)].append(idx)
+        
+        # Build price index, sorted by price for range queries
+        prices = self.products['price'].astype(float).to_numpy()
+        order = np.argsort(prices, kind='stable')
+        self.price_index_prices = prices[order]
+        self.price_index_docs = order.astype(np.int64)
+        
+        # Build ASIN index (the last row wins for duplicated ASINs)
+        self.asin_index = {}
+        if 'asin' in self.products.columns:
+            for idx, asin in enumerate(self.products['asin'].tolist()):
+                if pd.notna(asin):
+                    self.asin_index[str(asin)] = idx
+    
+    def _build_features(self):
+        """Build the columnar feature store used by the ranking kernel"""
+        brand_ids, brands = self._brand_ids(self.products['brand'].tolist(), {})
+        
+        self.features = FeatureStore(
+            price=self.products['price'].astype(float).to_numpy(copy=True),
+            rating_count=self._rating_counts(self.products),
+            brand_ids=brand_ids,
+            brands=brands,
+            titles=self._lowercased('title'),
+            descriptions=self._lowercased('product_description'),
+        )
+        self.title_positions = TitlePositions.build(self.features.titles)
+        self._refresh_feature_scores()
+    
+    def _append_features(self, new_products: pd.DataFrame):
+        """Extend the feature columns with newly added products"""
+        features = self.features
+        lookup = {brand: i for i, brand in enumerate(features.brands)}
+        brand_ids, features.brands = self._brand_ids(new_products['brand'].tolist(), lookup)
+        
+        features.price = np.concatenate([features.price, new_products['price'].astype(float).to_numpy()])
+        features.rating_count = np.concatenate([features.rating_count, self._rating_counts(new_products)])
+        features.brand_ids = np.concatenate([features.brand_ids, brand_ids])
+        features.titles = np.concatenate([features.titles, self._lowercased('title', new_products)])
+        for doc_id in range(len(features.titles) - len(new_products), len(features.titles)):
+            self.title_positions.set(doc_id, features.titles[doc_id])
+        features.descriptions = np.concatenate(
+            [features.descriptions, self._lowercased('product_description', new_products)]
+        )
+    
+    def _refresh_feature_scores(self) -> bool:
+        """
+        Recompute the catalog-relative popularity and price competitiveness scores.
+        
+        Returns:
+            True if the catalog-wide price or rating count bounds changed
+        """
+        features = self.features
+        stats = self.collection_stats
+        
+        # Popularity is scaled by the catalog's max rating count; the log is
+        # evaluated once per distinct count with the same helper as before
+        max_rating_count = stats.max_rating_count if stats is not None else self._max_rating_count()
+        counts, inverse = np.unique(features.rating_count, return_inverse=True)
+        features.popularity = np.array(
+            [calculate_popularity_score(int(c), max_rating_count) for c in counts],
+            dtype=np.float64
+        )[inverse]
+        
+        # Price competitiveness, vectorized form of calculate_price_competitiveness
+        min_price, max_price = stats.price_range if stats is not None else self.get_price_range()
+        if max_price == min_price:
+            features.price_score = np.full(len(features.price), 50.0)
+        else:
+            price_score = np.clip(
+                100 - ((features.price - min_price) / (max_price - min_price)) * 100, 0.0, 100.0
             )
-            
-            doc_scores[doc_id] = score
+            # The scalar helper's min/max chain maps a missing price to 100
+            features.price_score = np.where(np.isnan(price_score), 100.0, price_score)
         
-        return doc_scores
+        bounds = (min_price, max_price, max_rating_count)
+        changed = bounds != self._feature_bounds
+        self._feature_bounds = bounds
+        return changed
     
-    def _calculate_multi_signal_score(
-        self, 
-        doc_id: int, 
-        query: str,
-        bm25_score: float,
-        all_bm25_scores: List[float]
-    ) -> float:
+    @staticmethod
+    def _brand_ids(brands: List[Any], lookup: Dict[str, int]) -> Tuple[np.ndarray, List[str]]:
         """
-        Calculate final ranking score using multiple signals.
+        Map brands to dense ids (keyed by lowercased brand), extending lookup in place.
+        
+        Returns:
+            (brand id per product, brand id -> lowercased brand)
+        """
+        brand_ids = np.empty(len(brands), dtype=np.int32)
+        for i, brand in enumerate(brands):
+            key = str(brand).lower() if brand else ""
+            brand_ids[i] = lookup.setdefault(key, len(lookup))
+        return brand_ids, list(lookup)
+    
+    @staticmethod
+    def _rating_counts(products: pd.DataFrame) -> np.ndarray:
+        """Rating counts as integers, missing/unparseable values counted as 0"""
+        return pd.to_numeric(products['rating_count'], errors='coerce').fillna(0).astype(np.int64).to_numpy()
+    
+    def _lowercased(self, column: str, products: Optional[pd.DataFrame] = None) -> np.ndarray:
+        """Lowercased string values of a product column (of self.products by default)"""
+        if products is None:
+            products = self.products
+        return np.array([str(value).lower() for value in products[column].tolist()], dtype=object)
+    
+    def _exact_match_scores(self, query: str, doc_ids: np.ndarray) -> np.ndarray:
+        """
+        Exact match score (0-100) for each candidate.
+        
+        Same tiers as detect_exact_matches, without a regex per document:
+        exact-title and word-boundary phrase matches are read from the title
+        positional index (an occurrence's span is checked against the query
+        text), starts-with and contains are plain string checks.
+        """
+        query_lower = query.lower().strip()
+        titles = self.features.titles[doc_ids]
+        descriptions = self.features.descriptions[doc_ids]
+        scores = np.zeros(len(doc_ids), dtype=np.float64)
+        
+        # Token edges are \b positions, so a query starting and ending on a word
+        # character is word-bounded exactly where it occurs as a token phrase
+        tokens, starts, ends = word_tokens(query_lower)
+        phrase_query = bool(tokens) and starts[0] == 0 and ends[-1] == len(query_lower)
+        if phrase_query:
+            slots, match_starts, match_ends = self.title_positions.phrase_matches(tokens, doc_ids)
+            for i, start, end in zip(slots.tolist(), match_starts.tolist(), match_ends.tolist()):
+                title = titles[i]
+                if title[start:end] == query_lower:
+                    scores[i] = 100.0 if start == 0 and end == len(title) else max(scores[i], 80.0)
+        
+        for i in np.flatnonzero(scores == 0).tolist():
+            title = titles[i]
+            # Every remaining title tier implies a substring match
+            if query_lower in title:
+                if not phrase_query and title == query_lower:
+                    scores[i] = 100.0
+                elif not phrase_query and has_bounded_occurrence(title, query_lower):
+                    scores[i] = 80.0
+                elif title.startswith(query_lower):
+                    scores[i] = 60.0
+                else:
+                    scores[i] = 40.0
+            elif query_lower in descriptions[i]:
+                scores[i] = 20.0
+        return scores
+    
+    def _rank_candidates(self,
+                         query: str,
+                         doc_ids: np.ndarray,
+                         bm25_scores: np.ndarray,
+                         bm25_bounds: Optional[Tuple[float, float]] = None,
+                         exact_match_score: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Calculate final ranking scores for all candidates in one vectorized pass.
         
         Combines:
         - BM25 relevance (40%)
@@ -179,213 +1030,1007 @@ class EcommerceSearchEngine:
         - Brand match (15%)
         - Popularity (15%)
         - Price competitiveness (10%)
+        
+        Args:
+            query: Raw query string
+            doc_ids: Candidate doc ids
+            bm25_scores: BM25 score of each candidate
+            bm25_bounds: (min, max) BM25 over the whole candidate set, when
+                         doc_ids is only part of it (defaults to doc_ids' own range)
+            exact_match_score: Precomputed exact match scores (e.g. an upper bound)
         """
-        product = self.products.loc[doc_id]
+        features = self.features
         
-        # Normalize BM25 score (0-100)
-        if all_bm25_scores:
-            min_bm25 = min(all_bm25_scores)
-            max_bm25 = max(all_bm25_scores)
-            normalized_bm25 = normalize_score(bm25_score, min_bm25, max_bm25)
+        # Normalize BM25 scores (0-100) against the candidate set
+        if bm25_bounds is None:
+            bm25_bounds = (bm25_scores.min(), bm25_scores.max())
+        min_bm25, max_bm25 = bm25_bounds
+        if max_bm25 == min_bm25:
+            normalized_bm25 = np.full(len(doc_ids), 50.0)
         else:
-            normalized_bm25 = 0.0
-        
-        # Exact match detection
-        title_matches = detect_exact_matches(query, str(product['title']))
-        desc_matches = detect_exact_matches(query, str(product.get('product_description', '')))
+            normalized_bm25 = np.clip((bm25_scores - min_bm25) / (max_bm25 - min_bm25) * 100, 0.0, 100.0)
         
         # Exact match score (0-100)
-        exact_match_score = 0.0
-        if title_matches['exact_match']:
-            exact_match_score = 100.0
-        elif title_matches['word_boundary_match']:
-            exact_match_score = 80.0
-        elif title_matches['starts_with']:
-            exact_match_score = 60.0
-        elif title_matches['contains']:
-            exact_match_score = 40.0
-        elif desc_matches['contains']:
-            exact_match_score = 20.0
-        
-        # Brand match score (0-100)
-        brand_match_score = 0.0
-        query_lower = query.lower()
-        brand_lower = str(product['brand']).lower() if product['brand'] else ""
-        if brand_lower and brand_lower in query_lower:
-            brand_match_score = 100.0
-        
-        # Popularity score (0-100)
-        rating_count = int(product.get('rating_count', 0))
-        max_rating_count = int(self.products['rating_count'].max()) if len(self.products) > 0 else 1
-        popularity_score = calculate_popularity_score(rating_count, max_rating_count)
-        
-        # Price competitiveness score (0-100)
-        if self.price_index:
-            min_price = self.price_index[0][1]
-            max_price = self.price_index[-1][1]
-            price_score = calculate_price_competitiveness(float(product['price']), min_price, max_price)
-        else:
-            price_score = 50.0
-        
-        # Weighted combination
-        final_score = (
-            0.40 * normalized_bm25 +
-            0.20 * exact_match_score +
-            0.15 * brand_match_score +
-            0.15 * popularity_score +
-            0.10 * price_score
+        if exact_match_score is None:
+            exact_match_score = self._exact_match_scores(query, doc_ids)
+        
+        # Brand match score (0-100), evaluated once per brand rather than per document
+        brand_ids = features.brand_ids[doc_ids]
+        brand_match_score = np.where(self._brand_hits(query, brand_ids)[brand_ids], 100.0, 0.0)
+        
+        return self._combine_signals(normalized_bm25, exact_match_score, brand_match_score,
+                                     features.popularity[doc_ids], features.price_score[doc_ids])
+    
+    @staticmethod
+    def _combine_signals(normalized_bm25: np.ndarray,
+                         exact_match_score: np.ndarray,
+                         brand_match_score: np.ndarray,
+                         popularity_score: np.ndarray,
+                         price_score: np.ndarray) -> np.ndarray:
+        """Weighted combination of the 0-100 ranking signals"""
+        return (
+            RANKING_WEIGHTS['bm25'] * normalized_bm25 +
+            RANKING_WEIGHTS['exact_match'] * exact_match_score +
+            RANKING_WEIGHTS['brand'] * brand_match_score +
+            RANKING_WEIGHTS['popularity'] * popularity_score +
+            RANKING_WEIGHTS['price'] * price_score
         )
+    
+    def _brand_hits(self, query: str, brand_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Per brand id: whether the brand appears in the query.
         
-        return final_score
+        With brand_ids, only those brands are checked (the rest read False).
+        """
+        query_lower = query.lower()
+        brands = self.features.brands
+        if brand_ids is None:
+            return np.array([bool(b) and b in query_lower for b in brands], dtype=bool)
+        hits = np.zeros(len(brands), dtype=bool)
+        for brand_id in np.unique(brand_ids).tolist():
+            hits[brand_id] = bool(brands[brand_id]) and brands[brand_id] in query_lower
+        return hits
     
     def search(self, 
                query: str = "", 
                filters: Optional[Dict[str, Any]] = None,
-               limit: int = 50) -> SearchResult:
+               limit: int = 50,
+               top_k: bool = False,
+               fields: Optional[List[str]] = None,
+               facets: Optional[List[str]] = None) -> SearchResult:
         """
         Main search function with BM25 scoring, multi-signal ranking, caching and filtering.
         
+        Query terms missing from the index are replaced by the closest indexed
+        term within edit distance 1-2 (see typo_tolerance); the query that ran
+        is reported as corrected_query.
+        
         Args:
             query: Search query string
             filters: Dictionary of filters (min_price, max_price, brand, availability, sort_by)
             limit: Maximum number of results to return
+            top_k: Use MaxScore top-k retrieval for relevance-sorted text queries.
+                   Returns the same results as exhaustive scoring, but documents
+                   that cannot reach the top `limit` are never fully scored.
+            fields: Product columns to return (None for all). Results are then
+                    lazy ProductRow views holding just these fields plus
+                    relevance_score and id; cache hits return plain dicts.
+            facets: Facets to count over every match, not just the returned
+                    `limit` (see FACETS): 'brand' gives the most frequent
+                    brands, 'price' the PRICE_FACET_EDGES buckets.
         
         Returns:
             SearchResult object containing results and metadata
+            
+        Raises:
+            ValueError: If fields names an unknown column or facets an unknown facet
         """
         start_time = time.time()
-        self.total_searches += 1
+        timer = StageTimer()
+        self._searches.add()
         
         if filters is None:
             filters = {}
         
+        # Ranking is case- and whitespace-insensitive, so equivalent queries share one form
+        normalized = normalize_query(query)
+        columns = self._projection(fields)
+        for name in facets or ():
+            if name not in FACETS:
+                raise ValueError(f"Unknown facet: {name}")
+        
+        # Only an empty query browses the catalog; one of just whitespace matches nothing
+        if query and not normalized:
+            return SearchResult(results=[], search_time=(time.time() - start_time) * 1000, total_results=0,
+                                from_cache=False, cache_hit_rate=self._get_cache_hit_rate(),
+                                stage_timings=timer.stages, facets={name: [] for name in facets or ()})
+        query = normalized
+        
+        # Correct misspelled terms first, so a typo finds (and is cached as) the intended query
+        query, corrections = self._correct_query(query)
+        corrected_query = query if corrections else None
+        timer.lap('spelling')
+        
         # Check cache
-        cache_key = json.dumps({'query': query, 'filters': filters, 'limit': limit}, sort_keys=True)
-        if cache_key in self.cache:
-            self.cache_hits += 1
-            # Move to end (LRU)
-            self.cache.move_to_end(cache_key)
-            cached_result = self.cache[cache_key]
-            cached_result.from_cache = True
-            cached_result.cache_hit_rate = self._get_cache_hit_rate()
-            return cached_result
+        cache_key = self._cache_key(query, filters, limit, fields, facets)
+        cached = self.cache.get(cache_key, self.index_generation)
+        timer.lap('cache')
+        if cached is not None:
+            self._cache_hit_count.add()
+            search_result = cached.to_result(self._get_cache_hit_rate())
+            search_result.stage_timings = timer.stages
+            search_result.corrected_query = corrected_query
+            if search_result.total_results:
+                self.autocomplete_index.record_query(query)
+            self.latency.record(timer, timer.total(), query=query, filters=filters, limit=limit, from_cache=True)
+            return search_result
         
-        # Perform search
-        if query:
-            results = self._text_search(query)
-        else:
-            # Return all products if no query
-            results = [(idx, 50.0) for idx in range(len(self.products))]
+        sort_by = filters.get('sort_by', 'relevance')
         
-        # Apply filters
-        results = self._apply_filters(results, filters)
+        # Evaluate filters first, as a doc-id bitmap that candidates are intersected with
+        doc_mask = self._filter_mask(filters)
+        timer.lap('filter')
         
-        # Sort results
-        results = self._sort_results(results, filters.get('sort_by', 'relevance'))
+        # Perform search
+        if query and top_k and sort_by == 'relevance':
+            # Results come back ranked and limited
+            results = self._text_search_top_k(query, limit, doc_mask, timer=timer)
+        else:
+            if query:
+                results = self._text_search(query, doc_mask, timer=timer)
+                
+                # Sort and limit results
+                results = self._sort_results(results, sort_by, limit)
+                timer.lap('sort')
+            else:
+                # Return the first page of (matching) products if no query
+                page, _ = self._browse_page(sort_by, limit, doc_mask)
+                results = [(doc_id, 50.0) for doc_id in page]
+                timer.lap('browse')
         
-        # Limit results
-        results = results[:limit]
+        facet_counts = self._facets(facets, query, doc_mask) if facets else {}
+        timer.lap('facets')
         
         # Prepare response
         search_time = time.time() - start_time
-        result_data = []
-        
-        for doc_id, score in results:
-            product = self.products.loc[doc_id].to_dict()
-            product['relevance_score'] = round(score, 2)
-            product['id'] = int(doc_id)
-            result_data.append(product)
+        result_data = self._result_rows(results, columns)
+        timer.lap('materialize')
         
         search_result = SearchResult(
             results=result_data,
             search_time=search_time * 1000,  # Convert to milliseconds
             total_results=len(results),
             from_cache=False,
-            cache_hit_rate=self._get_cache_hit_rate()
+            cache_hit_rate=self._get_cache_hit_rate(),
+            stage_timings=timer.stages,
+            corrected_query=corrected_query,
+            facets=facet_counts
         )
         
-        # Add to cache (with LRU eviction)
-        if len(self.cache) >= self.cache_size:
-            self.cache.popitem(last=False)  # Remove oldest
-        self.cache[cache_key] = search_result
+        # Add an immutable snapshot to the cache
+        cached = CachedSearch.from_results(result_data, search_result.search_time, self.analyzer.analyze(query),
+                                           facet_counts)
+        self.cache.put(cache_key, cached, self.index_generation, cached.size_bytes())
+        timer.lap('cache')
         
         # Update average search time
-        self.avg_search_time = (self.avg_search_time * (self.total_searches - 1) + search_time) / self.total_searches
+        self._timed_searches.add()
+        self._search_seconds.add(search_time)
+        self.latency.record(timer, timer.total(), query=query, filters=filters, limit=limit,
+                            from_cache=False, total_results=len(results))
+        
+        # Queries that found something become autocomplete suggestions
+        if results:
+            self.autocomplete_index.record_query(query)
         
         return search_result
     
-    def _text_search(self, query: str) -> List[Tuple[int, float]]:
-        """Perform text search using BM25 and multi-signal ranking"""
-        query_terms = tokenize_text(query)
-        if not query_terms:
-            return []
+    def autocomplete(self, prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Completions for a partially typed query, e.g. on every keystroke.
         
-        # Calculate BM25 scores
-        bm25_scores = self._calculate_bm25_scores(query_terms)
+        Suggestions are title word n-grams, brands and popular queries,
+        weighted by the rating counts of the products they occur in (queries
+        by how often they were searched). Calls only binary search sorted
+        arrays, unless the suggestions are out of date (see
+        refresh_autocomplete).
+        
+        Args:
+            prefix: Typed text (normalized like a query)
+            limit: Maximum number of completions
+            
+        Returns:
+            Dicts with 'text', 'kind' (query, brand or title) and 'weight', heaviest first
+        """
+        if not self.autocomplete_index.catalog_current:
+            self.refresh_autocomplete()
+        return self.autocomplete_index.complete(normalize_query(prefix), limit)
+    
+    def refresh_autocomplete(self):
+        """
+        Bring the autocomplete suggestions up to date with the catalog.
         
-        if not bm25_scores:
+        The first call reads every product; later ones only re-sort the
+        suggestions changed by add_products, update_product and
+        remove_product. CatalogSync calls this before publishing an engine,
+        so no keystroke pays for it.
+        """
+        if self.autocomplete_index.catalog_loaded:
+            self.autocomplete_index.refresh_catalog()
+        else:
+            self.autocomplete_index.load_catalog(*self._suggestion_sources(self._live_docs()))
+    
+    def _suggestion_sources(self, doc_ids: np.ndarray) -> Tuple[List[List[str]], List[str], np.ndarray]:
+        """Analyzed titles, normalized brands and rating counts of products (doc ids or a row bitmap)"""
+        features = self.features
+        return (
+            self.analyzer.analyze_many(features.titles[doc_ids].tolist()),
+            [normalize_query(features.brands[brand_id]) for brand_id in features.brand_ids[doc_ids].tolist()],
+            features.rating_count[doc_ids],
+        )
+    
+    def _count_suggestions(self, doc_ids: List[int], removed: bool = False):
+        """Count products into (or out of) the autocomplete suggestions, once those are loaded"""
+        if not self.autocomplete_index.catalog_loaded:
+            return
+        if removed:
+            self.autocomplete_index.remove_products(*self._suggestion_sources(np.asarray(doc_ids)))
+        else:
+            self.autocomplete_index.add_products(*self._suggestion_sources(np.asarray(doc_ids)))
+    
+    def browse(self,
+               filters: Optional[Dict[str, Any]] = None,
+               limit: int = 50,
+               search_after: Optional[str] = None,
+               fields: Optional[List[str]] = None) -> SearchResult:
+        """
+        Page through the catalog without a query, e.g. for category pages.
+        
+        Walks the precomputed global ordering for sort_by, keeping products
+        that pass the filter bitmap, so a deep page costs the same as the first.
+        
+        Args:
+            filters: Dictionary of filters (min_price, max_price, brand, availability, sort_by)
+            limit: Page size
+            search_after: next_cursor of the previous page (None for the first page)
+            fields: Product columns to return (None for all), as in search()
+        
+        Returns:
+            SearchResult whose next_cursor fetches the following page (None on the last page)
+        
+        Raises:
+            ValueError: If the cursor is malformed, was issued for another sort
+                        order, or predates a reindex that renumbered products,
+                        or if fields names an unknown column
+        """
+        start_time = time.time()
+        if filters is None:
+            filters = {}
+        sort_by = filters.get('sort_by', 'relevance')
+        
+        after = self._decode_cursor(search_after, sort_by) if search_after else None
+        page, next_cursor = self._browse_page(sort_by, limit, self._filter_mask(filters), after)
+        
+        return SearchResult(
+            results=self._result_rows([(doc_id, 50.0) for doc_id in page], self._projection(fields)),
+            search_time=(time.time() - start_time) * 1000,  # Convert to milliseconds
+            total_results=len(page),
+            from_cache=False,
+            cache_hit_rate=self._get_cache_hit_rate(),
+            next_cursor=next_cursor
+        )
+    
+    def _browse_page(self,
+                     sort_by: str,
+                     limit: int,
+                     doc_mask: Optional[np.ndarray] = None,
+                     after: Optional[Tuple[Any, int]] = None) -> Tuple[List[int], Optional[str]]:
+        """
+        Next `limit` live doc ids in sort_by order, after the (sort key, doc id) position.
+        
+        Returns:
+            (doc ids, cursor after the last one, or None if the catalog is exhausted)
+        """
+        order = self._sort_order(sort_by)
+        position = 0
+        if after is not None:
+            # Skip the keys before the cursor, then the tied doc ids up to it
+            key, last_doc_id = after
+            key = np.nan if key is None else key
+            rank = int(np.searchsorted(order.keys, key, side='left'))
+            position = int(order.rank_starts[rank])
+            if rank < len(order.keys) and (order.keys[rank] == key or (np.isnan(order.keys[rank]) and np.isnan(key))):
+                ties = order.doc_ids[position:order.rank_starts[rank + 1]]
+                position += int(np.searchsorted(ties, last_doc_id, side='right'))
+        
+        live = self._live_docs()
+        page: List[int] = []
+        chunk_size = max(2 * limit, 256)
+        while position < len(order.doc_ids) and len(page) < limit:
+            chunk = order.doc_ids[position:position + chunk_size]
+            keep = live[chunk]
+            if doc_mask is not None:
+                keep &= doc_mask[chunk]
+            page.extend(chunk[keep][:limit - len(page)].tolist())
+            position += len(chunk)
+            chunk_size *= 2
+        
+        if len(page) < limit or limit <= 0:
+            return page, None
+        last_doc_id = page[-1]
+        last_key = order.keys[order.ranks[last_doc_id]].item()
+        if isinstance(last_key, float) and math.isnan(last_key):
+            last_key = None  # Missing price; keeps the cursor strict JSON
+        return page, self._encode_cursor(sort_by, last_key, last_doc_id)
+    
+    def _encode_cursor(self, sort_by: str, key: Any, doc_id: int) -> str:
+        payload = json.dumps([sort_by, key, doc_id, self.doc_id_epoch])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+    
+    def _decode_cursor(self, cursor: str, sort_by: str) -> Tuple[Any, int]:
+        """Validate a browse cursor and return its (sort key, doc id) position"""
+        try:
+            cursor_sort_by, key, doc_id, epoch = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise ValueError(f"Invalid browse cursor: {cursor!r}")
+        if cursor_sort_by != sort_by:
+            raise ValueError(f"Browse cursor was issued for sort_by={cursor_sort_by!r}, not {sort_by!r}")
+        if epoch != self.doc_id_epoch:
+            raise ValueError("Browse cursor is stale: the catalog was reindexed, start from the first page")
+        return key, doc_id
+    
+    def _live_docs(self) -> np.ndarray:
+        """Bitmap of doc ids that are not deleted, cached until the index changes"""
+        if self._live_bitmap is None:
+            live = np.ones(len(self.products), dtype=bool)
+            live[list(self.deleted_docs)] = False
+            self._live_bitmap = live
+        return self._live_bitmap
+    
+    def _result_rows(self,
+                     results: List[Tuple[int, float]],
+                     columns: Optional[Dict[str, np.ndarray]] = None) -> List[Dict]:
+        """Product dicts for (doc_id, score) results, or ProductRow views over projected columns"""
+        if columns is not None:
+            return [ProductRow(columns, int(doc_id), round(score, 2)) for doc_id, score in results]
+        
+        # Doc ids are row positions; one iloc gather instead of a .loc per result
+        doc_ids = [doc_id for doc_id, _ in results]
+        result_data = self.products.iloc[doc_ids].to_dict('records')
+        for product, (doc_id, score) in zip(result_data, results):
+            product['relevance_score'] = round(score, 2)
+            product['id'] = int(doc_id)
+        return result_data
+    
+    def search_many(self,
+                    queries: List[str],
+                    filters: Optional[Dict[str, Any]] = None,
+                    limit: int = 50,
+                    batch_size: int = 256) -> List[SearchResult]:
+        """
+        Run many searches at once, e.g. query-log replays and cache warmups.
+        
+        BM25 for a whole batch comes from one sparse product of a query x term
+        count matrix with the term x doc BM25 matrix. The multi-signal ranking
+        is then vectorized per query, and exact match scores (the only
+        per-document string work) are evaluated just for the candidates
+        that can still reach the top `limit`. Results go through the result
+        cache like search(), so a replay also warms it.
+        
+        Rankings equal search(); BM25 sums are added in a different order,
+        so scores can differ in the last floating point digit.
+        
+        Args:
+            queries: Search query strings
+            filters: Dictionary of filters applied to every query (see search)
+            limit: Maximum number of results per query
+            batch_size: Queries scored per sparse product (bounds memory)
+            
+        Returns:
+            One SearchResult per query, in order
+        """
+        if filters is None:
+            filters = {}
+        sort_by = filters.get('sort_by', 'relevance')
+        
+        # Serve what the cache has; score each distinct remaining query once
+        responses: List[Optional[SearchResult]] = [None] * len(queries)
+        corrected_queries: List[Optional[str]] = [None] * len(queries)
+        pending: Dict[str, List[int]] = {}
+        for i, query in enumerate(queries):
+            normalized = normalize_query(query)
+            # Only an empty query browses the catalog; one of just whitespace matches nothing
+            if query and not normalized:
+                responses[i] = SearchResult(results=[], search_time=0.0, total_results=0, from_cache=False,
+                                            cache_hit_rate=self._get_cache_hit_rate())
+                continue
+            query, corrections = self._correct_query(normalized)
+            if corrections:
+                corrected_queries[i] = query
+            cached = self.cache.get(self._cache_key(query, filters, limit), self.index_generation)
+            if cached is not None:
+                self._cache_hit_count.add()
+                responses[i] = cached.to_result(self._get_cache_hit_rate())
+                responses[i].corrected_query = corrected_queries[i]
+            else:
+                pending.setdefault(query, []).append(i)
+        self._searches.add(len(queries))
+        
+        doc_mask = self._filter_mask(filters)
+        distinct = list(pending)
+        for start in range(0, len(distinct), batch_size):
+            batch_start_time = time.time()
+            batch = distinct[start:start + batch_size]
+            ranked = self._score_batch(batch, limit, doc_mask, sort_by)
+            
+            # One row gather for the whole batch
+            rows = self._result_rows([result for results in ranked for result in results])
+            search_time = (time.time() - batch_start_time) / len(batch)
+            
+            offset = 0
+            for query, results in zip(batch, ranked):
+                result_data = rows[offset:offset + len(results)]
+                offset += len(results)
+                
+                cached = CachedSearch.from_results(result_data, search_time * 1000, self.analyzer.analyze(query))
+                self.cache.put(self._cache_key(query, filters, limit), cached, self.index_generation,
+                               cached.size_bytes())
+                for i in pending[query]:
+                    responses[i] = SearchResult(
+                        results=[dict(product) for product in result_data],
+                        search_time=search_time * 1000,  # Convert to milliseconds
+                        total_results=len(results),
+                        from_cache=False,
+                        cache_hit_rate=self._get_cache_hit_rate(),
+                        corrected_query=corrected_queries[i]
+                    )
+        return responses
+    
+    def _score_batch(self,
+                     queries: List[str],
+                     limit: int,
+                     doc_mask: Optional[np.ndarray],
+                     sort_by: str) -> List[List[Tuple[int, float]]]:
+        """
+        Ranked (doc_id, score) results for each normalized query of a batch.
+        
+        Signals are computed for every (query, candidate) pair of the batch at
+        once, laid out like the CSR score matrix: entry j belongs to query
+        rows[j] and doc doc_ids[j].
+        """
+        if self._bm25_matrix is None:
+            doc_freq, total_docs = self._idf_stats()
+            self._bm25_matrix = bm25_matrix(self.inverted_index, doc_freq, self.doc_lengths.array,
+                                            self.avg_doc_length, total_docs)
+        matrix, vocabulary = self._bm25_matrix
+        features = self.features
+        
+        # (query x doc) BM25 scores; row i holds query i's candidates, sorted by doc id
+        bm25 = (query_matrix([self.analyzer.analyze(query) for query in queries], vocabulary) @ matrix).tocsr()
+        bm25.sort_indices()
+        counts = np.diff(bm25.indptr)
+        rows = np.repeat(np.arange(len(queries)), counts)
+        doc_ids = bm25.indices.astype(np.int64)
+        raw_scores = bm25.data
+        
+        # Normalize BM25 (0-100) against each query's full candidate set, before filtering
+        matched = counts > 0
+        min_bm25 = np.zeros(len(queries))
+        max_bm25 = np.zeros(len(queries))
+        min_bm25[matched] = np.minimum.reduceat(raw_scores, bm25.indptr[:-1][matched])
+        max_bm25[matched] = np.maximum.reduceat(raw_scores, bm25.indptr[:-1][matched])
+        
+        if doc_mask is not None:
+            keep = doc_mask[doc_ids]
+            rows, doc_ids, raw_scores = rows[keep], doc_ids[keep], raw_scores[keep]
+        
+        low, high = min_bm25[rows], max_bm25[rows]
+        flat = high == low
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized_bm25 = np.where(flat, 50.0, np.clip((raw_scores - low) / (high - low) * 100, 0.0, 100.0))
+        
+        # Brand match, checked once per distinct (query, brand) pair, keyed as one int64
+        num_brands = len(features.brands)
+        pairs, pair_index = np.unique(rows * num_brands + features.brand_ids[doc_ids], return_inverse=True)
+        pair_hits = np.array([
+            bool(features.brands[brand_id]) and features.brands[brand_id] in queries[row]
+            for row, brand_id in zip((pairs // num_brands).tolist(), (pairs % num_brands).tolist())
+        ], dtype=bool)
+        brand_match_score = np.where(pair_hits[pair_index], 100.0, 0.0)
+        
+        popularity_score = features.popularity[doc_ids]
+        price_score = features.price_score[doc_ids]
+        
+        def combine(exact_match_score):
+            return self._combine_signals(normalized_bm25, exact_match_score, brand_match_score,
+                                         popularity_score, price_score)
+        
+        # Exact match is worth at most 100; a candidate whose score with it cannot
+        # reach its query's limit-th best score without it is never string-matched
+        bounds = np.searchsorted(rows, np.arange(len(queries) + 1))
+        if sort_by in SORT_KEYS:
+            contenders = np.arange(len(doc_ids))
+        else:
+            lower = combine(np.zeros(len(doc_ids)))
+            upper = combine(np.full(len(doc_ids), 100.0))
+            threshold = np.full(len(queries), -np.inf)
+            for i in np.flatnonzero(np.diff(bounds) > limit).tolist():
+                row_lower = lower[bounds[i]:bounds[i + 1]]
+                threshold[i] = np.partition(row_lower, len(row_lower) - limit)[len(row_lower) - limit]
+            contenders = np.flatnonzero(upper >= threshold[rows])
+        
+        rows, doc_ids = rows[contenders], doc_ids[contenders]
+        exact_match_score = np.zeros(len(doc_ids))
+        bounds = np.searchsorted(rows, np.arange(len(queries) + 1))
+        for i in np.flatnonzero(np.diff(bounds)).tolist():
+            exact_match_score[bounds[i]:bounds[i + 1]] = \
+                self._exact_match_scores(queries[i], doc_ids[bounds[i]:bounds[i + 1]])
+        normalized_bm25, brand_match_score = normalized_bm25[contenders], brand_match_score[contenders]
+        popularity_score, price_score = popularity_score[contenders], price_score[contenders]
+        final_scores = combine(exact_match_score)
+        
+        # Per query: descending score, ties by doc id
+        order = np.lexsort((doc_ids, -final_scores, rows))
+        ordered_rows = rows[order]
+        ranked = []
+        for i, query in enumerate(queries):
+            if not query:
+                page, _ = self._browse_page(sort_by, limit, doc_mask)
+                ranked.append([(doc_id, 50.0) for doc_id in page])
+                continue
+            start, end = np.searchsorted(ordered_rows, [i, i + 1])
+            selection = order[start:end]
+            results = list(zip(doc_ids[selection].tolist(), final_scores[selection].tolist()))
+            ranked.append(self._sort_results(results, sort_by, limit))
+        return ranked
+    
+    def _projection(self, fields: Optional[List[str]]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Column arrays for a field projection (None when all fields are wanted).
+        
+        Arrays come straight from the DataFrame without copying and are kept
+        until the index changes.
+        """
+        if fields is None:
+            return None
+        columns = {}
+        for name in fields:
+            if name in RESULT_KEYS or name in columns:
+                continue
+            if name not in self.products.columns:
+                raise ValueError(f"Unknown field: {name}")
+            if name not in self._columns:
+                self._columns[name] = self.products[name].to_numpy()
+            columns[name] = self._columns[name]
+        return columns
+    
+    def _facets(self, names: List[str], query: str, doc_mask: Optional[np.ndarray]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Facet buckets over every document the search matched.
+        
+        Returns:
+            Facet name -> buckets; brand buckets are {'value', 'count'}, most
+            frequent first (ties in catalog order), price buckets are
+            {'min', 'max', 'count'} with None for an open end. Empty buckets
+            are left out.
+        """
+        facets: Dict[str, List[Dict[str, Any]]] = {}
+        for name, counts in self._facet_counts(names, query, doc_mask).items():
+            if name == 'brand':
+                facets[name] = self._brand_facet(self._brand_facet_labels(), counts, self.facet_size)
+            elif name == 'price':
+                facets[name] = self._price_facet(self.price_facet_edges, counts)
+        return facets
+    
+    def _facet_counts(self, names: List[str], query: str, doc_mask: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Raw facet counts over every document the search matched.
+        
+        The match set is a doc-id bitmap: the union of the query terms'
+        postings (every live document for an empty query), narrowed by the
+        filter bitmap. Counts are then one bincount over the brand id or
+        price bucket column, whatever the number of matches.
+        
+        Returns:
+            Facet name -> matches per brand id, or per price bucket (bucket i
+            is below price_facet_edges[i], the last one above every edge)
+        """
+        if query:
+            matches = np.zeros(len(self.products), dtype=bool)
+            for scores in self._query_term_scores(self.analyzer.analyze(query)):
+                matches[scores.doc_ids] = True
+        else:
+            matches = self._live_docs()
+        if doc_mask is not None:
+            matches = matches & doc_mask
+        
+        features = self.features
+        counts: Dict[str, np.ndarray] = {}
+        for name in dict.fromkeys(names):
+            if name == 'brand':
+                counts[name] = np.bincount(features.brand_ids[matches], minlength=len(features.brands))
+            elif name == 'price':
+                edges = np.asarray(self.price_facet_edges, dtype=np.float64)
+                prices = features.price[matches]
+                prices = prices[~np.isnan(prices)]
+                counts[name] = np.bincount(np.searchsorted(edges, prices, side='right'), minlength=len(edges) + 1)
+        return counts
+    
+    @staticmethod
+    def _brand_facet(labels: List[str], counts: np.ndarray, size: int) -> List[Dict[str, Any]]:
+        """
+        Brand facet buckets: the size most frequent brands, ties in the order of labels.
+        
+        Args:
+            labels: Brand as spelled in the catalog, per brand ('' for products without one)
+            counts: Matches per brand
+            size: Number of brands listed
+        """
+        # Products without a brand are not a facet value
+        brand_ids = np.array([brand_id for brand_id in np.flatnonzero(counts).tolist() if labels[brand_id]],
+                             dtype=np.int64)
+        if len(brand_ids) > size:
+            brand_counts = counts[brand_ids]
+            cut = len(brand_ids) - size
+            brand_ids = brand_ids[brand_counts >= np.partition(brand_counts, cut)[cut]]
+        brand_ids = brand_ids[np.argsort(-counts[brand_ids], kind='stable')][:size]
+        return [{'value': labels[brand_id], 'count': int(counts[brand_id])} for brand_id in brand_ids.tolist()]
+    
+    @staticmethod
+    def _price_facet(edges: Tuple[float, ...], counts: np.ndarray) -> List[Dict[str, Any]]:
+        """Price facet buckets from counts per price bucket, empty buckets left out"""
+        bounds = [None] + [float(edge) for edge in edges] + [None]
+        return [
+            {'min': bounds[bucket], 'max': bounds[bucket + 1], 'count': int(count)}
+            for bucket, count in enumerate(counts.tolist()) if count
+        ]
+    
+    def _brand_facet_labels(self) -> List[str]:
+        """Brand id -> brand as first spelled in the catalog ('' if missing), cached until the index changes"""
+        if self._brand_labels is None:
+            brand_ids = self.features.brand_ids
+            labels = list(self.features.brands)
+            unique_ids, first_rows = np.unique(brand_ids, return_index=True)
+            brands = self.products['brand'].to_numpy()
+            for brand_id, row in zip(unique_ids.tolist(), first_rows.tolist()):
+                labels[brand_id] = '' if pd.isna(brands[row]) or not brands[row] else str(brands[row])
+            self._brand_labels = labels
+        return self._brand_labels
+    
+    @staticmethod
+    def _cache_key(query: str,
+                   filters: Dict[str, Any],
+                   limit: int,
+                   fields: Optional[List[str]] = None,
+                   facets: Optional[List[str]] = None) -> str:
+        """
+        Cache key from a normalized query, canonical filters, the field projection and facets.
+        
+        Filters that do not restrict anything (None values, empty brand,
+        relevance sorting) are dropped and prices compared as floats, so
+        equivalent requests share one entry.
+        """
+        canonical = {}
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name == 'brand' and not value:
+                continue
+            if name == 'sort_by' and value == 'relevance':
+                continue
+            if name in ('min_price', 'max_price'):
+                value = float(value)
+            canonical[name] = value
+        key = {'query': query, 'filters': canonical, 'limit': limit}
+        if fields is not None:
+            key['fields'] = list(fields)
+        if facets:
+            key['facets'] = sorted(set(facets))
+        return json.dumps(key, sort_keys=True, default=str)
+    
+    def _text_search(self,
+                     query: str,
+                     doc_mask: Optional[np.ndarray] = None,
+                     bm25_bounds: Optional[Tuple[float, float]] = None,
+                     timer: Optional[StageTimer] = None) -> List[Tuple[int, float]]:
+        """
+        Perform text search using BM25 and multi-signal ranking.
+        
+        BM25 is normalized over every matching document, so filtering by
+        doc_mask does not change scores; filtered-out candidates just skip
+        the multi-signal ranking. bm25_bounds overrides the normalization
+        range, e.g. with the range over every shard of a catalog.
+        """
+        if timer is None:
+            timer = StageTimer()
+        query_terms = self.analyzer.analyze(query)
+        timer.lap('tokenize')
+        
+        # Candidates: every document containing a query term, in doc id order
+        # so ties rank deterministically
+        term_scores = self._query_term_scores(query_terms)
+        if not term_scores:
             return []
+        doc_ids = np.unique(np.concatenate([scores.doc_ids for scores in term_scores]))
+        timer.lap('candidates')
         
-        # Get all BM25 scores for normalization
-        all_bm25_scores = list(bm25_scores.values())
+        # BM25, accumulated term-at-a-time in query order
+        raw_scores = accumulate(term_scores, doc_ids)
+        if bm25_bounds is None:
+            bm25_bounds = (raw_scores.min(), raw_scores.max())
+        timer.lap('bm25')
+        
+        if doc_mask is not None:
+            keep = doc_mask[doc_ids]
+            doc_ids, raw_scores = doc_ids[keep], raw_scores[keep]
+            timer.lap('filter')
+            if not len(doc_ids):
+                return []
         
         # Calculate multi-signal scores
-        final_scores = {}
-        for doc_id, bm25_score in bm25_scores.items():
-            final_score = self._calculate_multi_signal_score(
-                doc_id=doc_id,
-                query=query,
-                bm25_score=bm25_score,
-                all_bm25_scores=all_bm25_scores
-            )
-            final_scores[doc_id] = final_score
+        final_scores = self._rank_candidates(query, doc_ids, raw_scores, bm25_bounds)
         
         # Convert to sorted list
-        results = [(doc_id, score) for doc_id, score in final_scores.items()]
-        results.sort(key=lambda x: x[1], reverse=True)
+        ranking = np.argsort(-final_scores, kind='stable')
+        results = list(zip(doc_ids[ranking].tolist(), final_scores[ranking].tolist()))
+        timer.lap('ranking')
+        return results
+    
+    def _text_search_top_k(self,
+                           query: str,
+                           k: int,
+                           doc_mask: Optional[np.ndarray] = None,
+                           bm25_bounds: Optional[Tuple[float, float]] = None,
+                           timer: Optional[StageTimer] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k text search with MaxScore dynamic pruning.
         
+        Produces exactly the first k results of _text_search (with the same
+        bm25_bounds). The BM25 normalization range is found first unless
+        given; documents are then only fully scored while their upper-bound
+        final score can reach the top k, so candidate generation, BM25 and
+        ranking interleave and are timed as one 'ranking' stage.
+        """
+        if timer is None:
+            timer = StageTimer()
+        query_terms = self.analyzer.analyze(query)
+        timer.lap('tokenize')
+        
+        term_scores = self._query_term_scores(query_terms)
+        if not term_scores:
+            return []
+        timer.lap('candidates')
+        
+        bounds = bm25_bounds if bm25_bounds is not None else self._bm25_range(term_scores)
+        timer.lap('bm25')
+        
+        # Best possible score of any document, given an upper bound on its BM25
+        features = self.features
+        static_upper = (
+            RANKING_WEIGHTS['exact_match'] * 100.0 +
+            RANKING_WEIGHTS['brand'] * (100.0 if self._brand_hits(query).any() else 0.0) +
+            RANKING_WEIGHTS['popularity'] * float(features.popularity.max(initial=0.0)) +
+            RANKING_WEIGHTS['price'] * float(features.price_score.max(initial=0.0))
+        )
+        
+        def global_bound(bm25_upper: float) -> float:
+            if bounds[1] == bounds[0]:
+                normalized = 50.0
+            else:
+                normalized = min(100.0, max(0.0, (bm25_upper - bounds[0]) / (bounds[1] - bounds[0]) * 100))
+            return RANKING_WEIGHTS['bm25'] * normalized + static_upper
+        
+        doc_ids, scores = max_score_top_k(
+            term_scores, k,
+            score=lambda doc_ids, bm25: self._rank_candidates(query, doc_ids, bm25, bounds),
+            upper_bound=lambda doc_ids, bm25_upper: self._rank_candidates(
+                query, doc_ids, bm25_upper, bounds, exact_match_score=np.full(len(doc_ids), 100.0)
+            ),
+            global_bound=global_bound,
+            doc_mask=doc_mask
+        )
+        results = list(zip(doc_ids.tolist(), scores.tolist()))
+        timer.lap('ranking')
         return results
     
-    def _apply_filters(self, results: List[Tuple[int, float]], filters: Dict[str, Any]) -> List[Tuple[int, float]]:
-        """Apply filters to search results"""
-        filtered_results = []
+    def _correct_query(self, query: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Replace out-of-vocabulary terms of a normalized query by the closest indexed terms.
         
-        for doc_id, score in results:
-            product = self.products.loc[doc_id]
-            
-            # Price filter
-            if 'min_price' in filters and filters['min_price'] is not None:
-                if product['price'] < filters['min_price']:
-                    continue
-            
-            if 'max_price' in filters and filters['max_price'] is not None:
-                if product['price'] > filters['max_price']:
-                    continue
-            
-            # Brand filter
-            if 'brand' in filters and filters['brand']:
-                if product['brand'] != filters['brand']:
-                    continue
-            
-            # Availability filter
-            if 'availability' in filters and filters['availability'] is not None:
-                if product['availability'] != filters['availability']:
-                    continue
-            
-            filtered_results.append((doc_id, score))
+        A correction is only adopted if some product contains more of the
+        corrected query's terms than any product contains of the query as
+        typed, so a real word the catalog lacks (a brand that was removed)
+        isn't swapped for an unrelated lookalike.
         
-        return filtered_results
+        Returns:
+            (query to run, {misspelled term: correction}); the query is
+            unchanged if every term is indexed or no correction is close enough
+        """
+        if not self.typo_tolerance or not query:
+            return query, {}
+        vocabulary = self.term_doc_freq
+        if all(term in vocabulary for term in self.analyzer.analyze(query)):
+            return query, {}
+        if self._spelling is None:
+            self._spelling = SpellingIndex.build(vocabulary)
+        corrected, corrections = self._spelling.correct(query, vocabulary)
+        if corrections and self._term_coverage(corrected) <= self._term_coverage(query):
+            return query, {}
+        return corrected, corrections
+    
+    def _term_coverage(self, query: str) -> int:
+        """Most distinct terms of query that one document contains"""
+        terms = list(dict.fromkeys(self.analyzer.analyze(query)))
+        doc_ids = [scores.doc_ids for scores in self._query_term_scores(terms)]
+        if not doc_ids:
+            return 0
+        return int(np.bincount(np.concatenate(doc_ids)).max())
+    
+    def _query_term_scores(self, query_terms: List[str]) -> List[TermScores]:
+        """TermScores of each query term occurrence that has postings, in query order"""
+        term_scores = [self._term_scores(term) for term in query_terms]
+        return [scores for scores in term_scores if scores is not None]
+    
+    def _bm25_range(self, term_scores: List[TermScores]) -> Tuple[float, float]:
+        """
+        (min, max) BM25 over every candidate, as in exhaustive normalization.
+        
+        The minimum comes from lower-bound pruning, the maximum from a top-1
+        MaxScore pass; neither scores every candidate.
+        """
+        _, top_bm25 = max_score_top_k(
+            term_scores, 1,
+            score=lambda doc_ids, bm25: bm25,
+            upper_bound=lambda doc_ids, bm25_upper: bm25_upper,
+            global_bound=lambda bm25_upper: bm25_upper
+        )
+        return min_score(term_scores), float(top_bm25[0])
     
-    def _sort_results(self, results: List[Tuple[int, float]], sort_by: str) -> List[Tuple[int, float]]:
-        """Sort results based on specified criteria"""
-        if sort_by == 'price_low':
-            return sorted(results, key=lambda x: self.products.loc[x[0], 'price'])
-        elif sort_by == 'price_high':
-            return sorted(results, key=lambda x: self.products.loc[x[0], 'price'], reverse=True)
-        elif sort_by == 'reviews':
-            return sorted(results, key=lambda x: self.products.loc[x[0], 'rating_count'], reverse=True)
-        else:  # relevance (default)
-            return results  # Already sorted by relevance
+    def _term_scores(self, term: str) -> Optional[TermScores]:
+        """BM25 contributions of a term as doc-id-sorted arrays, cached until the index changes"""
+        with self._memo_lock:
+            cached = self._term_scores_cache.get(term)
+            if cached is not None:
+                self._term_scores_cache.move_to_end(term)
+                return cached
+        
+        postings = self.inverted_index.arrays(term)
+        if postings is None:
+            return None
+        
+        doc_ids, tfs = postings
+        tfs = tfs.astype(np.float64)
+        doc_lengths = self.doc_lengths.array[doc_ids].astype(np.float64)
+        
+        doc_freq, total_docs = self._idf_stats()
+        idf = calculate_idf(doc_freq.get(term, 0), total_docs)
+        scores = calculate_bm25_term_score(tfs, idf, doc_lengths, self.avg_doc_length)
+        
+        term_scores = TermScores(doc_ids, scores, float(scores.max()))
+        with self._memo_lock:
+            self._term_scores_cache[term] = term_scores
+            if len(self._term_scores_cache) > self.term_scores_cache_size:
+                self._term_scores_cache.popitem(last=False)
+        return term_scores
+    
+    def _filter_mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        Doc-id bitmap of products passing the filters (None if unfiltered).
+        
+        Price ranges are bisected from the sorted price index; brand and
+        availability come from per-value bitmaps. A missing price never
+        fails a price filter.
+        """
+        mask = None
+        
+        def narrow(bitmap):
+            nonlocal mask
+            mask = bitmap.copy() if mask is None else mask & bitmap
+        
+        if filters.get('min_price') is not None or filters.get('max_price') is not None:
+            narrow(self._price_bitmap(filters.get('min_price'), filters.get('max_price')))
+        if filters.get('brand'):
+            narrow(self._value_bitmap('brand', filters['brand']))
+        if filters.get('availability') is not None:
+            narrow(self._value_bitmap('availability', filters['availability']))
+        return mask
+    
+    def _priced_count(self) -> int:
+        """Number of price index entries with a price (unpriced ones are at the end)"""
+        return int(np.searchsorted(self.price_index_prices, np.nan))
+    
+    def _price_bitmap(self, min_price: Optional[float], max_price: Optional[float]) -> np.ndarray:
+        """Bitmap of products priced within [min_price, max_price], plus unpriced ones"""
+        priced = self._priced_count()
+        prices = self.price_index_prices[:priced]
+        # A NaN bound compares false with every price, so like a missing one it does not narrow
+        start = 0
+        if min_price is not None and not math.isnan(min_price):
+            start = np.searchsorted(prices, min_price, side='left')
+        end = priced
+        if max_price is not None and not math.isnan(max_price):
+            end = np.searchsorted(prices, max_price, side='right')
+        
+        bitmap = np.zeros(len(self.products), dtype=bool)
+        bitmap[self.price_index_docs[start:max(start, end)]] = True
+        bitmap[self.price_index_docs[priced:]] = True
+        return bitmap
+    
+    def _value_bitmap(self, column: str, value: Any) -> np.ndarray:
+        """Bitmap of products whose column equals value, cached until the index changes"""
+        key = (column, value)
+        with self._memo_lock:
+            bitmap = self._filter_bitmaps.get(key)
+            if bitmap is not None:
+                self._filter_bitmaps.move_to_end(key)
+                return bitmap
+        
+        if column == 'brand':
+            bitmap = np.zeros(len(self.products), dtype=bool)
+            bitmap[self.brand_index.get(value, [])] = True
+        else:
+            bitmap = np.array(self.products[column].to_numpy() == value, dtype=bool)
+            if bitmap.ndim == 0:
+                bitmap = np.full(len(self.products), bool(bitmap))
+        
+        with self._memo_lock:
+            self._filter_bitmaps[key] = bitmap
+            if len(self._filter_bitmaps) > self.filter_bitmaps_size:
+                self._filter_bitmaps.popitem(last=False)
+        return bitmap
+    
+    def _sort_results(self,
+                      results: List[Tuple[int, float]],
+                      sort_by: str,
+                      limit: int) -> List[Tuple[int, float]]:
+        """
+        First `limit` results in sort_by order.
+        
+        Price and review sorts compare precomputed ranks and select the top
+        `limit` with argpartition instead of sorting every result; ties keep
+        the incoming (relevance) order.
+        """
+        if limit <= 0:
+            return []
+        if sort_by not in SORT_KEYS:  # relevance (default)
+            return results[:limit]  # Already sorted by relevance
+        
+        doc_ids = np.fromiter((doc_id for doc_id, _ in results), dtype=np.int64, count=len(results))
+        # Rank first, incoming position second, as one unique integer key
+        keys = self._sort_order(sort_by).ranks[doc_ids].astype(np.int64) * len(results) + np.arange(len(results))
+        if limit < len(results):
+            top = np.argpartition(keys, limit - 1)[:limit]
+            top = top[np.argsort(keys[top])]
+        else:
+            top = np.argsort(keys)
+        return [results[i] for i in top.tolist()]
+    
+    def _build_sort_orders(self):
+        """Precompute the global orderings for every non-relevance sort"""
+        for sort_by in SORT_KEYS:
+            self._sort_order(sort_by)
+    
+    def _sort_order(self, sort_by: str) -> SortOrder:
+        """
+        Global ordering for sort_by, built on first use after an index change.
+        
+        Relevance (or an unknown sort_by) orders by doc id, which is how an
+        empty query ranks the catalog.
+        """
+        if sort_by not in SORT_KEYS:
+            sort_by = 'relevance'
+        order = self._sort_orders.get(sort_by)
+        if order is None:
+            if sort_by == 'relevance':
+                keys = np.zeros(len(self.products))
+            else:
+                keys = SORT_KEYS[sort_by](self.features)
+            # np.unique sorts NaN (missing price) last
+            sorted_keys, ranks = np.unique(keys, return_inverse=True)
+            rank_starts = np.searchsorted(np.sort(ranks), np.arange(len(sorted_keys) + 1))
+            order = SortOrder(np.argsort(ranks, kind='stable'), ranks, sorted_keys, rank_starts)
+            self._sort_orders[sort_by] = order
+        return order
     
     def get_brands(self) -> List[str]:
         """Get list of all unique brands"""
@@ -393,8 +2038,8 @@ class EcommerceSearchEngine:
     
     def get_price_range(self) -> Tuple[float, float]:
         """Get min and max prices in the catalog"""
-        if self.price_index:
-            return self.price_index[0][1], self.price_index[-1][1]
+        if len(self.price_index_prices):
+            return float(self.price_index_prices[0]), float(self.price_index_prices[-1])
         return 0.0, 0.0
     
     def _get_cache_hit_rate(self) -> float:
@@ -406,29 +2051,54 @@ class EcommerceSearchEngine:
     def get_stats(self) -> Dict[str, Any]:
         """Get search engine statistics"""
         return {
-            'total_products': len(self.products),
+            'total_products': len(self.products) - len(self.deleted_docs),
+            'deleted_docs': len(self.deleted_docs),
             'index_size': len(self.inverted_index),
+            'index_postings': self.inverted_index.num_postings,
+            'index_bytes': self._index_memory(),
+            'bytes_per_posting': self.inverted_index.memory_bytes() / max(self.inverted_index.num_postings, 1),
             'unique_terms': len(self.term_doc_freq),
             'unique_brands': len(self.brand_index),
             'cache_hit_rate': self._get_cache_hit_rate(),
             'avg_search_time_ms': self.avg_search_time * 1000,
+            'latency_ms': self.latency.summary(),
+            'slow_queries': len(self.latency.slow_queries),
+            'analyzer_cache': self.analyzer.cache_info(),
             'index_build_time_s': self.index_build_time,
+            'index_build_docs_per_sec': self.index_build_throughput,
             'cache_size': len(self.cache),
+            'cache_bytes': self.cache.size_bytes,
+            'cache_evictions': self.cache.evictions,
+            'index_generation': self.index_generation,
             'total_searches': self.total_searches,
-            'avg_doc_length': self.avg_doc_length
+            'avg_doc_length': self.avg_doc_length,
+            'content_hash': self.content_hash
         }
     
+    def _index_memory(self) -> int:
+        """Estimated bytes held by postings, document frequencies and document lengths"""
+        doc_freq_bytes = sys.getsizeof(self.term_doc_freq) + 32 * len(self.term_doc_freq)  # dict + boxed counts
+        return self.inverted_index.memory_bytes() + doc_freq_bytes + self.doc_lengths.memory_bytes()
+    
+    def get_slow_queries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recent searches slower than the slow-query threshold, newest first, with stage timings"""
+        return self.latency.recent_slow_queries(limit)
+    
     def clear_cache(self):
         """Clear the search cache"""
         self.cache.clear()
-        self.cache_hits = 0
-        self.total_searches = 0
+        self._cache_hit_count.reset()
+        self._searches.reset()
         print("Cache cleared")
     
     def similarity_search(self, doc_id: int, limit: int = 5) -> List[Tuple[int, float]]:
         """
         Find similar products based on brand, price range, and shared terms.
         
+        Candidates are the products sharing an LSH band with this one (likely
+        text neighbours), its brand, and its nearest prices; only they are
+        scored. Served from precompute_neighbours() while that is current.
+        
         Args:
             doc_id: Product ID to find similar items for
             limit: Maximum number of similar products to return
@@ -436,49 +2106,261 @@ class EcommerceSearchEngine:
         Returns:
             List of (doc_id, similarity_score) tuples
         """
-        if doc_id not in self.products.index:
+        if doc_id not in self.products.index or doc_id in self.deleted_docs:
             return []
         
-        base_product = self.products.loc[doc_id]
-        similarities = []
+        if (self.neighbours is not None and limit <= self._neighbours_limit
+                and self._neighbours_generation == self.index_generation):
+            return self.neighbours.get(doc_id, [])[:limit]
+        
+        candidates = self._similarity_candidates(doc_id, limit)
+        return self._rank_similar(doc_id, candidates, limit)
+    
+    def precompute_neighbours(self, limit: int = 10) -> int:
+        """
+        Batch job: compute and store the top `limit` similar products of every product.
         
-        # Get base product attributes
-        base_brand = str(base_product['brand'])
-        base_price = float(base_product['price'])
-        base_text = f"{base_product['title']} {base_product['product_description']}"
-        base_tokens = set(tokenize_text(base_text))
+        Results are served by similarity_search until the index next changes.
         
-        for other_id in self.products.index:
-            if other_id == doc_id:
-                continue
-            
-            other_product = self.products.loc[other_id]
-            score = 0.0
-            
-            # Brand match (40% weight)
-            if str(other_product['brand']) == base_brand:
-                score += 40.0
-            
-            # Price similarity (30% weight) - closer price = higher score
-            price_diff_pct = abs(float(other_product['price']) - base_price) / base_price if base_price > 0 else 1
-            price_score = max(0, 30.0 * (1 - price_diff_pct))
-            score += price_score
-            
-            # Text similarity (30% weight) - Jaccard similarity
-            other_text = f"{other_product['title']} {other_product['product_description']}"
-            other_tokens = set(tokenize_text(other_text))
+        Args:
+            limit: Neighbours stored per product
             
-            if base_tokens and other_tokens:
-                intersection = len(base_tokens & other_tokens)
-                union = len(base_tokens | other_tokens)
-                jaccard = intersection / union if union > 0 else 0
-                score += 30.0 * jaccard
+        Returns:
+            Number of products processed
+        """
+        start_time = time.time()
+        doc_ids = [doc_id for doc_id in range(len(self.products)) if doc_id not in self.deleted_docs]
+        # Tokenize every product once instead of once per lookup
+        token_sets = [set(tokens) for tokens in self.analyzer.analyze_many(self._similarity_texts(self.products))]
+        
+        self.neighbours = {
+            doc_id: self._rank_similar(doc_id, self._similarity_candidates(doc_id, limit), limit, token_sets)
+            for doc_id in doc_ids
+        }
+        self._neighbours_limit = limit
+        self._neighbours_generation = self.index_generation
+        print(f"Precomputed {limit} neighbours for {len(doc_ids)} products in {time.time() - start_time:.2f}s")
+        return len(doc_ids)
+    
+    def _build_similarity_index(self):
+        """MinHash signatures and LSH buckets for every live product"""
+        similarity_index = MinHashLSH()
+        doc_ids = [doc_id for doc_id in range(len(self.products)) if doc_id not in self.deleted_docs]
+        signatures = similarity_index.signatures_for(self._similarity_tokens(doc_ids))
+        similarity_index.add(doc_ids, signatures)
+        # Published complete, as concurrent similarity searches may be building it too
+        self.similarity_index = similarity_index
+    
+    @staticmethod
+    def _similarity_texts(products: pd.DataFrame) -> List[str]:
+        """Text compared by similarity_search: title and description"""
+        return [f"{title} {description}"
+                for title, description in zip(products['title'].tolist(), products['product_description'].tolist())]
+    
+    def _similarity_tokens(self, doc_ids: List[int]) -> List[List[str]]:
+        return self.analyzer.analyze_many(self._similarity_texts(self.products.loc[doc_ids]))
+    
+    def _similarity_candidates(self, doc_id: int, limit: int) -> np.ndarray:
+        """Sorted doc ids worth scoring against doc_id: LSH band matches, same brand, nearest prices"""
+        if self.similarity_index is None:
+            self._build_similarity_index()
+        candidates = self.similarity_index.candidates(doc_id)
+        
+        brand = str(self.products.at[doc_id, 'brand'])
+        if brand in self.brand_index:
+            candidates.update(self.brand_index[brand])
+        else:
+            # Unbranded products are not in the brand index but still match each other
+            brands = self.products['brand'].astype(str).to_numpy()
+            candidates.update(np.flatnonzero(brands == brand).tolist())
+        
+        # Nearest-priced products on either side
+        price = float(self.features.price[doc_id])
+        if not math.isnan(price):
+            window = max(4 * limit, 32)
+            position = int(np.searchsorted(self.price_index_prices[:self._priced_count()], price))
+            candidates.update(self.price_index_docs[max(0, position - window):position + window].tolist())
+        
+        candidates.discard(doc_id)
+        candidates.difference_update(self.deleted_docs)
+        return np.array(sorted(candidates), dtype=np.int64)
+    
+    def _rank_similar(self,
+                      doc_id: int,
+                      candidates: np.ndarray,
+                      limit: int,
+                      token_sets: Optional[List[Set[str]]] = None) -> List[Tuple[int, float]]:
+        """
+        Score candidates against doc_id and return the top `limit`.
+        
+        Brand match (40), price closeness (30) and Jaccard similarity of
+        title + description tokens (30).
+        """
+        if not len(candidates):
+            return []
+        
+        if token_sets is None:
+            texts = self._similarity_texts(self.products.loc[[doc_id] + candidates.tolist()])
+            base_tokens, *other_tokens = [set(tokens) for tokens in self.analyzer.analyze_many(texts)]
+        else:
+            base_tokens = token_sets[doc_id]
+            other_tokens = [token_sets[other_id] for other_id in candidates.tolist()]
+        
+        # Brand match (40% weight)
+        brands = self.products['brand'].to_numpy()
+        base_brand = str(brands[doc_id])
+        scores = np.array([40.0 if str(brand) == base_brand else 0.0 for brand in brands[candidates]])
+        
+        # Price similarity (30% weight) - closer price = higher score; unknown prices score 0
+        base_price = float(self.features.price[doc_id])
+        if base_price > 0:
+            price_diff_pct = np.abs(self.features.price[candidates] - base_price) / base_price
+            price_score = 30.0 * (1 - price_diff_pct)
+            scores += np.where(price_score > 0, price_score, 0.0)
+        
+        # Text similarity (30% weight) - Jaccard similarity
+        if base_tokens:
+            jaccard = np.array([
+                len(base_tokens & tokens) / len(base_tokens | tokens) if tokens else 0.0
+                for tokens in other_tokens
+            ])
+            scores += 30.0 * jaccard
+        
+        # Sort by score (ties by doc id) and return top results
+        top = np.argsort(-scores, kind='stable')[:limit]
+        return list(zip(candidates[top].tolist(), scores[top].tolist()))
+
+
+class CatalogSync:
+    """
+    Process-wide search engine kept in step with the Supabase catalog.
+    
+    The engine is built once from the full table on first use. After that,
+    at most every sync_interval seconds, only rows inserted since the last
+    sync are fetched and applied (updating products whose ASIN is already
+    indexed, adding the rest):
+    - by insert time, when the table exposes a created_at column
+    - otherwise by ASIN, fetching only rows whose ASIN is not indexed yet
+    
+    A published engine is never modified: a sync applies its rows to a
+    copy and swaps it in, so searches holding the previous engine finish on
+    a consistent index. One thread syncs at a time; the others keep being
+    served the current engine instead of waiting. A failed sync is logged
+    and retried after another sync_interval, the current engine still
+    being served.
+    """
+    
+    def __init__(self, table: str = CATALOG_TABLE, sync_interval: float = CATALOG_SYNC_INTERVAL):
+        self.table = table
+        self.sync_interval = sync_interval
+        self.engine: Optional[EcommerceSearchEngine] = None
+        self.last_sync = 0.0
+        self.last_created_at: Optional[str] = None
+        self.known_asins: Set[str] = set()
+        self._client: Optional[Client] = None
+        self._lock = threading.Lock()
+    
+    def get_engine(self) -> EcommerceSearchEngine:
+        """Return the live engine, building it or applying a delta sync when due"""
+        engine = self.engine
+        if engine is None:
+            with self._lock:
+                if self.engine is None:
+                    self._full_load()
+                return self.engine
+        
+        if time.time() - self.last_sync >= self.sync_interval and self._lock.acquire(blocking=False):
+            try:
+                if time.time() - self.last_sync >= self.sync_interval:
+                    self._delta_sync()
+            except Exception:
+                # Supabase unreachable or a bad row: keep the working engine rather than fail every call
+                logger.exception("Catalog delta sync failed; retrying in %.0fs", self.sync_interval)
+                self.last_sync = time.time()
+            finally:
+                self._lock.release()
+            engine = self.engine
+        return engine
+    
+    def request_sync(self):
+        """Make the next get_engine() call sync (e.g. after the crawler stored new products)"""
+        self.last_sync = 0.0
+    
+    def _get_client(self) -> Client:
+        if self._client is None:
+            self._client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return self._client
+    
+    def _full_load(self):
+        response = self._get_client().table(self.table).select('*').execute()
+        data = pd.DataFrame(response.data)
+        
+        engine = EcommerceSearchEngine()
+        engine.load_data(df=data)
+        engine.refresh_autocomplete()
+        
+        self.engine = engine
+        self._track(data)
+        self.last_sync = time.time()
+    
+    def _delta_sync(self) -> int:
+        """Apply rows inserted since the last sync; returns the number of rows fetched"""
+        client = self._get_client()
+        
+        if self.last_created_at is not None:
+            response = (
+                client.table(self.table).select('*')
+                .gt('created_at', self.last_created_at)
+                .order('created_at')
+                .execute()
+            )
+            rows = response.data
+        else:
+            response = client.table(self.table).select('asin').execute()
+            new_asins = sorted({row['asin'] for row in response.data if row.get('asin')} - self.known_asins)
+            rows = []
+            for start in range(0, len(new_asins), 100):
+                response = client.table(self.table).select('*').in_('asin', new_asins[start:start + 100]).execute()
+                rows.extend(response.data)
+        
+        if rows:
+            data = pd.DataFrame(rows)
             
-            similarities.append((other_id, score))
+            # Rows for products already in the index update them, the rest are added
+            engine = self.engine.copy()
+            new_rows = []
+            for row in rows:
+                asin = row.get('asin')
+                if asin is None or not engine.update_product(asin, row):
+                    new_rows.append(row)
+            if new_rows:
+                engine.add_products(pd.DataFrame(new_rows))
+            engine.refresh_autocomplete()
+            self.engine = engine
+            self._track(data)
         
-        # Sort by score and return top results
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:limit]
+        self.last_sync = time.time()
+        return len(rows)
+    
+    def _track(self, data: pd.DataFrame):
+        """Advance the sync cursor past the given rows"""
+        if 'created_at' in data.columns and data['created_at'].notna().any():
+            newest = str(data['created_at'].dropna().max())
+            if self.last_created_at is None or newest > self.last_created_at:
+                self.last_created_at = newest
+        if 'asin' in data.columns:
+            self.known_asins.update(str(asin) for asin in data['asin'].dropna())
+
+
+# Shared by every product_retriever call in this process
+catalog = CatalogSync()
+
+
+def _crawl_and_resync(search_query: str):
+    """Crawl the web for a query and pick up the stored products on the next search"""
+    products = crawl(search_query)
+    catalog.request_sync()
+    return products
 
 
 def product_retriever(search_query: str, min_relevance_threshold: float = 30.0):
@@ -494,19 +2376,14 @@ def product_retriever(search_query: str, min_relevance_threshold: float = 30.0):
         List of matching products or triggers web crawling if no good matches found
     """
     
-    # Fetch data from Supabase
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    response = supabase.table('testing').select('*').execute()
-    data = pd.DataFrame(response.data)
-    
-    # Initialize search engine
-    engine = EcommerceSearchEngine()
-    engine.load_data(df=data)
+    # Long-lived engine, delta-synced with the Supabase catalog
+    engine = catalog.get_engine()
     
     query = search_query.strip()
     
-    # Perform search with improved BM25 + multi-signal ranking
-    result = engine.search(query, filters=None, limit=5)
+    # Perform search with improved BM25 + multi-signal ranking; misspelled
+    # terms are corrected against the catalog first, so typos don't trigger a crawl
+    result = engine.search(query, filters=None, limit=5, top_k=True)
     
     # Check if we have good quality results
     # Scores are now normalized 0-100, so we can use meaningful thresholds
@@ -526,8 +2403,8 @@ def product_retriever(search_query: str, min_relevance_threshold: float = 30.0):
             # print(f"✗ No products found with relevance >= {min_relevance_threshold}. Triggering web crawl...")
             # best_score = max(p['relevance_score'] for p in result.results)
             # print(f"  (Best match in DB had score: {best_score:.2f})")
-            return crawl(search_query)
+            return _crawl_and_resync(search_query)
     else:
         # No results at all
         print("✗ No products found in database. Triggering web crawl...")
-        return crawl(search_query)
+        return _crawl_and_resync(search_query)
@@ -0,0 +1,125 @@
+"""
+Bulk inverted index builder for EcommerceSearchEngine.
+
+Tokenizes the searchable fields of a catalog in batches and optionally spreads
+the batches over a ProcessPoolExecutor. Each batch produces partial postings
+for a contiguous doc id range; partials are merged in doc id order so every
+posting list stays sorted by doc id.
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from utils import Analyzer
+
+# term -> {doc_id: term frequency}
+Postings = Dict[str, Dict[int, int]]
+
+
+# Product columns indexed for text search, in token order
+SEARCHABLE_FIELDS = ('title', 'product_description', 'brand')
+
+
+def searchable_fields(products: pd.DataFrame) -> List[List[str]]:
+    """
+    Text of each searchable field as columns ([titles, descriptions, brands]).
+    
+    A product's tokens are those of f"{title} {description} {brand}".
+    """
+    return [[f"{value}" for value in products[column].tolist()] for column in SEARCHABLE_FIELDS]
+
+
+def index_partition(start_id: int,
+                    fields: List[List[str]],
+                    analyzer: Optional[Analyzer] = None) -> Tuple[Postings, List[int]]:
+    """
+    Build partial postings for a contiguous range of documents.
+    
+    Args:
+        start_id: Doc id of the first document
+        fields: Searchable field columns (see searchable_fields)
+        analyzer: Analyzer to tokenize with (a fresh one if None)
+        
+    Returns:
+        (postings, doc_lengths) where doc_lengths[i] belongs to start_id + i
+    """
+    if analyzer is None:
+        analyzer = Analyzer()
+    postings: Postings = {}
+    doc_lengths = []
+    
+    for doc_id, tokens in enumerate(analyzer.analyze_fields(fields), start=start_id):
+        doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_postings = postings.get(term)
+            if term_postings is None:
+                postings[term] = {doc_id: tf}
+            else:
+                term_postings[doc_id] = tf
+    
+    return postings, doc_lengths
+
+
+def _index_partition_args(args: Tuple[int, List[List[str]]]) -> Tuple[Postings, List[int]]:
+    return index_partition(*args)
+
+
+def merge_partitions(partials: List[Tuple[Postings, List[int]]]) -> Tuple[Postings, Dict[str, int], Dict[int, int]]:
+    """
+    Merge partial indexes built over consecutive doc id ranges.
+    
+    Args:
+        partials: (postings, doc_lengths) pairs in doc id order, starting at doc id 0
+        
+    Returns:
+        (postings, term_doc_freq, doc_lengths)
+    """
+    postings: Postings = {}
+    doc_lengths: Dict[int, int] = {}
+    
+    for partial_postings, partial_lengths in partials:
+        start_id = len(doc_lengths)
+        doc_lengths.update(enumerate(partial_lengths, start=start_id))
+        
+        for term, term_postings in partial_postings.items():
+            merged = postings.get(term)
+            if merged is None:
+                postings[term] = term_postings
+            else:
+                merged.update(term_postings)
+    
+    term_doc_freq = {term: len(term_postings) for term, term_postings in postings.items()}
+    return postings, term_doc_freq, doc_lengths
+
+
+def build_inverted_index(
+    fields: List[List[str]],
+    workers: int = 1,
+    batch_size: int = 10000,
+    analyzer: Optional[Analyzer] = None
+) -> Tuple[Postings, Dict[str, int], Dict[int, int]]:
+    """
+    Build frequency postings, document frequencies and document lengths.
+    
+    Args:
+        fields: Searchable field columns (see searchable_fields); doc ids are row positions
+        workers: Number of worker processes (1 builds in-process)
+        batch_size: Number of documents tokenized per batch
+        analyzer: Analyzer for in-process builds (worker processes use their own)
+        
+    Returns:
+        (postings, term_doc_freq, doc_lengths)
+    """
+    num_docs = len(fields[0]) if fields else 0
+    batches = [
+        (start, [column[start:start + batch_size] for column in fields])
+        for start in range(0, num_docs, batch_size)
+    ]
+    
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            partials = list(executor.map(_index_partition_args, batches))
+    else:
+        partials = [index_partition(start, batch, analyzer) for start, batch in batches]
+    
+    return merge_partitions(partials)
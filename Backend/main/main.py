@@ -2,8 +2,8 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import os, json, inspect, uuid
 from ddgs import DDGS
-from tools import all_tools
-from finder import product_retriever
+from main.tools import all_tools
+from main.finder import product_retriever
 import os
 from database.store_chat import store_message
 from crawler.crawl import *
@@ -0,0 +1,203 @@
+"""
+Latency instrumentation for search requests.
+
+StageTimer splits one request's latency into named stages. LatencyHistogram
+records latencies HDR-style: buckets are exact up to 2 ** precision_bits
+microseconds and log-linear above, so every recorded value is kept to
+within about 1 / 2 ** (precision_bits - 1) relative error at constant
+memory. Histograms roll over a time window made of slices; the oldest slice
+is dropped as the window advances, so percentiles reflect recent traffic.
+
+ShardedCounter counts from many threads without a shared lock: each thread
+adds to its own cell and reads sum the cells.
+"""
+from collections import deque
+import json
+import logging
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Lap timer attributing elapsed time to named stages (milliseconds)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages: Dict[str, float] = {}
+
+    def lap(self, stage: str):
+        """Charge the time since the previous lap to stage"""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def total(self) -> float:
+        """Milliseconds since the timer started"""
+        return (time.perf_counter() - self.started) * 1000
+
+
+class ShardedCounter:
+    """
+    Counter that threads increment without contending on a lock or losing updates.
+
+    Each thread owns a cell that only it writes; value() sums every cell.
+    Cells of finished threads are kept, so nothing they counted is lost.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells: List[List[float]] = []
+        self._cells_lock = threading.Lock()  # only taken when a thread adds its cell
+        self._base = 0.0
+
+    def add(self, amount: float = 1):
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._local.cell = [0]
+            with self._cells_lock:
+                self._cells.append(cell)
+        cell[0] += amount
+
+    def value(self) -> float:
+        return sum(cell[0] for cell in list(self._cells)) - self._base
+
+    def reset(self):
+        """Start counting from zero (increments racing with the reset may land on either side)"""
+        self._base += self.value()
+
+
+class LatencyHistogram:
+    """Rolling log-linear histogram of latencies in milliseconds"""
+
+    def __init__(self, window: float = 300.0, slices: int = 5, precision_bits: int = 7):
+        """
+        Args:
+            window: Seconds of history the percentiles cover
+            slices: Number of sub-windows the history is rotated in
+            precision_bits: log2 of the number of exact buckets (relative error ~ 2 ** -(bits - 1))
+        """
+        self.slice_seconds = window / slices
+        self.precision_bits = precision_bits
+        self._sub_buckets = 1 << precision_bits
+        self._slices: Deque[Dict[int, int]] = deque([{}], maxlen=slices)
+        self._maxima: Deque[float] = deque([0.0], maxlen=slices)
+        self._slice_started = time.monotonic()
+
+    def record(self, milliseconds: float):
+        self._rotate()
+        bucket = self._bucket(max(int(milliseconds * 1000), 0))
+        counts = self._slices[-1]
+        counts[bucket] = counts.get(bucket, 0) + 1
+        if milliseconds > self._maxima[-1]:
+            self._maxima[-1] = milliseconds
+
+    def summary(self) -> Dict[str, float]:
+        """count, p50, p95, p99 and max over the window (0 when empty)"""
+        self._rotate()
+        counts: Dict[int, int] = {}
+        for slice_counts in self._slices:
+            for bucket, count in slice_counts.items():
+                counts[bucket] = counts.get(bucket, 0) + count
+        total = sum(counts.values())
+        summary = {'count': total, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': max(self._maxima)}
+        if not total:
+            return summary
+
+        targets = [('p50', 0.50), ('p95', 0.95), ('p99', 0.99)]
+        seen = 0
+        for bucket in sorted(counts):
+            seen += counts[bucket]
+            while targets and seen >= targets[0][1] * total:
+                name, _ = targets.pop(0)
+                # Report the bucket's upper edge, capped by the true maximum
+                summary[name] = min(self._upper_edge(bucket) / 1000, summary['max'])
+            if not targets:
+                break
+        return summary
+
+    def _rotate(self):
+        now = time.monotonic()
+        while now - self._slice_started >= self.slice_seconds:
+            self._slices.append({})
+            self._maxima.append(0.0)
+            self._slice_started += self.slice_seconds
+            if now - self._slice_started >= self.slice_seconds * self._slices.maxlen:
+                # Idle for a whole window: start over rather than rotating slice by slice
+                self._slice_started = now
+
+    def _bucket(self, microseconds: int) -> int:
+        if microseconds < self._sub_buckets:
+            return microseconds
+        shift = microseconds.bit_length() - self.precision_bits
+        half = self._sub_buckets >> 1
+        return self._sub_buckets + (shift - 1) * half + ((microseconds >> shift) - half)
+
+    def _upper_edge(self, bucket: int) -> int:
+        if bucket < self._sub_buckets:
+            return bucket
+        half = self._sub_buckets >> 1
+        shift = (bucket - self._sub_buckets) // half + 1
+        mantissa = (bucket - self._sub_buckets) % half + half
+        return ((mantissa + 1) << shift) - 1
+
+
+class LatencyTracker:
+    """Per-stage and overall latency histograms plus a slow-query log"""
+
+    def __init__(self, slow_query_ms: float = 100.0, window: float = 300.0, slow_log_size: int = 100):
+        """
+        Args:
+            slow_query_ms: Requests at least this slow are logged (None disables the log)
+            window: Seconds of history the histograms cover
+            slow_log_size: Number of recent slow queries kept in memory
+        """
+        self.slow_query_ms = slow_query_ms
+        self.window = window
+        self.total = LatencyHistogram(window)
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        # Requests finish on many threads; histogram updates are short, so one lock serializes them
+        self._lock = threading.Lock()
+
+    def record(self, timer: StageTimer, total_ms: float, **context: Any):
+        """
+        Record a finished request.
+
+        Args:
+            timer: The request's stage timer
+            total_ms: End-to-end latency
+            context: Request details for the slow-query log (query, filters, ...)
+        """
+        with self._lock:
+            self.total.record(total_ms)
+            for stage, milliseconds in timer.stages.items():
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = LatencyHistogram(self.window)
+                histogram.record(milliseconds)
+
+        if self.slow_query_ms is not None and total_ms >= self.slow_query_ms:
+            entry = {
+                'timestamp': time.time(),
+                'total_ms': round(total_ms, 3),
+                'stages_ms': {stage: round(ms, 3) for stage, ms in timer.stages.items()},
+                **context,
+            }
+            self.slow_queries.append(entry)
+            logger.warning("slow query %s", json.dumps(entry, default=str))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Percentile summary per stage, plus 'total'"""
+        with self._lock:
+            summary = {stage: histogram.summary() for stage, histogram in self.stages.items()}
+            summary['total'] = self.total.summary()
+        return summary
+
+    def recent_slow_queries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent slow queries, newest first"""
+        entries = list(reversed(self.slow_queries))
+        return entries[:limit] if limit is not None else entries
@@ -0,0 +1,259 @@
+"""
+Positional index over product titles for exact and phrase match signals.
+
+Titles are split into word tokens, the maximal runs of regex word
+characters (\\w), with their character spans. Token edges are therefore
+exactly the \\b positions of the title, so a query that starts and ends on a
+word character occurs delimited by word boundaries precisely where its
+tokens appear as a phrase and the spanned title text equals the query.
+
+Tokens are stored as one flat stream (docs back to back) with an inverted
+view grouping stream positions by token. Updated or added titles go to a
+small overlay of per-doc arrays until the next repack, which only writers
+trigger (repack_if_needed); phrase_matches never modifies the index, so
+concurrent searches can share it. Packed arrays are only ever replaced,
+never written in place, so they can be memory-mapped from a snapshot.
+"""
+import copy
+import re
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+_WORD_RUN = re.compile(r'\w+')
+
+# (token ids, start offsets, end offsets) of one title
+TitleTokens = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def word_tokens(text: str) -> Tuple[List[str], List[int], List[int]]:
+    """Word tokens of text with their [start, end) character offsets"""
+    tokens, starts, ends = [], [], []
+    for match in _WORD_RUN.finditer(text):
+        tokens.append(match.group())
+        starts.append(match.start())
+        ends.append(match.end())
+    return tokens, starts, ends
+
+
+def _is_word_char(char: str) -> bool:
+    # Same character class as \w in str patterns
+    return char.isalnum() or char == '_'
+
+
+def has_bounded_occurrence(text: str, phrase: str) -> bool:
+    """
+    Whether phrase occurs in text with a word boundary on both sides.
+
+    Equivalent to re.search(rf'\\b{re.escape(phrase)}\\b', text) for any
+    non-empty phrase, including ones that begin or end with punctuation.
+    """
+    def boundary(i: int) -> bool:
+        before = i > 0 and _is_word_char(text[i - 1])
+        after = i < len(text) and _is_word_char(text[i])
+        return before != after
+
+    start = text.find(phrase)
+    while start != -1:
+        if boundary(start) and boundary(start + len(phrase)):
+            return True
+        start = text.find(phrase, start + 1)
+    return False
+
+
+class TitlePositions:
+    """Token positions of every title, with a per-token inverted view"""
+
+    def __init__(self, repack_ratio: float = 0.125):
+        """
+        Args:
+            repack_ratio: Fold overlay titles into the flat stream once they
+                          exceed this fraction of indexed docs
+        """
+        self.repack_ratio = repack_ratio
+        self.vocabulary: Dict[str, int] = {}
+
+        # Flat token stream; doc d owns doc_starts[d]:doc_starts[d] + doc_token_counts[d]
+        self.token_ids = np.empty(0, dtype=np.int32)
+        self.starts = np.empty(0, dtype=np.int32)
+        self.ends = np.empty(0, dtype=np.int32)
+        self.doc_starts = np.empty(0, dtype=np.int64)
+        self.doc_token_counts = np.empty(0, dtype=np.int32)
+
+        # Titles set since the last repack; they shadow the doc's stream entry
+        self._overlay: Dict[int, TitleTokens] = {}
+
+        # Inverted view: stream positions grouped by token id, rebuilt by repack()
+        self._positions = np.empty(0, dtype=np.int64)
+        self._token_offsets = np.zeros(1, dtype=np.int64)
+        self._position_docs = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def build(cls, titles: Sequence[str]) -> 'TitlePositions':
+        """Index titles for doc ids 0..len(titles) - 1"""
+        index = cls()
+        index._overlay = {doc_id: index._tokenize(title) for doc_id, title in enumerate(titles)}
+        index.repack()
+        return index
+
+    @classmethod
+    def from_arrays(cls, tokens: List[str], arrays: Dict[str, np.ndarray]) -> 'TitlePositions':
+        """
+        Index from the output of packed_arrays (e.g. memory-mapped from a snapshot).
+
+        Args:
+            tokens: Token of each token id
+            arrays: Array name -> values, as returned by packed_arrays
+        """
+        index = cls()
+        index.vocabulary = {token: token_id for token_id, token in enumerate(tokens)}
+        index.token_ids = arrays['token_ids']
+        index.starts = arrays['starts']
+        index.ends = arrays['ends']
+        index.doc_starts = arrays['doc_starts']
+        index.doc_token_counts = arrays['doc_token_counts']
+        index._positions = arrays['positions']
+        index._token_offsets = arrays['token_offsets']
+        index._position_docs = arrays['position_docs']
+        return index
+
+    def packed_arrays(self) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        Tokens by id and the arrays from_arrays restores this index from.
+
+        Overlay titles are folded into a repacked copy; this index is left as is.
+        """
+        packed = self
+        if self._overlay:
+            packed = copy.copy(self)
+            packed.repack()
+        tokens = sorted(packed.vocabulary, key=packed.vocabulary.get)
+        return tokens, {
+            'token_ids': packed.token_ids,
+            'starts': packed.starts,
+            'ends': packed.ends,
+            'doc_starts': packed.doc_starts,
+            'doc_token_counts': packed.doc_token_counts,
+            'positions': packed._positions,
+            'token_offsets': packed._token_offsets,
+            'position_docs': packed._position_docs,
+        }
+
+    def __len__(self) -> int:
+        return max(len(self.doc_starts), max(self._overlay, default=-1) + 1)
+
+    def set(self, doc_id: int, title: str):
+        """Index (or re-index) the lowercased title of a doc"""
+        self._overlay[doc_id] = self._tokenize(title)
+
+    def remove(self, doc_id: int):
+        """Drop a doc's title"""
+        self._overlay[doc_id] = self._tokenize('')
+
+    def compact(self, keep: np.ndarray):
+        """Drop the docs where keep is False and renumber doc ids densely"""
+        self.repack()
+        new_ids = np.cumsum(keep) - 1
+        kept = np.flatnonzero(keep[:len(self.doc_starts)])
+        self._overlay = {
+            int(new_ids[doc_id]): self._doc_tokens(doc_id) for doc_id in kept.tolist()
+        }
+        self.doc_starts = np.empty(0, dtype=np.int64)
+        self.doc_token_counts = np.empty(0, dtype=np.int32)
+        self.repack()
+
+    def repack(self):
+        """Fold overlay titles into the flat stream and rebuild the inverted view"""
+        if self._overlay:
+            num_docs = len(self)
+            titles = [self._doc_tokens(doc_id) for doc_id in range(num_docs)]
+            counts = np.fromiter((len(ids) for ids, _, _ in titles), dtype=np.int32, count=num_docs)
+            self.doc_starts = np.zeros(num_docs, dtype=np.int64)
+            np.cumsum(counts[:-1], out=self.doc_starts[1:])
+            self.doc_token_counts = counts
+            self.token_ids = np.concatenate([ids for ids, _, _ in titles] or [np.empty(0, dtype=np.int32)])
+            self.starts = np.concatenate([starts for _, starts, _ in titles] or [np.empty(0, dtype=np.int32)])
+            self.ends = np.concatenate([ends for _, _, ends in titles] or [np.empty(0, dtype=np.int32)])
+            self._overlay = {}
+
+        self._positions = np.argsort(self.token_ids, kind='stable')
+        self._token_offsets = np.searchsorted(self.token_ids[self._positions],
+                                              np.arange(len(self.vocabulary) + 1))
+        self._position_docs = np.repeat(np.arange(len(self.doc_starts)), self.doc_token_counts)
+
+    def repack_if_needed(self):
+        """Repack once overlay titles exceed repack_ratio of the indexed docs"""
+        if len(self._overlay) > self.repack_ratio * max(len(self.doc_starts), 1024):
+            self.repack()
+
+    def phrase_matches(self, phrase: List[str], doc_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Occurrences of a token sequence as consecutive tokens of candidate titles.
+
+        Args:
+            phrase: Word tokens, in order
+            doc_ids: Candidate doc ids (distinct)
+
+        Returns:
+            (index into doc_ids, start offset, end offset) of every occurrence
+        """
+        phrase_ids = [self.vocabulary.get(token) for token in phrase]
+        if not phrase or None in phrase_ids or not len(doc_ids):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+
+        # Candidates by doc id for membership tests
+        order = np.argsort(doc_ids, kind='stable')
+        sorted_ids = doc_ids[order]
+
+        # Stream occurrences of the first token in candidate (non-overlaid) docs
+        first = phrase_ids[0]
+        if first + 1 < len(self._token_offsets):
+            positions = self._positions[self._token_offsets[first]:self._token_offsets[first + 1]]
+        else:
+            positions = np.empty(0, dtype=np.int64)  # Token first seen in an overlaid title
+        docs = self._position_docs[positions]
+        slots = np.minimum(np.searchsorted(sorted_ids, docs), len(sorted_ids) - 1)
+        keep = sorted_ids[slots] == docs
+        if self._overlay:
+            keep &= ~np.isin(docs, np.fromiter(self._overlay, dtype=np.int64, count=len(self._overlay)))
+        positions, docs, slots = positions[keep], docs[keep], slots[keep]
+
+        # The following tokens must continue the phrase within the same title
+        doc_ends = self.doc_starts[docs] + self.doc_token_counts[docs]
+        for offset, token_id in enumerate(phrase_ids[1:], start=1):
+            following = positions + offset
+            keep = following < doc_ends
+            keep[keep] = self.token_ids[following[keep]] == token_id
+            positions, slots, doc_ends = positions[keep], slots[keep], doc_ends[keep]
+
+        matches = [order[slots], self.starts[positions].astype(np.int64),
+                   self.ends[positions + len(phrase) - 1].astype(np.int64)]
+
+        # Overlaid titles are few; match them directly
+        extra = [[], [], []]
+        for doc_id in self._overlay.keys() & set(doc_ids.tolist()):
+            ids, starts, ends = self._overlay[doc_id]
+            for position in range(len(ids) - len(phrase) + 1):
+                if ids[position:position + len(phrase)].tolist() == phrase_ids:
+                    extra[0].append(int(order[np.searchsorted(sorted_ids, doc_id)]))
+                    extra[1].append(int(starts[position]))
+                    extra[2].append(int(ends[position + len(phrase) - 1]))
+        if extra[0]:
+            matches = [np.concatenate([found, np.array(more, dtype=np.int64)]) for found, more in zip(matches, extra)]
+        return matches[0], matches[1], matches[2]
+
+    def _tokenize(self, title: str) -> TitleTokens:
+        tokens, starts, ends = word_tokens(title)
+        vocabulary = self.vocabulary
+        ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokens]
+        return (np.array(ids, dtype=np.int32), np.array(starts, dtype=np.int32),
+                np.array(ends, dtype=np.int32))
+
+    def _doc_tokens(self, doc_id: int) -> TitleTokens:
+        if doc_id in self._overlay:
+            return self._overlay[doc_id]
+        if doc_id >= len(self.doc_starts):
+            return self._tokenize('')
+        start = int(self.doc_starts[doc_id])
+        end = start + int(self.doc_token_counts[doc_id])
+        return self.token_ids[start:end], self.starts[start:end], self.ends[start:end]
@@ -0,0 +1,310 @@
+"""
+Compact in-memory inverted index structures.
+
+CompactPostings replaces a dict of dicts (a boxed Python int per doc id and
+term frequency, tens of bytes per posting) with flat arrays:
+
+- a sorted, interned term dictionary; term id i is a term's position and
+  owns postings offsets[i]:offsets[i + 1]
+- doc ids delta-encoded within each term's block (the first entry absolute,
+  then gaps), stored in the narrowest unsigned dtype that fits
+- term frequencies in the narrowest unsigned dtype that fits
+
+Incremental updates do not rewrite the arrays: edit() copies one term's
+posting list into a small overlay of plain dicts, and repack() folds the
+overlay back into fresh arrays.
+
+DocLengths keeps document lengths as one flat array indexed by doc id.
+"""
+import bisect
+import sys
+from collections.abc import Mapping, MutableMapping
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def _narrowest(values: np.ndarray) -> np.ndarray:
+    """Values cast to the smallest unsigned dtype (8, 16 or 32 bit) that holds them"""
+    largest = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if largest <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    raise ValueError(f"Posting value {largest} does not fit in 32 bits")
+
+
+def flatten_postings(postings: Mapping) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flatten term -> {doc_id: tf} postings into sorted flat arrays.
+
+    Returns:
+        (terms, offsets, doc_ids, tfs); term i owns doc_ids[offsets[i]:offsets[i + 1]],
+        sorted by doc id
+    """
+    if isinstance(postings, CompactPostings):
+        return postings.flattened()
+
+    terms = sorted(term for term, term_postings in postings.items() if term_postings)
+    lengths = np.fromiter((len(postings[term]) for term in terms), dtype=np.uint64, count=len(terms))
+    offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    total = int(offsets[-1])
+    doc_ids = np.fromiter(chain.from_iterable(postings[term].keys() for term in terms), dtype=np.uint32, count=total)
+    tfs = np.fromiter(chain.from_iterable(postings[term].values() for term in terms), dtype=np.uint32, count=total)
+
+    # Incremental updates can append out of order; sort doc ids within each term
+    term_idx = np.repeat(np.arange(len(terms)), lengths.astype(np.int64))
+    order = np.lexsort((doc_ids, term_idx))
+    return terms, offsets, doc_ids[order], tfs[order]
+
+
+class CompactPostings(Mapping):
+    """
+    Read-mostly term -> {doc_id: tf} mapping over delta-encoded posting arrays.
+
+    Posting dicts are decoded on access; arrays() decodes a term straight into
+    NumPy arrays for vectorized scoring.
+    """
+
+    def __init__(self,
+                 terms: Optional[List[str]] = None,
+                 offsets: Optional[np.ndarray] = None,
+                 gaps: Optional[np.ndarray] = None,
+                 tfs: Optional[np.ndarray] = None):
+        """
+        Args:
+            terms: Sorted terms
+            offsets: Block boundaries, len(terms) + 1 entries
+            gaps: Delta-encoded doc ids (first doc id of each block absolute)
+            tfs: Term frequencies aligned with gaps
+        """
+        self.terms = [sys.intern(term) for term in terms] if terms else []
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.uint64)
+        self.gaps = gaps if gaps is not None else np.empty(0, dtype=np.uint8)
+        self.tfs = tfs if tfs is not None else np.empty(0, dtype=np.uint8)
+        # Edited posting lists; an empty dict marks a removed term
+        self._overlay: Dict[str, Dict[int, int]] = {}
+
+    @classmethod
+    def from_arrays(cls, terms: List[str], offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray) -> 'CompactPostings':
+        """Encode flat postings as laid out by flatten_postings"""
+        offsets = np.asarray(offsets, dtype=np.uint64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        starts = offsets[:-1].astype(np.int64)
+        starts = starts[starts < len(doc_ids)]
+
+        gaps = np.empty(len(doc_ids), dtype=np.int64)
+        if len(doc_ids):
+            gaps[0] = doc_ids[0]
+            np.subtract(doc_ids[1:], doc_ids[:-1], out=gaps[1:])
+            gaps[starts] = doc_ids[starts]
+        return cls(terms, offsets, _narrowest(gaps), _narrowest(np.asarray(tfs)))
+
+    @classmethod
+    def from_postings(cls, postings: Mapping) -> 'CompactPostings':
+        """Encode term -> {doc_id: tf} postings"""
+        return cls.from_arrays(*flatten_postings(postings))
+
+    def _term_id(self, term: str) -> Optional[int]:
+        i = bisect.bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def _block(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return np.cumsum(self.gaps[start:end], dtype=np.int64), self.tfs[start:end]
+
+    def __getitem__(self, term: str) -> Dict[int, int]:
+        edited = self._overlay.get(term)
+        if edited is not None:
+            if not edited:
+                raise KeyError(term)
+            return edited
+        i = self._term_id(term)
+        if i is None:
+            raise KeyError(term)
+        doc_ids, tfs = self._block(i)
+        return dict(zip(doc_ids.tolist(), tfs.tolist()))
+
+    def __contains__(self, term: object) -> bool:
+        edited = self._overlay.get(term)
+        if edited is not None:
+            return bool(edited)
+        return isinstance(term, str) and self._term_id(term) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        overlay = self._overlay
+        for term in self.terms:
+            if term not in overlay:
+                yield term
+        for term, edited in overlay.items():
+            if edited:
+                yield term
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(doc ids ascending as int64, tfs) of a term, None if it has no postings"""
+        edited = self._overlay.get(term)
+        if edited is not None:
+            if not edited:
+                return None
+            doc_ids = np.fromiter(edited.keys(), dtype=np.int64, count=len(edited))
+            tfs = np.fromiter(edited.values(), dtype=np.int64, count=len(edited))
+            order = np.argsort(doc_ids, kind='stable')
+            return doc_ids[order], tfs[order]
+        i = self._term_id(term)
+        if i is None:
+            return None
+        return self._block(i)
+
+    def edit(self, term: str) -> Dict[int, int]:
+        """Writable posting dict of a term (created empty if missing); an emptied dict removes the term"""
+        edited = self._overlay.get(term)
+        if edited is None:
+            i = self._term_id(term)
+            edited = {}
+            if i is not None:
+                doc_ids, tfs = self._block(i)
+                edited = dict(zip(doc_ids.tolist(), tfs.tolist()))
+            self._overlay[sys.intern(term)] = edited
+        return edited
+
+    def doc_freqs(self) -> Dict[str, int]:
+        """term -> number of postings, keyed by the interned terms"""
+        if not self._overlay:
+            return dict(zip(self.terms, np.diff(self.offsets.astype(np.int64)).tolist()))
+        return {term: len(self[term]) for term in self}
+
+    @property
+    def pending_postings(self) -> int:
+        """Postings held in edited (not yet repacked) dicts"""
+        return sum(len(edited) for edited in self._overlay.values())
+
+    @property
+    def num_postings(self) -> int:
+        total = int(self.offsets[-1])
+        for term, edited in self._overlay.items():
+            i = self._term_id(term)
+            if i is not None:
+                total -= int(self.offsets[i + 1] - self.offsets[i])
+            total += len(edited)
+        return total
+
+    def flattened(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """(terms, offsets, doc_ids, tfs) with edits applied, as flatten_postings lays them out"""
+        lengths = np.diff(self.offsets.astype(np.int64))
+        doc_ids = np.cumsum(self.gaps, dtype=np.int64)
+        if len(doc_ids):
+            starts = self.offsets[:-1].astype(np.int64)[lengths > 0]
+            block_base = doc_ids[starts] - self.gaps[starts].astype(np.int64)
+            doc_ids -= np.repeat(block_base, lengths[lengths > 0])
+        tfs = self.tfs.astype(np.uint32)
+        if not self._overlay:
+            return self.terms, self.offsets, doc_ids.astype(np.uint32), tfs
+
+        # Untouched base blocks plus edited posting lists, merged in term order
+        kept = [i for i, term in enumerate(self.terms) if term not in self._overlay]
+        edited_terms = [term for term, edited in self._overlay.items() if edited]
+        _, _, edited_doc_ids, edited_tfs = flatten_postings({term: self._overlay[term] for term in edited_terms})
+        edited_lengths = np.array([len(self._overlay[term]) for term in sorted(edited_terms)], dtype=np.int64)
+        edited_terms.sort()
+
+        terms = [self.terms[i] for i in kept] + edited_terms
+        block_starts = np.concatenate([self.offsets[kept].astype(np.int64),
+                                       len(doc_ids) + np.cumsum(edited_lengths) - edited_lengths])
+        block_lengths = np.concatenate([lengths[kept], edited_lengths])
+        source_doc_ids = np.concatenate([doc_ids, edited_doc_ids.astype(np.int64)])
+        source_tfs = np.concatenate([tfs, edited_tfs.astype(np.uint32)])
+
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        block_starts, block_lengths = block_starts[order], block_lengths[order]
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum(block_lengths, out=offsets[1:])
+        positions = np.repeat(block_starts - offsets[:-1].astype(np.int64), block_lengths) + \
+            np.arange(int(offsets[-1]), dtype=np.int64)
+        return ([terms[i] for i in order], offsets,
+                source_doc_ids[positions].astype(np.uint32), source_tfs[positions])
+
+    def repack(self) -> 'CompactPostings':
+        """Equivalent postings with every edit folded into the arrays"""
+        if not self._overlay:
+            return self
+        return CompactPostings.from_arrays(*self.flattened())
+
+    def remap(self, new_ids: np.ndarray) -> 'CompactPostings':
+        """Postings with doc ids renumbered through new_ids (an order-preserving old -> new map)"""
+        terms, offsets, doc_ids, tfs = self.flattened()
+        return CompactPostings.from_arrays(terms, offsets, np.asarray(new_ids)[doc_ids.astype(np.int64)], tfs)
+
+    def memory_bytes(self) -> int:
+        """Estimated memory held by the term dictionary, posting arrays and edits"""
+        size = self.offsets.nbytes + self.gaps.nbytes + self.tfs.nbytes
+        size += sys.getsizeof(self.terms) + sum(sys.getsizeof(term) for term in self.terms)
+        for term, edited in self._overlay.items():
+            # A dict entry plus a boxed doc id and tf per posting
+            size += sys.getsizeof(term) + sys.getsizeof(edited) + 2 * 32 * len(edited)
+        return size
+
+
+class DocLengths(MutableMapping):
+    """
+    doc id -> document length over one flat array.
+
+    Removed doc ids keep their slot (length 0) until the doc ids are compacted.
+    """
+
+    def __init__(self, lengths: Optional[np.ndarray] = None):
+        self.array = np.asarray(lengths if lengths is not None else [], dtype=np.uint32)
+        self.live = np.ones(len(self.array), dtype=bool)
+        self._count = len(self.array)
+        self.total = int(self.array.sum(dtype=np.int64))
+
+    def __getitem__(self, doc_id: int) -> int:
+        if not 0 <= doc_id < len(self.array) or not self.live[doc_id]:
+            raise KeyError(doc_id)
+        return int(self.array[doc_id])
+
+    def __setitem__(self, doc_id: int, length: int):
+        if doc_id >= len(self.array):
+            extra = doc_id + 1 - len(self.array)
+            self.array = np.concatenate([self.array, np.zeros(extra, dtype=np.uint32)])
+            self.live = np.concatenate([self.live, np.zeros(extra, dtype=bool)])
+        elif not self.array.flags.writeable:
+            self.array = self.array.copy()  # Snapshot-backed
+        if self.live[doc_id]:
+            self.total -= int(self.array[doc_id])
+        else:
+            self.live[doc_id] = True
+            self._count += 1
+        self.array[doc_id] = length
+        self.total += length
+
+    def extend(self, lengths: Sequence[int]):
+        """Set the lengths of the doc ids following the last one, with one concatenation"""
+        lengths = np.asarray(lengths, dtype=np.uint32)
+        self.array = np.concatenate([self.array, lengths])
+        self.live = np.concatenate([self.live, np.ones(len(lengths), dtype=bool)])
+        self._count += len(lengths)
+        self.total += int(lengths.sum(dtype=np.int64))
+
+    def __delitem__(self, doc_id: int):
+        length = self[doc_id]
+        if not self.array.flags.writeable:
+            self.array = self.array.copy()
+        self.array[doc_id] = 0
+        self.live[doc_id] = False
+        self._count -= 1
+        self.total -= length
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(np.flatnonzero(self.live).tolist())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def memory_bytes(self) -> int:
+        return self.array.nbytes + self.live.nbytes
@@ -0,0 +1,70 @@
+"""
+Lazy product rows for projected search results.
+
+search(fields=[...]) returns ProductRow views instead of full product dicts.
+A view holds its doc id, its score and references to the requested product
+columns as arrays; a value is converted to a plain Python object only when
+it is read, so long descriptions, image lists and other unrequested columns
+are never copied.
+"""
+from typing import Any, Dict, Iterator, Mapping
+import numpy as np
+import pandas as pd
+
+# Keys every result carries besides the projected product fields
+RESULT_KEYS = ('relevance_score', 'id')
+
+
+def box(value: Any) -> Any:
+    """Plain Python value of an array element, as DataFrame.to_dict() returns it"""
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value)
+    if isinstance(value, np.timedelta64):
+        return pd.Timedelta(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ProductRow(Mapping):
+    """
+    Read-only view of one result: the projected product fields, then
+    relevance_score and id, in that order.
+
+    Use dict(row) or row.to_dict() for a JSON-serializable copy.
+    """
+    __slots__ = ('_columns', '_doc_id', '_score')
+
+    def __init__(self, columns: Dict[str, np.ndarray], doc_id: int, score: float):
+        """
+        Args:
+            columns: Field name -> column array indexed by doc id (shared, not copied)
+            doc_id: Row position of the product
+            score: Rounded relevance score
+        """
+        self._columns = columns
+        self._doc_id = doc_id
+        self._score = score
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'id':
+            return self._doc_id
+        if key == 'relevance_score':
+            return self._score
+        return box(self._columns[key][self._doc_id])
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._columns
+        yield from RESULT_KEYS
+
+    def __len__(self) -> int:
+        return len(self._columns) + len(RESULT_KEYS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in RESULT_KEYS or key in self._columns
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"ProductRow({self.to_dict()!r})"
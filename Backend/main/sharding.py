@@ -0,0 +1,438 @@
+"""
+Sharded search over a catalog partitioned by doc id.
+
+The catalog is split into contiguous doc id ranges, one EcommerceSearchEngine
+per shard, each holding only its own postings and feature columns. After the
+shards are built their local statistics (document frequencies, lengths, price
+and rating bounds) are merged and handed back, so every shard scores with the
+statistics of the whole catalog.
+
+A text query is answered by scatter-gather in two phases, because BM25 is
+normalized over every matching document of the catalog:
+
+1. Every shard reports the (min, max) BM25 of its candidates.
+2. Every shard ranks its candidates against the global range and returns its
+   own top `limit`; the coordinator merges these lists.
+
+Facets are counted by every shard over its own matches and summed by the
+coordinator: brand counts by lowercased brand (shard brand ids are local),
+price counts per bucket.
+
+With process workers each shard lives in its own single-worker process pool,
+so a shard's index is built once in its process and queries only ship the
+query and the shard's top results across the process boundary.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+import heapq
+import itertools
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from main.cache import ResultCache
+from main.spelling import SpellingIndex
+from main.finder import (
+    EcommerceSearchEngine,
+    CollectionStats,
+    CachedSearch,
+    SearchResult,
+    FACETS,
+    FACET_SIZE,
+    PRICE_FACET_EDGES,
+    SORT_KEYS,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_BYTES,
+)
+from utils import tokenize_text, normalize_query
+
+# Merge key of a shard hit: (missing sort key, sort key, -score, global doc id)
+MergeKey = Tuple[bool, float, float, int]
+
+# The shard owned by this worker process (process workers only)
+_worker_shard: Optional[EcommerceSearchEngine] = None
+
+
+def _build_shard(products: pd.DataFrame) -> EcommerceSearchEngine:
+    # Caching happens once, in front of all shards
+    shard = EcommerceSearchEngine(cache_size=0)
+    shard.load_data(df=products)
+    return shard
+
+
+def _init_worker(products: pd.DataFrame):
+    global _worker_shard
+    _worker_shard = _build_shard(products)
+
+
+def _call_worker(function, *args):
+    return function(_worker_shard, *args)
+
+
+def shard_stats(shard: EcommerceSearchEngine) -> CollectionStats:
+    return shard.local_stats()
+
+
+def shard_set_stats(shard: EcommerceSearchEngine, stats: CollectionStats):
+    # Ship only the document frequencies of terms this shard holds
+    doc_freq = {term: stats.doc_freq[term] for term in shard.term_doc_freq}
+    shard.set_collection_stats(stats._replace(doc_freq=doc_freq))
+
+
+def shard_bm25_range(shard: EcommerceSearchEngine, query: str) -> Optional[Tuple[float, float]]:
+    """Phase 1: (min, max) BM25 of the shard's candidates, None if nothing matches"""
+    term_scores = shard._query_term_scores(shard.analyzer.analyze(query))
+    if not term_scores:
+        return None
+    return shard._bm25_range(term_scores)
+
+
+def shard_search(shard: EcommerceSearchEngine,
+                 query: str,
+                 filters: Dict[str, Any],
+                 limit: int,
+                 offset: int,
+                 bm25_bounds: Optional[Tuple[float, float]],
+                 top_k: bool,
+                 fields: Optional[List[str]] = None) -> List[Tuple[MergeKey, Dict]]:
+    """
+    Phase 2: the shard's first `limit` results, ranked against the global BM25 range.
+
+    Returns:
+        (merge key, product row) pairs in merge key order, with global doc ids
+    """
+    sort_by = filters.get('sort_by', 'relevance')
+    doc_mask = shard._filter_mask(filters)
+
+    if not query:
+        page, _ = shard._browse_page(sort_by, limit, doc_mask)
+        results = [(doc_id, 50.0) for doc_id in page]
+    elif top_k and sort_by == 'relevance':
+        results = shard._text_search_top_k(query, limit, doc_mask, bm25_bounds)
+    else:
+        results = shard._sort_results(shard._text_search(query, doc_mask, bm25_bounds), sort_by, limit)
+
+    keys = SORT_KEYS[sort_by](shard.features) if sort_by in SORT_KEYS else None
+    hits = []
+    # Projected rows are copied out as dicts of just the requested fields
+    columns = shard._projection(fields)
+    for (doc_id, score), product in zip(results, shard._result_rows(results, columns)):
+        if columns is not None:
+            product = dict(product)
+        product['id'] = doc_id + offset
+        key = 0.0 if keys is None else float(keys[doc_id])
+        missing = math.isnan(key)
+        hits.append(((missing, 0.0 if missing else key, -score, doc_id + offset), product))
+    return hits
+
+
+def shard_term_coverage(shard: EcommerceSearchEngine, query: str) -> int:
+    return shard._term_coverage(query)
+
+
+def shard_brands(shard: EcommerceSearchEngine, offset: int) -> Dict[str, Tuple[int, str]]:
+    """Lowercased brand -> (global row it first appears on, brand as spelled there)"""
+    labels = shard._brand_facet_labels()
+    brand_ids, first_rows = np.unique(shard.features.brand_ids, return_index=True)
+    return {
+        shard.features.brands[brand_id]: (row + offset, labels[brand_id])
+        for brand_id, row in zip(brand_ids.tolist(), first_rows.tolist())
+    }
+
+
+def shard_facet_counts(shard: EcommerceSearchEngine,
+                       names: List[str],
+                       query: str,
+                       filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Facet counts over the shard's matches, keyed to be summed across shards.
+
+    Returns:
+        Facet name -> {lowercased brand: matches} for the brand facet, or
+        matches per price bucket for the price facet
+    """
+    counts = shard._facet_counts(names, query, shard._filter_mask(filters))
+    if 'brand' in counts:
+        brands = shard.features.brands
+        counts['brand'] = {brands[brand_id]: int(counts['brand'][brand_id])
+                           for brand_id in np.flatnonzero(counts['brand']).tolist()}
+    return counts
+
+
+class _LocalShard:
+    """A shard held in this process; calls run synchronously"""
+
+    def __init__(self, products: pd.DataFrame):
+        self.engine = _build_shard(products)
+
+    def submit(self, function, *args) -> Future:
+        future = Future()
+        future.set_result(function(self.engine, *args))
+        return future
+
+    def close(self):
+        pass
+
+
+class _ProcessShard:
+    """A shard held by a dedicated worker process"""
+
+    def __init__(self, products: pd.DataFrame):
+        self.executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(products,))
+
+    def submit(self, function, *args) -> Future:
+        return self.executor.submit(_call_worker, function, *args)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class ShardedSearchEngine:
+    """
+    EcommerceSearchEngine facade over doc-id-partitioned shards.
+
+    search() takes the same arguments and returns the same SearchResult as
+    EcommerceSearchEngine.search(), with identical scores and order; doc ids
+    ('id') are global row positions. The sharded catalog is read-only: call
+    load_data() again to change it.
+    """
+
+    def __init__(self,
+                 num_shards: int = 4,
+                 processes: bool = True,
+                 cache_size: int = 100,
+                 cache_ttl: float = SEARCH_CACHE_TTL,
+                 cache_max_bytes: int = SEARCH_CACHE_MAX_BYTES):
+        """
+        Args:
+            num_shards: Number of doc id partitions
+            processes: Query shards in parallel, one worker process each
+                       (False keeps every shard in this process)
+            cache_size: Search result cache size
+            cache_ttl: Seconds a cached search stays valid
+            cache_max_bytes: Upper bound on the cache's estimated memory
+        """
+        if num_shards < 1:
+            raise ValueError(f"num_shards must be at least 1, got {num_shards}")
+        self.num_shards = num_shards
+        self.processes = processes
+
+        self.shards: List[Any] = []
+        self.offsets: List[int] = []  # First global doc id of each shard
+        self.collection_stats: Optional[CollectionStats] = None
+        self.num_products = 0
+        # Brands in catalog order (as in EcommerceSearchEngine) for the brand facet
+        self.facet_size = FACET_SIZE
+        self._brand_keys: Dict[str, int] = {}  # lowercased brand -> position in catalog order
+        self._brand_labels: List[str] = []  # brand as first spelled in the catalog, in catalog order
+        # Typo correction against the catalog-wide vocabulary, built on the first misspelled term
+        self._spelling: Optional[SpellingIndex] = None
+
+        self.cache = ResultCache(max_entries=cache_size, ttl=cache_ttl, max_bytes=cache_max_bytes)
+        self.index_generation = 0
+        self.cache_hits = 0
+        self.total_searches = 0
+
+        self.index_build_time = 0
+        self.avg_search_time = 0
+
+    def load_data(self, csv_path: str = None, df: pd.DataFrame = None):
+        """Partition the catalog into shards and build them (in parallel with process workers)"""
+        start_time = time.time()
+        if csv_path:
+            products = pd.read_csv(csv_path)
+        elif df is not None:
+            products = df.reset_index(drop=True)
+        else:
+            raise ValueError("Either csv_path or df must be provided")
+
+        self.close()
+        shard_type = _ProcessShard if self.processes else _LocalShard
+        bounds = np.linspace(0, len(products), min(self.num_shards, max(len(products), 1)) + 1).astype(int)
+        self.offsets = bounds[:-1].tolist()
+        self.shards = [
+            shard_type(products.iloc[start:end].reset_index(drop=True))
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+        ]
+        self.num_products = len(products)
+
+        # Exchange statistics so every shard scores like one engine over the whole catalog
+        self.collection_stats = CollectionStats.merge(self._gather(shard_stats))
+        self._gather(shard_set_stats, self.collection_stats)
+        self._spelling = None
+
+        # Brands of every shard, ordered by first appearance in the whole catalog
+        brands: Dict[str, Tuple[int, str]] = {}
+        futures = [shard.submit(shard_brands, offset) for shard, offset in zip(self.shards, self.offsets)]
+        for future in futures:
+            for brand, (row, label) in future.result().items():
+                if brand not in brands or row < brands[brand][0]:
+                    brands[brand] = (row, label)
+        ordered = sorted(brands, key=lambda brand: brands[brand][0])
+        self._brand_keys = {brand: position for position, brand in enumerate(ordered)}
+        self._brand_labels = [brands[brand][1] for brand in ordered]
+
+        self.index_generation += 1
+        self.cache.clear()
+        self.index_build_time = time.time() - start_time
+
+    def search(self,
+               query: str = "",
+               filters: Optional[Dict[str, Any]] = None,
+               limit: int = 50,
+               top_k: bool = False,
+               fields: Optional[List[str]] = None,
+               facets: Optional[List[str]] = None) -> SearchResult:
+        """
+        Scatter-gather search across all shards.
+
+        Args:
+            query: Search query string
+            filters: Dictionary of filters (min_price, max_price, brand, availability, sort_by)
+            limit: Maximum number of results to return
+            top_k: Use MaxScore top-k retrieval within each shard (same results)
+            fields: Product columns to return (None for all); projected results
+                    are plain dicts holding these fields plus relevance_score and id
+            facets: Facets to count over every match (see EcommerceSearchEngine.search)
+
+        Returns:
+            SearchResult object containing results and metadata
+
+        Raises:
+            ValueError: If facets names an unknown facet
+        """
+        start_time = time.time()
+        self.total_searches += 1
+        if filters is None:
+            filters = {}
+        for name in facets or ():
+            if name not in FACETS:
+                raise ValueError(f"Unknown facet: {name}")
+        normalized = normalize_query(query)
+        # Only an empty query browses the catalog; one of just whitespace matches nothing
+        if query and not normalized:
+            return SearchResult(results=[], search_time=(time.time() - start_time) * 1000, total_results=0,
+                                from_cache=False, cache_hit_rate=self._get_cache_hit_rate(),
+                                facets={name: [] for name in facets or ()})
+        query, corrections = self._correct_query(normalized)
+        corrected_query = query if corrections else None
+
+        cache_key = EcommerceSearchEngine._cache_key(query, filters, limit, fields, facets)
+        cached = self.cache.get(cache_key, self.index_generation)
+        if cached is not None:
+            self.cache_hits += 1
+            search_result = cached.to_result(self._get_cache_hit_rate())
+            search_result.corrected_query = corrected_query
+            return search_result
+
+        # Facet counts cover every match, whatever the ranking phases return
+        facet_parts = [shard.submit(shard_facet_counts, facets, query, filters) for shard in self.shards] if facets else []
+
+        # Phase 1: global BM25 normalization range
+        bm25_bounds = None
+        if query:
+            ranges = [r for r in self._gather(shard_bm25_range, query) if r is not None]
+            if ranges:
+                bm25_bounds = (min(low for low, _ in ranges), max(high for _, high in ranges))
+
+        # Phase 2: per-shard top `limit`, merged in global order
+        hits = []
+        if not query or bm25_bounds is not None:
+            shard_hits = [
+                shard.submit(shard_search, query, filters, limit, offset, bm25_bounds, top_k, fields)
+                for shard, offset in zip(self.shards, self.offsets)
+            ]
+            merged = heapq.merge(*(future.result() for future in shard_hits), key=lambda hit: hit[0])
+            hits = [product for _, product in itertools.islice(merged, max(limit, 0))]
+        facet_counts = self._merge_facets(facets, [future.result() for future in facet_parts]) if facets else {}
+
+        search_time = time.time() - start_time
+        search_result = SearchResult(
+            results=hits,
+            search_time=search_time * 1000,  # Convert to milliseconds
+            total_results=len(hits),
+            from_cache=False,
+            cache_hit_rate=self._get_cache_hit_rate(),
+            corrected_query=corrected_query,
+            facets=facet_counts
+        )
+
+        cached = CachedSearch.from_results(hits, search_result.search_time, tokenize_text(query), facet_counts)
+        self.cache.put(cache_key, cached, self.index_generation, cached.size_bytes())
+
+        self.avg_search_time = (self.avg_search_time * (self.total_searches - 1) + search_time) / self.total_searches
+        return search_result
+
+    def _merge_facets(self, names: List[str], parts: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Sum the shards' facet counts into the buckets one engine over the whole catalog returns"""
+        facets: Dict[str, List[Dict[str, Any]]] = {}
+        for name in dict.fromkeys(names):
+            if name == 'brand':
+                counts = np.zeros(len(self._brand_labels), dtype=np.int64)
+                for part in parts:
+                    for brand, count in part[name].items():
+                        counts[self._brand_keys[brand]] += count
+                facets[name] = EcommerceSearchEngine._brand_facet(self._brand_labels, counts, self.facet_size)
+            elif name == 'price':
+                counts = np.sum([part[name] for part in parts], axis=0)
+                facets[name] = EcommerceSearchEngine._price_facet(PRICE_FACET_EDGES, counts)
+        return facets
+
+    def _correct_query(self, query: str) -> Tuple[str, Dict[str, str]]:
+        """Correct out-of-vocabulary terms against the merged catalog vocabulary"""
+        if not query or self.collection_stats is None:
+            return query, {}
+        vocabulary = self.collection_stats.doc_freq
+        if all(term in vocabulary for term in tokenize_text(query)):
+            return query, {}
+        if self._spelling is None:
+            self._spelling = SpellingIndex.build(vocabulary)
+        corrected, corrections = self._spelling.correct(query, vocabulary)
+        # Same gate as EcommerceSearchEngine._correct_query; a document lives in one shard
+        if corrections and max(self._gather(shard_term_coverage, corrected)) <= max(self._gather(shard_term_coverage, query)):
+            return query, {}
+        return corrected, corrections
+
+    def _gather(self, function, *args) -> List[Any]:
+        """Run function(shard, *args) on every shard in parallel and collect the results in shard order"""
+        futures = [shard.submit(function, *args) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def _get_cache_hit_rate(self) -> float:
+        if self.total_searches == 0:
+            return 0.0
+        return (self.cache_hits / self.total_searches) * 100
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get search engine statistics"""
+        stats = self.collection_stats
+        return {
+            'total_products': self.num_products,
+            'num_shards': len(self.shards),
+            'shard_sizes': [end - start for start, end in zip(self.offsets, self.offsets[1:] + [self.num_products])],
+            'unique_terms': len(stats.doc_freq) if stats else 0,
+            'cache_hit_rate': self._get_cache_hit_rate(),
+            'avg_search_time_ms': self.avg_search_time * 1000,
+            'index_build_time_s': self.index_build_time,
+            'cache_size': len(self.cache),
+            'total_searches': self.total_searches,
+            'avg_doc_length': stats.total_doc_length / stats.num_docs if stats and stats.num_docs else 0.0,
+        }
+
+    def clear_cache(self):
+        """Clear the search cache"""
+        self.cache.clear()
+        self.cache_hits = 0
+        self.total_searches = 0
+
+    def close(self):
+        """Shut down shard worker processes"""
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+    def __enter__(self) -> 'ShardedSearchEngine':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,147 @@
+"""
+MinHash signatures and an LSH banding index for similar-product lookup.
+
+Each product's token set is summarized by a MinHash signature: for every
+one of num_perm random hash functions, the minimum hash over its tokens.
+Two signatures agree in a position with probability equal to the Jaccard
+similarity of the token sets. Signatures are cut into bands of rows; two
+products become candidates when any band matches exactly, which is likely
+for similar products and unlikely for unrelated ones (threshold roughly
+(1 / bands) ** (1 / rows)).
+"""
+from collections import defaultdict
+import copy
+from typing import Any, Dict, Iterable, List, Sequence, Set
+import zlib
+import numpy as np
+
+# Hashes are (a * h + b) mod p over 32-bit token hashes; a, b < p keep it within uint64
+_PRIME = (1 << 31) - 1
+_EMPTY = _PRIME  # Signature value of an empty token set (above every real hash)
+
+# Token-hash rows evaluated per vectorized step (bounds temporary memory)
+_CHUNK_TOKENS = 65536
+
+
+class MinHashLSH:
+    """MinHash signatures per doc id with banded buckets for candidate lookup"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 32, seed: int = 1):
+        """
+        Args:
+            num_perm: Hash functions per signature
+            bands: LSH bands; num_perm must be a multiple of it
+            seed: Seed for the hash functions (signatures are only comparable under one seed)
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+        self.signatures = np.full((0, num_perm), _EMPTY, dtype=np.uint32)
+        self._buckets: List[Dict[bytes, Set[int]]] = [defaultdict(set) for _ in range(bands)]
+        self._token_hashes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'MinHashLSH':
+        """Copy whose signatures and buckets can change independently (hash functions are shared)"""
+        clone = copy.copy(self)
+        clone.signatures = self.signatures.copy()
+        clone._buckets = [defaultdict(set, {key: set(doc_ids) for key, doc_ids in buckets.items()})
+                          for buckets in self._buckets]
+        clone._token_hashes = dict(self._token_hashes)
+        memo[id(self)] = clone
+        return clone
+
+    def signatures_for(self, token_sets: Sequence[Iterable[str]]) -> np.ndarray:
+        """MinHash signature of each token set, as a (len(token_sets), num_perm) array"""
+        hashes = [self._hash_tokens(tokens) for tokens in token_sets]
+        signatures = np.full((len(hashes), self.num_perm), _EMPTY, dtype=np.uint32)
+
+        # Group non-empty sets into chunks and take per-set minima with reduceat
+        chunk: List[int] = []
+        chunk_tokens = 0
+        for i, token_hashes in enumerate(hashes):
+            if not len(token_hashes):
+                continue
+            chunk.append(i)
+            chunk_tokens += len(token_hashes)
+            if chunk_tokens >= _CHUNK_TOKENS:
+                self._fill(signatures, hashes, chunk)
+                chunk, chunk_tokens = [], 0
+        if chunk:
+            self._fill(signatures, hashes, chunk)
+        return signatures
+
+    def add(self, doc_ids: Sequence[int], signatures: np.ndarray):
+        """Store signatures for doc ids and add them to the band buckets"""
+        if not len(doc_ids):
+            return
+        needed = max(doc_ids) + 1
+        if needed > len(self.signatures):
+            padding = np.full((needed - len(self.signatures), self.num_perm), _EMPTY, dtype=np.uint32)
+            self.signatures = np.vstack([self.signatures, padding])
+
+        for doc_id, signature in zip(doc_ids, signatures):
+            self.signatures[doc_id] = signature
+            if signature[0] == _EMPTY:
+                continue  # No tokens: similar to nothing
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band][key].add(doc_id)
+
+    def remove(self, doc_id: int):
+        """Take a doc id out of the band buckets"""
+        if doc_id >= len(self.signatures):
+            return
+        signature = self.signatures[doc_id]
+        if signature[0] != _EMPTY:
+            for band, key in enumerate(self._band_keys(signature)):
+                bucket = self._buckets[band].get(key)
+                if bucket is not None:
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self._buckets[band][key]
+        self.signatures[doc_id] = _EMPTY
+
+    def candidates(self, doc_id: int) -> Set[int]:
+        """Doc ids sharing at least one band with doc_id (excluding itself)"""
+        if doc_id >= len(self.signatures) or self.signatures[doc_id][0] == _EMPTY:
+            return set()
+        found: Set[int] = set()
+        for band, key in enumerate(self._band_keys(self.signatures[doc_id])):
+            found |= self._buckets[band].get(key, set())
+        found.discard(doc_id)
+        return found
+
+    def compact(self, keep: np.ndarray):
+        """Drop the rows where keep is False and renumber doc ids densely"""
+        signatures = self.signatures[keep[:len(self.signatures)]]
+        self.signatures = np.full((0, self.num_perm), _EMPTY, dtype=np.uint32)
+        self._buckets = [defaultdict(set) for _ in range(self.bands)]
+        self.add(list(range(len(signatures))), signatures)
+
+    def _hash_tokens(self, tokens: Iterable[str]) -> np.ndarray:
+        token_hashes = self._token_hashes
+        values = []
+        for token in set(tokens):
+            value = token_hashes.get(token)
+            if value is None:
+                value = token_hashes[token] = zlib.crc32(token.encode('utf-8'))
+            values.append(value)
+        return np.array(values, dtype=np.uint64)
+
+    def _fill(self, signatures: np.ndarray, hashes: List[np.ndarray], rows: List[int]):
+        token_hashes = np.concatenate([hashes[i] for i in rows])
+        starts = np.cumsum([0] + [len(hashes[i]) for i in rows[:-1]])
+        permuted = (token_hashes[:, None] * self._a + self._b) % _PRIME
+        signatures[rows] = np.minimum.reduceat(permuted, starts, axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
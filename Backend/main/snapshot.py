@@ -0,0 +1,253 @@
+"""
+Persistent, versioned on-disk snapshots of an EcommerceSearchEngine index.
+
+Snapshot layout (all integers little-endian):
+
+    magic (8 bytes) | header length (uint64) | JSON header | sections...
+
+The JSON header carries the schema version, a SHA-256 content hash over all
+sections, scalar metadata and a table of sections (byte offset, dtype, length).
+Every section is a flat array aligned to 64 bytes, so a snapshot can be mapped
+with mmap and each section wrapped by np.frombuffer without copying:
+
+- term dictionary: sorted terms joined by newlines
+- postings: per-term offsets plus delta-encoded doc id and term frequency
+  arrays, loaded as CompactPostings without decoding
+- doc lengths and ranking feature columns
+- title positions: the token stream and its inverted view, loaded as
+  TitlePositions without re-tokenizing titles
+- product columns: numeric columns as raw arrays, text columns as a UTF-8
+  blob plus offsets, anything else as one JSON document per row
+"""
+import hashlib
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from main.positions import TitlePositions
+from main.postings import CompactPostings
+
+SNAPSHOT_MAGIC = b'ECSIDX\x00\x01'
+SNAPSHOT_VERSION = 3
+_ALIGNMENT = 64
+
+
+def _encode_text(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings as a UTF-8 blob plus uint64 offsets"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.uint64, count=len(encoded)), out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_text(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+
+
+def _json_default(value: Any) -> Any:
+    # NumPy scalars and arrays stored in object columns
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def _encode_column(series: pd.Series) -> Tuple[str, Dict[str, np.ndarray]]:
+    """Pick the most compact encoding for a product column"""
+    # Floats keep NaN natively; nullable ints/bools only when nothing is missing
+    if pd.api.types.is_float_dtype(series) or (
+        not series.hasnans and (
+            pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series)
+        )
+    ):
+        values = series.to_numpy()
+        if values.dtype != object:
+            return 'array', {'values': values}
+    
+    values = series.tolist()
+    if all(isinstance(value, str) for value in values):
+        kind = 'text'
+    else:
+        kind = 'json'
+        values = [json.dumps(value, default=_json_default) for value in values]
+    blob, offsets = _encode_text(values)
+    return kind, {'blob': blob, 'offsets': offsets}
+
+
+def _decode_column(kind: str, sections: Dict[str, np.ndarray]) -> Any:
+    if kind == 'array':
+        return sections['values']
+    values = _decode_text(sections['blob'], sections['offsets'])
+    if kind == 'json':
+        return [json.loads(value) for value in values]
+    return values
+
+
+def save_snapshot(engine, path: str) -> str:
+    """
+    Write an engine's index to a snapshot file.
+    
+    Args:
+        engine: Loaded EcommerceSearchEngine
+        path: Destination file path
+        
+    Returns:
+        Content hash of the written snapshot
+    """
+    postings = engine.inverted_index.repack()
+    n = len(engine.products)
+    features = engine.features
+    
+    arrays: Dict[str, np.ndarray] = {
+        'terms': np.frombuffer('\n'.join(postings.terms).encode('utf-8'), dtype=np.uint8),
+        'postings.offsets': postings.offsets,
+        'postings.gaps': postings.gaps,
+        'postings.tfs': postings.tfs,
+        'doc_lengths': engine.doc_lengths.array[:n],
+        'features.popularity': features.popularity,
+        'features.price_score': features.price_score,
+        'features.brand_ids': features.brand_ids,
+    }
+    brands_blob, brands_offsets = _encode_text(features.brands)
+    arrays['features.brands.blob'] = brands_blob
+    arrays['features.brands.offsets'] = brands_offsets
+    
+    title_tokens, title_arrays = engine.title_positions.packed_arrays()
+    arrays['title_positions.tokens'] = np.frombuffer('\n'.join(title_tokens).encode('utf-8'), dtype=np.uint8)
+    for name, values in title_arrays.items():
+        arrays[f'title_positions.{name}'] = values
+    
+    columns = []
+    for name in engine.products.columns:
+        kind, column_arrays = _encode_column(engine.products[name])
+        columns.append({'name': str(name), 'kind': kind})
+        for key, values in column_arrays.items():
+            arrays[f'column.{name}.{key}'] = values
+    
+    meta = {
+        'total_docs': n,
+        'avg_doc_length': engine.avg_doc_length,
+        'columns': columns,
+    }
+    
+    # Lay out sections and hash their contents together with the metadata
+    digest = hashlib.sha256(json.dumps(meta, sort_keys=True).encode('utf-8'))
+    table = {}
+    position = 0
+    payloads = []
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        data = values.tobytes()
+        digest.update(name.encode('utf-8'))
+        digest.update(data)
+        table[name] = {'offset': position, 'dtype': values.dtype.str, 'length': len(values)}
+        payloads.append(data)
+        position += len(data)
+        padding = -position % _ALIGNMENT
+        payloads.append(b'\x00' * padding)
+        position += padding
+    
+    content_hash = digest.hexdigest()
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'content_hash': content_hash,
+        'meta': meta,
+        'sections': table,
+    }).encode('utf-8')
+    
+    # Sections start on an aligned boundary after the header
+    prefix_length = len(SNAPSHOT_MAGIC) + 8 + len(header)
+    header += b' ' * (-prefix_length % _ALIGNMENT)
+    
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for data in payloads:
+            f.write(data)
+    
+    return content_hash
+
+
+def load_snapshot(path: str, verify: bool = True, expected_hash: str = None) -> Dict[str, Any]:
+    """
+    Map a snapshot file and decode its sections.
+    
+    Args:
+        path: Snapshot file path
+        verify: Recompute the content hash and reject corrupted files
+        expected_hash: Reject the snapshot unless its content hash matches
+        
+    Returns:
+        Dictionary with 'content_hash', 'meta', 'postings' (CompactPostings),
+        'doc_lengths', 'features', 'title_positions' (TitlePositions) and
+        'products' entries
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    if buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"Not an index snapshot: {path}")
+    
+    (header_length,) = struct.unpack_from('<Q', buffer, len(SNAPSHOT_MAGIC))
+    header_start = len(SNAPSHOT_MAGIC) + 8
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]))
+    
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot schema version {header.get('version')} (expected {SNAPSHOT_VERSION})"
+        )
+    if expected_hash is not None and header['content_hash'] != expected_hash:
+        raise ValueError(f"Stale snapshot: content hash {header['content_hash']} != {expected_hash}")
+    
+    data_start = header_start + header_length
+    meta = header['meta']
+    arrays = {
+        name: np.frombuffer(buffer, dtype=np.dtype(section['dtype']), count=section['length'],
+                            offset=data_start + section['offset'])
+        for name, section in header['sections'].items()
+    }
+    
+    if verify:
+        digest = hashlib.sha256(json.dumps(meta, sort_keys=True).encode('utf-8'))
+        for name, values in arrays.items():
+            digest.update(name.encode('utf-8'))
+            digest.update(values.data)
+        if digest.hexdigest() != header['content_hash']:
+            raise ValueError(f"Corrupted snapshot: content hash mismatch in {path}")
+    
+    terms_blob = arrays['terms'].tobytes().decode('utf-8')
+    terms = terms_blob.split('\n') if terms_blob else []
+    title_tokens_blob = arrays['title_positions.tokens'].tobytes().decode('utf-8')
+    title_positions = TitlePositions.from_arrays(
+        title_tokens_blob.split('\n') if title_tokens_blob else [],
+        {name.split('.', 1)[1]: values for name, values in arrays.items()
+         if name.startswith('title_positions.') and name != 'title_positions.tokens'}
+    )
+    
+    products = pd.DataFrame({
+        column['name']: _decode_column(column['kind'], {
+            key.rsplit('.', 1)[1]: values
+            for key, values in arrays.items()
+            if key.rsplit('.', 1)[0] == f"column.{column['name']}"
+        })
+        for column in meta['columns']
+    }, index=pd.RangeIndex(meta['total_docs']))
+    
+    return {
+        'content_hash': header['content_hash'],
+        'meta': meta,
+        'postings': CompactPostings(terms, arrays['postings.offsets'], arrays['postings.gaps'], arrays['postings.tfs']),
+        'doc_lengths': arrays['doc_lengths'],
+        'features': {
+            'popularity': arrays['features.popularity'],
+            'price_score': arrays['features.price_score'],
+            'brand_ids': arrays['features.brand_ids'],
+            'brands': _decode_text(arrays['features.brands.blob'], arrays['features.brands.offsets']),
+        },
+        'title_positions': title_positions,
+        'products': products,
+    }
@@ -0,0 +1,199 @@
+"""
+Typo-tolerant lookup over the index's term dictionary (symmetric delete).
+
+Every term is indexed under each string obtained by deleting up to
+max_edit_distance characters from its first prefix_length characters.
+A misspelled word generates its own deletes the same way; terms sharing a
+delete with it are the only ones that can be within the edit distance, and
+are verified with an optimal string alignment (Damerau-Levenshtein)
+distance. Lookups cost a few dozen dict probes instead of a scan of the
+vocabulary.
+
+Corrections of more than one edit must keep the word's first character,
+which is rarely mistyped: a word that differs from a term in its first
+letter and elsewhere is more likely a name the catalog lacks (a brand, a
+model) than a typo of that term.
+"""
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+# Query tokens, as the analyzer extracts them from a lowercased query
+_TOKEN_PATTERN = re.compile(r'\w{2,}')
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance between a and b (insertions, deletions,
+    substitutions and adjacent transpositions), or limit + 1 if it exceeds limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # A shared prefix or suffix never changes the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return len(a) + len(b) if len(a) + len(b) <= limit else limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+class SpellingIndex:
+    """Symmetric delete index suggesting in-vocabulary terms for misspelled words"""
+
+    def __init__(self, max_edit_distance: int = 2, prefix_length: int = 7):
+        """
+        Args:
+            max_edit_distance: Largest edit distance a correction may have
+            prefix_length: Characters of each term that deletes are generated from
+        """
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.terms: Set[str] = set()
+        # delete -> term, or tuple of terms when several share it (never
+        # modified in place, so copies can share them)
+        self._deletes: Dict[str, Union[str, Tuple[str, ...]]] = {}
+
+    @classmethod
+    def build(cls, terms: Iterable[str], max_edit_distance: int = 2, prefix_length: int = 7) -> 'SpellingIndex':
+        index = cls(max_edit_distance, prefix_length)
+        for term in terms:
+            index.add(term)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def copy(self) -> 'SpellingIndex':
+        """Independent copy; adding terms to it leaves this index unchanged"""
+        clone = SpellingIndex(self.max_edit_distance, self.prefix_length)
+        clone.terms = set(self.terms)
+        clone._deletes = dict(self._deletes)
+        return clone
+
+    def add(self, term: str):
+        """Make term available as a correction (no-op if already present)"""
+        if term in self.terms:
+            return
+        self.terms.add(term)
+        for delete in self._edits(term[:self.prefix_length]):
+            bucket = self._deletes.get(delete)
+            if bucket is None:
+                self._deletes[delete] = term
+            elif isinstance(bucket, str):
+                self._deletes[delete] = (bucket, term)
+            else:
+                self._deletes[delete] = bucket + (term,)
+
+    def max_distance(self, word: str) -> int:
+        """Edit distance allowed for word: 0 below 3 characters, 1 below 5, else max_edit_distance"""
+        if len(word) < 3:
+            return 0
+        if len(word) < 5:
+            return min(1, self.max_edit_distance)
+        return self.max_edit_distance
+
+    def lookup(self, word: str, frequencies: Mapping[str, int]) -> Optional[Tuple[str, int]]:
+        """
+        Closest term to word, preferring the smallest distance, then the most
+        frequent term, then alphabetical order. Terms more than one edit
+        away must start with the same character as word.
+
+        Args:
+            word: Lowercased, out-of-vocabulary word
+            frequencies: Current term -> document frequency; terms no longer
+                         present there are never suggested
+
+        Returns:
+            (term, edit distance), or None if no term is close enough
+        """
+        limit = self.max_distance(word)
+        if not limit:
+            return None
+
+        best: Optional[Tuple[int, int, str]] = None  # (distance, -frequency, term)
+        checked: Set[str] = set()
+        seen = {word[:self.prefix_length]}
+        level = [word[:self.prefix_length]]
+        # Deletes of the word by increasing count: a term within distance d
+        # shares a delete made of at most d deletions from each side
+        for deletions in range(limit + 1):
+            if best is not None and best[0] < deletions:
+                break
+            for delete in level:
+                bucket = self._deletes.get(delete, ())
+                for term in (bucket,) if isinstance(bucket, str) else bucket:
+                    if term in checked:
+                        continue
+                    checked.add(term)
+                    frequency = frequencies.get(term, 0)
+                    if not frequency:
+                        continue
+                    bound = limit if best is None else best[0]
+                    if term[0] != word[0]:
+                        bound = min(bound, 1)
+                    distance = edit_distance(word, term, bound)
+                    if distance > bound:
+                        continue
+                    candidate = (distance, -frequency, term)
+                    if best is None or candidate < best:
+                        best = candidate
+            level = [
+                shorter for delete in level if len(delete) > 1
+                for shorter in (delete[:i] + delete[i + 1:] for i in range(len(delete)))
+                if shorter not in seen and not seen.add(shorter)
+            ]
+        if best is None:
+            return None
+        return best[2], best[0]
+
+    def correct(self, text: str, frequencies: Mapping[str, int]) -> Tuple[str, Dict[str, str]]:
+        """
+        Replace the out-of-vocabulary words of a lowercased text by their corrections.
+
+        Words with digits (model numbers, sizes) are left alone.
+
+        Returns:
+            (corrected text, {word: correction})
+        """
+        corrections: Dict[str, str] = {}
+        for word in set(_TOKEN_PATTERN.findall(text)):
+            if word in frequencies or any(char.isdigit() for char in word):
+                continue
+            suggestion = self.lookup(word, frequencies)
+            if suggestion is not None:
+                corrections[word] = suggestion[0]
+        if not corrections:
+            return text, corrections
+        corrected = _TOKEN_PATTERN.sub(lambda match: corrections.get(match.group(), match.group()), text)
+        return corrected, corrections
+
+    def _edits(self, word: str, distance: Optional[int] = None) -> Set[str]:
+        """word and every string reachable from it by deleting up to distance characters"""
+        if distance is None:
+            distance = self.max_edit_distance
+        edits = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {
+                candidate[:i] + candidate[i + 1:]
+                for candidate in frontier if len(candidate) > 1
+                for i in range(len(candidate))
+            }
+            edits |= frontier
+        return edits
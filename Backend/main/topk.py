@@ -0,0 +1,174 @@
+"""
+Top-k retrieval with MaxScore-style dynamic pruning.
+
+A query is a sequence of TermScores (one per query term occurrence, in query
+order) holding a term's doc ids sorted ascending and the BM25 contribution of
+the term to each of those documents. Documents are only fully scored (every
+term probed, expensive ranking signals evaluated) when an upper bound on
+their final score can still reach the current top-k threshold.
+
+The search is vectorized in blocks rather than advancing one posting cursor
+at a time, which is what keeps it fast in NumPy; pruning follows MaxScore:
+
+1. The best postings of the highest-impact term are scored first to set an
+   initial threshold.
+2. Terms are split into non-essential (the lowest upper bounds, which together
+   cannot lift a document over the threshold) and essential terms. Documents
+   that appear only in non-essential postings are never looked at.
+3. Essential documents are visited in decreasing upper-bound order; scoring
+   stops at the first block whose bound falls below the threshold. Their
+   non-essential contributions are found by binary search (skipping) into the
+   sorted postings.
+
+Ties are broken by ascending doc id, like the exhaustive ranking.
+"""
+from typing import Callable, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+# Margin absorbing float rounding between upper bounds and exact scores
+_EPSILON = 1e-6
+
+
+class TermScores(NamedTuple):
+    """BM25 contributions of one term, aligned with its sorted posting doc ids"""
+    doc_ids: np.ndarray
+    scores: np.ndarray
+    upper_bound: float
+
+
+def accumulate(query: List[TermScores], doc_ids: np.ndarray) -> np.ndarray:
+    """
+    Exact BM25 scores of the given documents.
+    
+    Contributions are summed in query order, so results are bit-identical to
+    term-at-a-time accumulation over the same terms.
+    """
+    totals = np.zeros(len(doc_ids), dtype=np.float64)
+    for term in query:
+        positions = np.searchsorted(term.doc_ids, doc_ids)
+        found = positions < len(term.doc_ids)
+        found[found] = term.doc_ids[positions[found]] == doc_ids[found]
+        totals[found] += term.scores[positions[found]]
+    return totals
+
+
+def min_score(query: List[TermScores]) -> float:
+    """
+    Smallest BM25 score among all documents matching any query term.
+    
+    Every contribution is positive, so a document scoring below some value
+    must have each of its contributions below that value too. The best
+    candidate from the per-term minima bounds the search; only postings with
+    a smaller contribution are fully scored.
+    """
+    distinct = list({id(term): term for term in query}.values())
+    seed_term = min(distinct, key=lambda term: term.scores.min())
+    seed = seed_term.doc_ids[[int(np.argmin(seed_term.scores))]]
+    best = float(accumulate(query, seed)[0])
+    
+    below = [term.doc_ids[term.scores < best] for term in distinct]
+    candidates = np.unique(np.concatenate(below))
+    if len(candidates):
+        best = min(best, float(accumulate(query, candidates).min()))
+    return best
+
+
+def max_score_top_k(
+    query: List[TermScores],
+    k: int,
+    score: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    upper_bound: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    global_bound: Callable[[float], float],
+    doc_mask: Optional[np.ndarray] = None,
+    block_size: int = 256
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k documents by final score.
+    
+    Args:
+        query: Term contributions in query order (duplicates repeated)
+        k: Number of results
+        score: (doc_ids, bm25) -> exact final scores
+        upper_bound: (doc_ids, bm25 upper bounds) -> final score upper bounds;
+                     must be monotone in the BM25 argument
+        global_bound: bm25 upper bound -> final score bound valid for any document
+        doc_mask: Optional boolean array over all doc ids; False excludes a document
+        block_size: Documents fully scored per vectorized step
+        
+    Returns:
+        (doc_ids, scores) sorted by descending score, then ascending doc id
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+    if k <= 0 or not query:
+        return empty
+    
+    # Distinct terms with their upper bounds (duplicated terms count once per occurrence)
+    distinct = {}
+    for term in query:
+        entry = distinct.setdefault(id(term), [term, 0.0])
+        entry[1] += term.upper_bound
+    terms = sorted(distinct.values(), key=lambda entry: entry[1])
+    
+    top_ids, top_scores = empty
+    evaluated = np.empty(0, dtype=np.int64)
+    
+    def allowed(doc_ids: np.ndarray) -> np.ndarray:
+        doc_ids = np.setdiff1d(doc_ids, evaluated, assume_unique=True)
+        if doc_mask is not None:
+            doc_ids = doc_ids[doc_mask[doc_ids]]
+        return doc_ids
+    
+    def threshold() -> float:
+        return float(top_scores[-1]) if len(top_scores) >= k else -np.inf
+    
+    def visit(doc_ids: np.ndarray, bounds: np.ndarray):
+        """Fully score documents in decreasing bound order until the threshold prunes the rest"""
+        nonlocal top_ids, top_scores, evaluated
+        order = np.argsort(-bounds, kind='stable')
+        doc_ids, bounds = doc_ids[order], bounds[order]
+        
+        for start in range(0, len(doc_ids), block_size):
+            if bounds[start] < threshold() - _EPSILON:
+                break
+            block = doc_ids[start:start + block_size]
+            block = block[bounds[start:start + block_size] >= threshold() - _EPSILON]
+            
+            ids = np.concatenate([top_ids, block])
+            scores = np.concatenate([top_scores, score(block, accumulate(query, block))])
+            keep = np.lexsort((ids, -scores))[:k]
+            top_ids, top_scores = ids[keep], scores[keep]
+            evaluated = np.union1d(evaluated, block)
+    
+    # 1. Seed the threshold with the best postings of the highest-impact term
+    seed_term = terms[-1][0]
+    seed_ids, seed_scores = seed_term.doc_ids, seed_term.scores
+    if doc_mask is not None:
+        keep = doc_mask[seed_ids]
+        seed_ids, seed_scores = seed_ids[keep], seed_scores[keep]
+    if len(seed_ids) > block_size:
+        best = np.argpartition(-seed_scores, block_size - 1)[:block_size]
+        seed_ids = np.sort(seed_ids[best])
+    visit(seed_ids, upper_bound(seed_ids, accumulate(query, seed_ids)))
+    
+    # 2. Non-essential terms: lowest bounds that cannot reach the threshold on their own
+    split = 0
+    cumulative = 0.0
+    for _, bound in terms:
+        if global_bound(cumulative + bound) >= threshold() - _EPSILON:
+            break
+        cumulative += bound
+        split += 1
+    essential_ids = {id(term) for term, _ in terms[split:]}
+    essential = [term for term in query if id(term) in essential_ids]
+    
+    if not essential:
+        # No unseen document can reach the threshold
+        return top_ids, top_scores
+    
+    # 3. Essential documents in decreasing upper-bound order
+    candidates = allowed(np.unique(np.concatenate([term.doc_ids for term in essential])))
+    if len(candidates):
+        bm25_upper = accumulate(essential, candidates) + cumulative
+        visit(candidates, upper_bound(candidates, bm25_upper))
+    
+    return top_ids, top_scores
@@ -0,0 +1,321 @@
+"""
+Benchmark suite for the search engine on synthetic catalogs.
+
+For each catalog size, in a fresh process (so memory figures are per size):
+- generates a synthetic catalog (see synthetic_catalog.py)
+- times index building and records memory (process RSS growth, peak RSS,
+  and the engine's own index size estimate)
+- runs a query workload per scenario (query length x filter x sort mode)
+  with the result cache disabled and records latency percentiles
+
+Results are written as JSON; compare mode diffs two result files and exits
+with status 1 if any metric regressed beyond the threshold.
+
+Usage (from Backend/):
+    python -m testing.benchmark run --sizes 10k 100k --output bench.json
+    python -m testing.benchmark compare baseline.json bench.json --threshold 0.1
+    python -m testing.benchmark generate --size 100k --output catalog.csv
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from testing.synthetic_catalog import generate_catalog, parse_size
+
+# Workload scenarios: query length in words (0 = browse), filter kind, sort mode, top-k retrieval
+SCENARIOS: List[Dict[str, Any]] = [
+    {'name': 'len1', 'words': 1, 'filter': None, 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len2', 'words': 2, 'filter': None, 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len3', 'words': 3, 'filter': None, 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len5', 'words': 5, 'filter': None, 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len1_topk', 'words': 1, 'filter': None, 'sort_by': 'relevance', 'top_k': True},
+    {'name': 'len3_topk', 'words': 3, 'filter': None, 'sort_by': 'relevance', 'top_k': True},
+    {'name': 'len2_price', 'words': 2, 'filter': 'price', 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len2_brand', 'words': 2, 'filter': 'brand', 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len2_available', 'words': 2, 'filter': 'availability', 'sort_by': 'relevance', 'top_k': False},
+    {'name': 'len2_price_low', 'words': 2, 'filter': None, 'sort_by': 'price_low', 'top_k': False},
+    {'name': 'len2_reviews', 'words': 2, 'filter': None, 'sort_by': 'reviews', 'top_k': False},
+    {'name': 'browse_price_low', 'words': 0, 'filter': None, 'sort_by': 'price_low', 'top_k': False},
+    {'name': 'browse_brand', 'words': 0, 'filter': 'brand', 'sort_by': 'relevance', 'top_k': False},
+]
+
+# Compared metrics: (name, noise floor below which differences are ignored)
+BUILD_METRICS = [('build_s', 0.05), ('index_mb', 1.0), ('peak_rss_mb', 1.0)]
+LATENCY_METRICS = [('p50', 0.05), ('p95', 0.1), ('p99', 0.2)]
+
+
+def run_size(rows: int, seed: int, queries: int, limit: int, warmup: int) -> Dict[str, Any]:
+    """
+    Benchmark one catalog size (run in its own process).
+
+    Args:
+        rows: Catalog size
+        seed: Seed for the catalog and the query workload
+        queries: Timed queries per scenario
+        limit: Results per search
+        warmup: Untimed queries per scenario run first
+
+    Returns:
+        Build, memory and per-scenario latency figures
+    """
+    from main.finder import EcommerceSearchEngine
+
+    rss_start = rss_mb()
+    catalog = generate_catalog(rows, seed=seed)
+    rss_catalog = rss_mb()
+
+    engine = EcommerceSearchEngine(cache_size=0, slow_query_ms=None)
+    start = time.perf_counter()
+    engine.load_data(df=catalog)
+    build_s = time.perf_counter() - start
+    rss_built = rss_mb()
+    stats = engine.get_stats()
+
+    rng = np.random.default_rng(seed + 1)
+    latency: Dict[str, Dict[str, float]] = {}
+    for scenario in SCENARIOS:
+        workload = _workload(catalog, scenario, rng, warmup + queries)
+        timings = []
+        for i, (query, filters) in enumerate(workload):
+            start = time.perf_counter()
+            engine.search(query, filters=filters, limit=limit, top_k=scenario['top_k'])
+            if i >= warmup:
+                timings.append((time.perf_counter() - start) * 1000)
+        latency[scenario['name']] = percentiles(timings)
+
+    return {
+        'rows': rows,
+        'build_s': round(build_s, 3),
+        'build_docs_per_s': round(rows / build_s, 1) if build_s else 0.0,
+        'catalog_mb': _round(rss_catalog - rss_start if rss_catalog is not None else None),
+        'index_mb': _round(rss_built - rss_catalog if rss_built is not None else None),
+        'peak_rss_mb': _round(peak_rss_mb()),
+        'index_bytes': stats['index_bytes'],
+        'unique_terms': stats['unique_terms'],
+        'unique_brands': stats['unique_brands'],
+        'latency_ms': latency,
+    }
+
+
+def run(sizes: List[str], seed: int, queries: int, limit: int, warmup: int) -> Dict[str, Any]:
+    """Benchmark every size, each in a fresh process; returns the full result document"""
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for size in sizes:
+        rows = parse_size(size)
+        print(f"⏱  {size} ({rows:,} products)...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_size, rows, seed, queries, limit, warmup).result()
+        results[size] = result
+        _print_size(size, result)
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'queries': queries,
+            'limit': limit,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Metric-by-metric comparison of two result documents.
+
+    A metric regressed when it grew by more than threshold (relative) and by
+    more than its noise floor (absolute); it improved on the mirror condition.
+
+    Returns:
+        One row per metric present in both documents, with 'status'
+        'regression', 'improved' or 'ok'
+    """
+    rows = []
+    for size, result in current['results'].items():
+        before = baseline['results'].get(size)
+        if before is None:
+            continue
+        pairs: List[Tuple[str, Optional[float], Optional[float], float]] = [
+            (metric, before.get(metric), result.get(metric), floor) for metric, floor in BUILD_METRICS
+        ]
+        for scenario, figures in result['latency_ms'].items():
+            old = before['latency_ms'].get(scenario)
+            if old is not None:
+                pairs.extend(
+                    (f"{scenario}.{metric}", old.get(metric), figures.get(metric), floor)
+                    for metric, floor in LATENCY_METRICS
+                )
+        for metric, old, new, floor in pairs:
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            status = 'ok'
+            if new - old > floor and change > threshold:
+                status = 'regression'
+            elif old - new > floor and -change > threshold:
+                status = 'improved'
+            rows.append({'size': size, 'metric': metric, 'baseline': old, 'current': new,
+                         'change': round(change, 4), 'status': status})
+    return rows
+
+
+def _workload(catalog: pd.DataFrame, scenario: Dict[str, Any], rng: np.random.Generator,
+              count: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """(query, filters) pairs for a scenario, taken from random products so queries match"""
+    titles = catalog['title'].to_numpy()
+    brands = catalog['brand'].to_numpy()
+    prices = catalog['price'].dropna().to_numpy()
+    low, high = np.percentile(prices, [25, 75]) if len(prices) else (0.0, 0.0)
+
+    workload = []
+    while len(workload) < count:
+        row = int(rng.integers(0, len(catalog)))
+        words = [word for word in titles[row].lower().split() if word.isalnum()]
+        if scenario['words']:
+            if len(words) < scenario['words']:
+                continue
+            start = int(rng.integers(0, len(words) - scenario['words'] + 1))
+            query = ' '.join(words[start:start + scenario['words']])
+        else:
+            query = ''
+        filters: Dict[str, Any] = {}
+        if scenario['filter'] == 'price':
+            filters.update(min_price=float(low), max_price=float(high))
+        elif scenario['filter'] == 'brand':
+            if not brands[row]:
+                continue
+            filters['brand'] = brands[row]
+        elif scenario['filter'] == 'availability':
+            filters['availability'] = True
+        if scenario['sort_by'] != 'relevance':
+            filters['sort_by'] = scenario['sort_by']
+        workload.append((query, filters))
+    return workload
+
+
+def percentiles(timings: List[float]) -> Dict[str, float]:
+    values = np.asarray(timings)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': len(values),
+        'p50': round(float(p50), 4),
+        'p95': round(float(p95), 4),
+        'p99': round(float(p99), 4),
+        'mean': round(float(values.mean()), 4),
+        'max': round(float(values.max()), 4),
+    }
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size (Linux only)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_size(size: str, result: Dict[str, Any]):
+    print(f"   build {result['build_s']:.2f}s ({result['build_docs_per_s']:,.0f} docs/s), "
+          f"index {result['index_mb']} MB, peak RSS {result['peak_rss_mb']} MB, "
+          f"{result['unique_terms']:,} terms")
+    print(f"   {'scenario':<18} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for scenario, figures in result['latency_ms'].items():
+        print(f"   {scenario:<18} {figures['p50']:>8.3f} {figures['p95']:>8.3f} {figures['p99']:>8.3f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmark')
+    run_parser.add_argument('--sizes', nargs='+', default=['10k'], help='Catalog sizes, e.g. 10k 100k 1m')
+    run_parser.add_argument('--queries', type=int, default=200, help='Timed queries per scenario')
+    run_parser.add_argument('--warmup', type=int, default=20, help='Untimed queries per scenario')
+    run_parser.add_argument('--limit', type=int, default=50, help='Results per search')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help='Write results as JSON to this file')
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Relative increase counted as a regression (default 0.10)')
+    compare_parser.add_argument('--all', action='store_true', help='Print unchanged metrics too')
+
+    generate_parser = commands.add_parser('generate', help='Write a synthetic catalog to CSV')
+    generate_parser.add_argument('--size', default='10k')
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--output', required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        document = run(args.sizes, args.seed, args.queries, args.limit, args.warmup)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(document, output, indent=2)
+            print(f"\n📄 Results written to {args.output}")
+        return 0
+
+    if args.command == 'compare':
+        with open(args.baseline) as baseline, open(args.current) as current:
+            rows = compare(json.load(baseline), json.load(current), args.threshold)
+        regressions = [row for row in rows if row['status'] == 'regression']
+        for row in rows:
+            if args.all or row['status'] != 'ok':
+                marker = {'regression': '❌', 'improved': '✅', 'ok': '  '}[row['status']]
+                print(f"{marker} {row['size']:<6} {row['metric']:<26} {row['baseline']:>10} -> "
+                      f"{row['current']:<10} ({row['change']:+.1%})")
+        print(f"\n{len(regressions)} regression(s) in {len(rows)} compared metrics")
+        return 1 if regressions else 0
+
+    catalog = generate_catalog(parse_size(args.size), seed=args.seed)
+    catalog.to_csv(args.output, index=False)
+    print(f"📄 {len(catalog):,} products written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
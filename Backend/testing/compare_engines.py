@@ -0,0 +1,295 @@
+"""
+Offline comparison of search engines on the same catalog and query set.
+
+Each engine is wrapped in a SearchAdapter (build a catalog, return ASINs for
+a query) and run in a fresh process, so build time and memory are its own:
+- builds its index over processed_data.csv or a synthetic catalog
+- replays the same queries (the judged queries plus title n-grams sampled
+  from the catalog) and records latency percentiles
+- on processed_data.csv, scores the judged queries in judged_queries.json
+  with NDCG@10, recall at the result limit and MRR
+
+Judgments are graded per ASIN: 2 = what the query asks for, 1 = related
+(an accessory or a close variant), unlisted = not relevant. They are keyed
+by processed_data.csv ASINs, so synthetic catalogs report latency and
+memory only.
+
+Usage (from Backend/):
+    python -m testing.compare_engines --catalog processed
+    python -m testing.compare_engines --catalog 100k --engines engine --output compare.json
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import multiprocessing
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from testing.benchmark import git_commit, peak_rss_mb, percentiles, rss_mb
+from testing.synthetic_catalog import generate_catalog, load_seed, parse_size
+
+JUDGED_QUERIES = Path(__file__).resolve().parent / 'judged_queries.json'
+NDCG_K = 10
+
+
+class SearchAdapter:
+    """Common interface the harness drives every engine through"""
+    name = ''
+
+    def build(self, catalog: pd.DataFrame):
+        """
+        Index a catalog.
+
+        Args:
+            catalog: Products in the engine's column layout (see synthetic_catalog.load_seed)
+        """
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int) -> List[str]:
+        """
+        Args:
+            query: Search query string
+            limit: Maximum number of results
+
+        Returns:
+            ASINs of the results, best first
+        """
+        raise NotImplementedError
+
+
+class EngineAdapter(SearchAdapter):
+    """EcommerceSearchEngine from main/finder.py, with the result cache off"""
+    name = 'engine'
+
+    def build(self, catalog: pd.DataFrame):
+        from main.finder import EcommerceSearchEngine
+
+        self.engine = EcommerceSearchEngine(cache_size=0, slow_query_ms=None)
+        self.engine.load_data(df=catalog)
+
+    def search(self, query: str, limit: int) -> List[str]:
+        result = self.engine.search(query, limit=limit, fields=['asin'])
+        return [row['asin'] for row in result.results]
+
+
+class RankerAdapter(SearchAdapter):
+    """ProductSearchRanker from experiments/ranker_improved.py (needs scikit-learn)"""
+    name = 'ranker'
+
+    def build(self, catalog: pd.DataFrame):
+        from experiments.ranker_improved import ProductSearchRanker
+
+        self.ranker = ProductSearchRanker(df=pd.DataFrame({
+            'title': catalog['title'],
+            'brand': catalog['brand'],
+            'description': catalog['product_description'],
+            'final_price': catalog['price'],
+            'reviews_count': catalog['rating_count'],
+            'availability': np.where(catalog['availability'], 'In Stock', 'Out of stock'),
+            'parent_asin': catalog['asin'],
+        }))
+
+    def search(self, query: str, limit: int) -> List[str]:
+        results, _ = self.ranker.search(query, topk=limit, pool=limit)
+        return results['parent_asin'].tolist()
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (EngineAdapter, RankerAdapter)}
+
+
+def load_catalog(catalog: str, seed: int = 0) -> pd.DataFrame:
+    """processed_data.csv for 'processed', otherwise a synthetic catalog of that size ('10k')"""
+    if catalog == 'processed':
+        return load_seed()
+    return generate_catalog(parse_size(catalog), seed=seed)
+
+
+def load_judgments(path: Path = JUDGED_QUERIES) -> Dict[str, Dict[str, int]]:
+    """Query -> {ASIN: grade}"""
+    with open(path) as judged:
+        return {entry['query']: entry['judgments'] for entry in json.load(judged)}
+
+
+def sample_queries(catalog: pd.DataFrame, count: int, seed: int) -> List[str]:
+    """Title n-grams of 1-3 words from random products, so every query matches something"""
+    rng = np.random.default_rng(seed)
+    titles = catalog['title'].to_numpy()
+    queries: List[str] = []
+    while len(queries) < count:
+        words = [word for word in str(titles[rng.integers(0, len(titles))]).lower().split() if word.isalnum()]
+        length = int(rng.integers(1, 4))
+        if len(words) < length:
+            continue
+        start = int(rng.integers(0, len(words) - length + 1))
+        queries.append(' '.join(words[start:start + length]))
+    return queries
+
+
+def ndcg(ranking: List[str], judgments: Dict[str, int], k: int = NDCG_K) -> float:
+    """Normalized discounted cumulative gain of the top k, with gain 2 ** grade - 1"""
+    dcg = sum((2 ** judgments.get(asin, 0) - 1) / math.log2(rank + 2) for rank, asin in enumerate(ranking[:k]))
+    ideal = sorted(judgments.values(), reverse=True)[:k]
+    ideal_dcg = sum((2 ** grade - 1) / math.log2(rank + 2) for rank, grade in enumerate(ideal))
+    return dcg / ideal_dcg if ideal_dcg else 0.0
+
+
+def recall(ranking: List[str], judgments: Dict[str, int]) -> float:
+    """Share of the relevant (grade > 0) ASINs found anywhere in the ranking"""
+    relevant = {asin for asin, grade in judgments.items() if grade > 0}
+    return len(relevant.intersection(ranking)) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(ranking: List[str], judgments: Dict[str, int]) -> float:
+    """1 / rank of the first relevant result (0 when none is returned)"""
+    for rank, asin in enumerate(ranking):
+        if judgments.get(asin, 0) > 0:
+            return 1.0 / (rank + 1)
+    return 0.0
+
+
+def relevance(rankings: Dict[str, List[str]], judged: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    """Per-query and mean NDCG@10, recall and MRR over the judged queries"""
+    per_query = {
+        query: {
+            f'ndcg@{NDCG_K}': round(ndcg(rankings[query], judgments), 4),
+            'recall': round(recall(rankings[query], judgments), 4),
+            'mrr': round(reciprocal_rank(rankings[query], judgments), 4),
+        }
+        for query, judgments in judged.items()
+    }
+    means = {
+        metric: round(float(np.mean([figures[metric] for figures in per_query.values()])), 4)
+        for metric in (f'ndcg@{NDCG_K}', 'recall', 'mrr')
+    }
+    return {**means, 'queries': per_query}
+
+
+def run_engine(name: str, catalog_name: str, seed: int, queries: List[str], limit: int,
+               warmup: int) -> Dict[str, Any]:
+    """
+    Build one engine and replay the queries (run in its own process).
+
+    Args:
+        name: Adapter name (see ADAPTERS)
+        catalog_name: 'processed' or a synthetic catalog size
+        seed: Seed for a synthetic catalog
+        queries: Queries to replay, in order
+        limit: Results per search
+        warmup: Leading queries replayed untimed first
+
+    Returns:
+        Build, memory and latency figures plus the ranking of every query,
+        or {'skipped': reason} when the engine cannot be built here
+    """
+    rss_start = rss_mb()
+    catalog = load_catalog(catalog_name, seed)
+    rss_catalog = rss_mb()
+
+    adapter = ADAPTERS[name]()
+    start = time.perf_counter()
+    try:
+        adapter.build(catalog)
+    except ImportError as error:
+        return {'skipped': f"missing dependency: {error}"}
+    build_s = time.perf_counter() - start
+    rss_built = rss_mb()
+    peak_mb = peak_rss_mb()
+
+    for query in queries[:warmup]:
+        adapter.search(query, limit)
+    timings = []
+    rankings: Dict[str, List[str]] = {}
+    for query in queries:
+        start = time.perf_counter()
+        rankings[query] = adapter.search(query, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'rows': len(catalog),
+        'build_s': round(build_s, 3),
+        'catalog_mb': round(rss_catalog - rss_start, 1) if rss_catalog is not None else None,
+        'index_mb': round(rss_built - rss_catalog, 1) if rss_built is not None else None,
+        'peak_rss_mb': round(peak_mb, 1) if peak_mb is not None else None,
+        'latency_ms': percentiles(timings),
+        'rankings': rankings,
+    }
+
+
+def run(engines: List[str], catalog: str, seed: int, queries: int, limit: int, warmup: int,
+        judged_path: Path = JUDGED_QUERIES) -> Dict[str, Any]:
+    """Compare engines, each in a fresh process; returns the full result document"""
+    judged = load_judgments(judged_path) if catalog == 'processed' else {}
+    query_set = list(judged) + sample_queries(load_catalog(catalog, seed), queries, seed + 1)
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in engines:
+        print(f"⏱  {name} on {catalog} ({len(query_set)} queries)...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_engine, name, catalog, seed, query_set, limit, warmup).result()
+        rankings = result.pop('rankings', {})
+        if judged and 'skipped' not in result:
+            result['relevance'] = relevance(rankings, judged)
+        results[name] = result
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'catalog': catalog,
+            'seed': seed,
+            'queries': len(query_set),
+            'judged_queries': len(judged),
+            'limit': limit,
+        },
+        'results': results,
+    }
+
+
+def _print_results(document: Dict[str, Any]):
+    recall_column = f"recall@{document['meta']['limit']}"
+    print(f"\n{'engine':<8} {'build s':>8} {'index MB':>9} {'peak MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{f'ndcg@{NDCG_K}':>8} {recall_column:>10} {'mrr':>6}")
+    for name, result in document['results'].items():
+        if 'skipped' in result:
+            print(f"{name:<8} skipped ({result['skipped']})")
+            continue
+        scores = result.get('relevance', {})
+        figures = [scores.get(f'ndcg@{NDCG_K}'), scores.get('recall'), scores.get('mrr')]
+        ndcg_text, recall_text, mrr_text = ['-' if value is None else f"{value:.3f}" for value in figures]
+        print(f"{name:<8} {result['build_s']:>8.2f} {str(result['index_mb']):>9} {str(result['peak_rss_mb']):>8} "
+              f"{result['latency_ms']['p50']:>8.3f} {result['latency_ms']['p95']:>8.3f} "
+              f"{ndcg_text:>8} {recall_text:>10} {mrr_text:>6}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--catalog', default='processed',
+                        help="'processed' for processed_data.csv or a synthetic size, e.g. 10k")
+    parser.add_argument('--engines', nargs='+', default=list(ADAPTERS), choices=list(ADAPTERS))
+    parser.add_argument('--judged', type=Path, default=JUDGED_QUERIES, help='Judged query file')
+    parser.add_argument('--queries', type=int, default=200, help='Sampled queries replayed besides the judged ones')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed queries run first')
+    parser.add_argument('--limit', type=int, default=50, help='Results per search')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    document = run(args.engines, args.catalog, args.seed, args.queries, args.limit, args.warmup, args.judged)
+    _print_results(document)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(document, output, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Synthetic product catalogs for benchmarking, modelled on processed_data.csv.
+
+Each generated product starts from a random seed product and varies it:
+- title: the seed title with words swapped for catalog words (drawn by
+  their frequency in seed titles) and, for most products, a model code
+  shared by a few variants, so the vocabulary keeps growing with the
+  catalog like a real one does
+- brand: usually the seed product's brand, otherwise a brand drawn by seed
+  frequency or from a long tail of synthetic brands that grows with size
+- description: the seed description plus a product-specific sentence, so
+  every description is distinct text
+- price, rating count, availability: the seed values with log-normal noise,
+  keeping the seed share of missing prices
+
+Generation is deterministic for a given seed.
+"""
+from pathlib import Path
+import re
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+SEED_CSV = Path(__file__).resolve().parent.parent / 'experiments' / 'classifier' / 'processed_data.csv'
+
+# Catalog sizes by name, e.g. for --sizes 10k 100k 1m
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+_WORD = re.compile(r'\S+')
+_CODE_LETTERS = np.array(list('ABCDEFGHJKLMNPQRSTUVWXYZ'))
+_SYLLABLES = ['ar', 'ex', 'on', 'ix', 'ka', 'lo', 'ven', 'tra', 'zen', 'qu', 'ro', 'mi', 'tek', 'sol', 'nova', 'vo']
+
+
+def parse_size(size: str) -> int:
+    """Number of rows for a size name ('10k', '1m') or a plain number"""
+    size = size.strip().lower()
+    if size in SIZES:
+        return SIZES[size]
+    if size.endswith('k'):
+        return int(float(size[:-1]) * 1_000)
+    if size.endswith('m'):
+        return int(float(size[:-1]) * 1_000_000)
+    return int(size)
+
+
+def load_seed(path: Path = SEED_CSV) -> pd.DataFrame:
+    """
+    Seed products in the engine's column layout.
+
+    Returns:
+        DataFrame with title, brand, product_description, price,
+        rating_count, availability and asin columns
+    """
+    raw = pd.read_csv(path)
+    return pd.DataFrame({
+        'title': raw['title'].fillna('').astype(str),
+        'brand': raw['brand'].fillna('').astype(str),
+        'product_description': raw['description'].fillna('').astype(str),
+        'price': raw['final_price'].astype(float),
+        'rating_count': raw['reviews_count'].fillna(0).astype(int),
+        'availability': raw['is_available'].fillna(False).astype(bool),
+        'asin': raw['parent_asin'].astype(str),
+    })
+
+
+def generate_catalog(rows: int,
+                     seed: int = 0,
+                     seed_products: Optional[pd.DataFrame] = None,
+                     mutation_rate: float = 0.25,
+                     model_code_rate: float = 0.6,
+                     brand_keep_rate: float = 0.85) -> pd.DataFrame:
+    """
+    Generate a synthetic catalog.
+
+    Args:
+        rows: Number of products
+        seed: Random seed
+        seed_products: Products to model (load_seed() if None)
+        mutation_rate: Probability of replacing each title word
+        model_code_rate: Share of products whose title carries a model code
+        brand_keep_rate: Share of products keeping their seed product's brand
+
+    Returns:
+        DataFrame in the engine's column layout, with unique ASINs
+    """
+    if seed_products is None:
+        seed_products = load_seed()
+    rng = np.random.default_rng(seed)
+
+    titles = [_WORD.findall(title) for title in seed_products['title']]
+    title_words, title_word_probs = _unigrams(titles)
+    description_words, description_word_probs = _unigrams(
+        _WORD.findall(text) for text in seed_products['product_description']
+    )
+    seed_brands = seed_products['brand'].to_numpy()
+    brand_values, brand_counts = np.unique(seed_brands[seed_brands != ''], return_counts=True)
+
+    templates = rng.integers(0, len(seed_products), rows)
+
+    # Titles: replaced words, then a model code shared by ~4 variants
+    replacement_words = title_words[rng.choice(len(title_words), size=rows * 8, p=title_word_probs)]
+    codes = _model_codes(rng, max(1, rows // 4))
+    code_ids = np.where(rng.random(rows) < model_code_rate, rng.integers(0, len(codes), rows), -1)
+    generated_titles: List[str] = []
+    cursor = 0
+    for row, template in enumerate(templates.tolist()):
+        words = list(titles[template])
+        replace = rng.random(len(words)) < mutation_rate
+        for i in np.flatnonzero(replace).tolist():
+            words[i] = replacement_words[cursor % len(replacement_words)]
+            cursor += 1
+        if code_ids[row] >= 0:
+            words.insert(min(len(words), 1 + row % 3), codes[code_ids[row]])
+        generated_titles.append(' '.join(words))
+
+    # Brands: seed brand, a seed-frequency draw, or the synthetic long tail
+    tail = _brand_names(rng, max(50, rows // 200))
+    draw = rng.random(rows)
+    brands = seed_brands[templates].astype(object)
+    from_seed = (draw >= brand_keep_rate) & (draw < brand_keep_rate + (1 - brand_keep_rate) / 2)
+    from_tail = draw >= brand_keep_rate + (1 - brand_keep_rate) / 2
+    brands[from_seed] = brand_values[rng.choice(len(brand_values), size=int(from_seed.sum()),
+                                                p=brand_counts / brand_counts.sum())]
+    brands[from_tail] = tail[rng.integers(0, len(tail), int(from_tail.sum()))]
+
+    # Descriptions: seed text plus 6-20 words of product-specific text
+    lengths = rng.integers(6, 21, rows)
+    extra = description_words[rng.choice(len(description_words), size=int(lengths.sum()), p=description_word_probs)]
+    ends = np.cumsum(lengths)
+    seed_descriptions = seed_products['product_description'].to_numpy()
+    descriptions = [
+        f"{seed_descriptions[template]} {' '.join(extra[end - length:end])}."
+        for template, length, end in zip(templates.tolist(), lengths.tolist(), ends.tolist())
+    ]
+
+    # Prices, ratings and availability: seed values with noise
+    prices = seed_products['price'].to_numpy()[templates] * rng.lognormal(0.0, 0.25, rows)
+    prices = np.round(prices, 2)
+    rating_counts = seed_products['rating_count'].to_numpy()[templates]
+    rating_counts = np.round(rating_counts * rng.lognormal(0.0, 0.5, rows)).astype(np.int64)
+    availability = rng.random(rows) < seed_products['availability'].mean()
+
+    return pd.DataFrame({
+        'title': generated_titles,
+        'brand': brands,
+        'product_description': descriptions,
+        'price': prices,
+        'rating_count': rating_counts,
+        'availability': availability,
+        'asin': [f"SYN{i:09d}" for i in range(rows)],
+    })
+
+
+def _unigrams(documents) -> tuple:
+    """(words, probabilities) of the words in documents, by frequency"""
+    counts = pd.Series([word for words in documents for word in words], dtype=object).value_counts()
+    return counts.index.to_numpy(dtype=object), (counts / counts.sum()).to_numpy()
+
+
+def _model_codes(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Distinct model codes like 'KX-4821'"""
+    letters = _CODE_LETTERS[rng.integers(0, len(_CODE_LETTERS), (count, 2))]
+    numbers = rng.integers(100, 100_000, count)
+    codes = [f"{a}{b}-{n}" for (a, b), n in zip(letters.tolist(), numbers.tolist())]
+    return np.array(list(dict.fromkeys(codes)), dtype=object)
+
+
+def _brand_names(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Made-up brand names of 2-3 syllables"""
+    parts = rng.integers(0, len(_SYLLABLES), (count, 3))
+    sizes = rng.integers(2, 4, count)
+    names = [''.join(_SYLLABLES[p] for p in row[:size]).capitalize() for row, size in zip(parts.tolist(), sizes.tolist())]
+    return np.array(list(dict.fromkeys(names)), dtype=object)
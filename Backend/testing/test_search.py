@@ -1,8 +1,11 @@
 """
 Test script for the improved BM25 + Multi-Signal search engine
 """
+import sys
+import threading
 import pandas as pd
 from main.finder import EcommerceSearchEngine
+from main.sharding import ShardedSearchEngine
 
 # Create sample test data
 sample_data = {
@@ -29,7 +32,8 @@ sample_data = {
         'High-end graphics card for 4K gaming',
     ],
     'rating_count': [500, 1200, 800, 350, 3500, 2100, 4500, 920],
-    'availability': [True, True, True, True, True, True, True, True]
+    'availability': [True, True, True, True, True, True, True, True],
+    'asin': ['B0D6NN87T8', 'B0815XFSGK', 'B0BCDR9M33', 'B0815Y8J9N', 'B07GBZ4Q68', 'B07D5S5QKF', 'B07MFZY2F2', 'B08J5F3G18'],
 }
 
 df = pd.DataFrame(sample_data)
@@ -103,6 +107,26 @@ print(f"   Found: {len(result.results)} results")
 for i, product in enumerate(result.results, 1):
     print(f"   {i}. [{product['relevance_score']:5.2f}] {product['title'][:40]}... ${product['price']}")
 
+print("\n🔍 Query: 'AMD' projected to title and price")
+result = engine.search(query='AMD', limit=3, fields=['title', 'price'])
+for product in result.results:
+    print(f"   {dict(product)}")
+
+print("\n🔍 Query with typos: 'amd rizen procesor'")
+result = engine.search(query='amd rizen procesor', limit=3)
+print(f"   Corrected to: {result.corrected_query}")
+for i, product in enumerate(result.results, 1):
+    print(f"   {i}. [{product['relevance_score']:5.2f}] {product['title'][:40]}...")
+
+print("\n📊 Facets for 'processor'")
+result = engine.search(query='processor', limit=2, facets=['brand', 'price'])
+print(f"   brand: {result.facets['brand']}")
+print(f"   price: {result.facets['price']}")
+
+print("\n⌨️  Autocomplete for 'am' and 'amd r'")
+for prefix in ('am', 'amd r'):
+    print(f"   {prefix!r}: {[suggestion['text'] for suggestion in engine.autocomplete(prefix, limit=5)]}")
+
 # Test caching
 print("\n" + "="*70)
 print("Testing Cache Performance")
@@ -116,6 +140,132 @@ result2 = engine.search('AMD Ryzen', limit=3)
 print(f"   Second search: {result2.search_time:.2f}ms (from_cache: {result2.from_cache})")
 print(f"   Cache hit rate: {result2.cache_hit_rate:.2f}%")
 
+# Test incremental updates
+print("\n" + "="*70)
+print("Testing Incremental Updates")
+print("="*70)
+
+engine.add_products(pd.DataFrame({
+    'title': ['Logitech MX Master 3S Wireless Mouse'],
+    'brand': ['Logitech'],
+    'price': [99.99],
+    'product_description': ['Ergonomic wireless mouse with quiet clicks'],
+    'rating_count': [2800],
+    'asin': ['B09HM94VDS'],
+}))
+result = engine.search('wireless mouse', limit=3)
+print(f"\n➕ After add_products, 'wireless mouse' top hit: {result.results[0]['title'][:50]}")
+
+engine.update_product('B07GBZ4Q68', {'price': 49.99})
+result = engine.search('G502', limit=1)
+print(f"✏️  After update_product, G502 price: ${result.results[0]['price']}")
+
+engine.remove_product('B09HM94VDS')
+result = engine.search('MX Master', limit=3)
+print(f"➖ After remove_product, 'MX Master' hits: {[p['title'][:30] for p in result.results]}")
+print(f"   Tombstoned rows: {engine.get_stats()['deleted_docs']}")
+
+# Test browse pagination
+print("\n" + "="*70)
+print("Testing Browse Pagination")
+print("="*70)
+
+print("\n📄 Browsing the catalog by price, 3 per page...")
+cursor = None
+page_number = 0
+while True:
+    page = engine.browse(filters={'sort_by': 'price_low'}, limit=3, search_after=cursor)
+    page_number += 1
+    print(f"   Page {page_number}: {[p['price'] for p in page.results]}")
+    cursor = page.next_cursor
+    if cursor is None:
+        break
+
+# Test blank queries
+print("\n" + "="*70)
+print("Testing Blank Queries")
+print("="*70)
+
+# Only an empty query browses the catalog; whitespace alone matches nothing, even after a cached browse
+browsed = engine.search('', limit=3)
+blank = engine.search('  ', limit=3, facets=['brand'])
+print(f"\n⬜ '' returns {len(browsed.results)} results, '  ' returns {len(blank.results)}")
+assert browsed.results and blank.results == [] and blank.facets == {'brand': []}
+assert [len(result.results) for result in engine.search_many(['', ' \t '], limit=3)] == [3, 0]
+
+# Test facets on the sharded engine
+print("\n" + "="*70)
+print("Testing Sharded Facets")
+print("="*70)
+
+single = EcommerceSearchEngine(cache_size=0)
+single.load_data(df=df)
+with ShardedSearchEngine(num_shards=3, processes=False) as sharded:
+    sharded.load_data(df=df)
+    for query in ('processor', 'gaming', ''):
+        expected = single.search(query, limit=2, facets=['brand', 'price']).facets
+        facets = sharded.search(query, limit=2, facets=['brand', 'price']).facets
+        print(f"\n📊 {query!r}: brand {facets['brand']}")
+        assert facets == expected, (facets, expected)
+
+# Test concurrent searches while a sync publishes new snapshots
+print("\n" + "="*70)
+print("Testing Concurrent Search During a Sync")
+print("="*70)
+
+catalog = df.sample(n=2000, replace=True, random_state=0).assign(asin=[f"BASE{i}" for i in range(2000)])
+live = [EcommerceSearchEngine(cache_size=0)]
+live[0].load_data(df=catalog)
+queries = ['amd ryzen processor', 'gaming mouse', 'desktop processor', 'rgb keyboard', 'nvme ssd']
+seen = []  # (engine searched, query, ASINs returned)
+errors = []
+synced = threading.Event()
+
+def search_while_syncing(worker: int):
+    try:
+        i = 0
+        # Keep searching until the sync is done, then a while longer on the final snapshot
+        while not synced.is_set() or i < 20:
+            i += 1
+            searched = live[0]
+            query = queries[(worker + i) % len(queries)]
+            result = searched.search(query, limit=10, top_k=True)
+            seen.append((searched, query, [product['asin'] for product in result.results]))
+    except Exception as error:
+        errors.append(repr(error))
+
+def sync():
+    # Large enough batches that the title position overlay is repacked
+    for batch in range(1, 3):
+        snapshot = live[0].copy()
+        snapshot.add_products(df.sample(n=400, replace=True, random_state=batch).assign(
+            asin=[f"SYNC{batch}-{i}" for i in range(400)]))
+        # Longer titles shift the position stream of every later doc
+        for i in range(0, 2000, 200):
+            snapshot.update_product(f"BASE{i}", {'title': f"{catalog['title'].iloc[i]} {' '.join(['edition'] * batch)}"})
+        live[0] = snapshot
+    synced.set()
+
+# Switch threads often so that unsynchronized index changes would show up
+switch_interval = sys.getswitchinterval()
+sys.setswitchinterval(1e-5)
+threads = [threading.Thread(target=search_while_syncing, args=(worker,)) for worker in range(8)]
+threads.append(threading.Thread(target=sync))
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+sys.setswitchinterval(switch_interval)
+
+# Every result must match the same query re-run alone on the snapshot it came from
+wrong = sum(
+    [product['asin'] for product in searched.search(query, limit=10).results] != asins
+    for searched, query, asins in seen
+)
+print(f"\n🧵 {len(seen)} searches over {len({id(searched) for searched, _, _ in seen})} snapshots: "
+      f"{len(errors)} errors, {wrong} wrong result lists")
+assert not errors and not wrong, errors[:3]
+
 print("\n" + "="*70)
 print("✅ All tests completed successfully!")
 print("="*70)
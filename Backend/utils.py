@@ -1,5 +1,8 @@
 import re
 import math
+import sys
+import threading
+from collections import OrderedDict
 
 def parse_price(price_str):
     """
@@ -101,6 +104,202 @@ def tokenize_text(text: str) -> list[str]:
     return tokens
 
 
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a search query: lowercased, trimmed, single-spaced.
+    
+    Ranking is case-insensitive, so queries differing only in case or
+    whitespace get the same canonical form (and the same results).
+    
+    Args:
+        query: Raw query string
+        
+    Returns:
+        Normalized query
+    """
+    if not query:
+        return ""
+    return " ".join(query.lower().split())
+
+
+# Record separator: whitespace to the tokenizer, so it never ends up inside a token
+_BATCH_SEPARATOR = '\x1e'
+
+# Runs of two or more word characters: the same tokens tokenize_text keeps
+# after replacing punctuation with spaces and dropping single characters
+_TOKEN_PATTERN = re.compile(r'\w{2,}')
+
+
+def tokenize_many(texts: list[str]) -> list[list[str]]:
+    """
+    Tokenize a batch of texts with a single lowercasing pass.
+    
+    Produces exactly the same tokens as calling tokenize_text on each text,
+    but amortizes the lowercasing cost over the whole batch and extracts
+    tokens with one precompiled pattern instead of substitute/split/filter.
+    
+    Args:
+        texts: Input texts to tokenize
+        
+    Returns:
+        List of token lists, one per input text
+    """
+    if not texts:
+        return []
+    
+    blob = _BATCH_SEPARATOR.join(
+        text.replace(_BATCH_SEPARATOR, ' ') if text else '' for text in texts
+    ).lower()
+    
+    return [_TOKEN_PATTERN.findall(segment) for segment in blob.split(_BATCH_SEPARATOR)]
+
+
+class Analyzer:
+    """
+    Reusable text analyzer producing exactly the tokens of tokenize_text.
+    
+    - Short texts (brands, sizes, colors, queries) are served from an LRU cache.
+    - analyze_many tokenizes a batch in one lowercasing pass like tokenize_many,
+      analyzing each distinct text once, so repeated boilerplate costs one pass.
+    - Tokens are interned with sys.intern, the table the index's term
+      dictionary is interned in, so a token and its index term are one object
+      and repeated tokens share one string.
+    
+    Token lists are returned fresh; callers may modify them. One analyzer may
+    be shared by threads; its cache is updated under a lock.
+    """
+    
+    def __init__(self, cache_size: int = 4096, cache_max_length: int = 64):
+        """
+        Args:
+            cache_size: Number of short texts whose tokens are cached (0 disables the cache)
+            cache_max_length: Only texts up to this many characters are cached
+        """
+        self.cache_size = cache_size
+        self.cache_max_length = cache_max_length
+        self._cache: OrderedDict = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+    
+    def analyze(self, text: str) -> list[str]:
+        """
+        Tokenize and normalize one text (see tokenize_text).
+        
+        Args:
+            text: Input text to tokenize
+            
+        Returns:
+            List of normalized, interned tokens
+        """
+        if not text:
+            return []
+        cacheable = len(text) <= self.cache_max_length
+        if cacheable:
+            with self._lock:
+                tokens = self._cache.get(text)
+                if tokens is not None:
+                    self._cache.move_to_end(text)
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if tokens is not None:
+                return list(tokens)
+        
+        tokens = tuple(map(sys.intern, _TOKEN_PATTERN.findall(text.lower())))
+        if cacheable:
+            self._remember(text, tokens)
+        return list(tokens)
+    
+    def analyze_many(self, texts: list[str]) -> list[list[str]]:
+        """
+        Tokenize a batch of texts (see tokenize_many).
+        
+        Args:
+            texts: Input texts to tokenize
+            
+        Returns:
+            List of token lists, one per input text
+        """
+        if not texts:
+            return []
+        
+        # Distinct texts not in the cache, tokenized together in one pass
+        analyzed: dict[str, tuple] = {}
+        pending = []
+        with self._lock:
+            for text in texts:
+                if not text or text in analyzed:
+                    continue
+                tokens = self._cache.get(text) if len(text) <= self.cache_max_length else None
+                if tokens is not None:
+                    self._cache.move_to_end(text)
+                    self.cache_hits += 1
+                    analyzed[text] = tokens
+                else:
+                    analyzed[text] = ()
+                    pending.append(text)
+        
+        misses = 0
+        for text, tokens in zip(pending, tokenize_many(pending)):
+            tokens = tuple(map(sys.intern, tokens))
+            analyzed[text] = tokens
+            if len(text) <= self.cache_max_length:
+                misses += 1
+                self._remember(text, tokens)
+        with self._lock:
+            self.cache_misses += misses
+        
+        return [list(analyzed[text]) if text else [] for text in texts]
+    
+    def analyze_fields(self, columns: list[list[str]]) -> list[list[str]]:
+        """
+        Tokens of records made of several text fields.
+        
+        Each field column is analyzed on its own, so short or repeated field
+        values (brands, boilerplate descriptions) are reused. The result for a
+        record equals analyzing its fields joined by spaces.
+        
+        Args:
+            columns: Field columns of equal length, e.g. [titles, descriptions, brands]
+            
+        Returns:
+            List of token lists, one per record
+        """
+        if not columns:
+            return []
+        records = [[] for _ in range(len(columns[0]))]
+        for column in columns:
+            for tokens, field_tokens in zip(records, self.analyze_many(column)):
+                tokens.extend(field_tokens)
+        return records
+    
+    def cache_info(self) -> dict[str, float]:
+        """Cache size and hit rate (percent)"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self._cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': (self.cache_hits / lookups) * 100 if lookups else 0.0,
+        }
+    
+    def clear_cache(self):
+        """Drop all cached texts"""
+        with self._lock:
+            self._cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+    
+    def _remember(self, text: str, tokens: tuple):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
 def normalize_score(score: float, min_score: float, max_score: float) -> float:
     """
     Normalize score to 0-100 range.
@@ -120,6 +319,47 @@ def normalize_score(score: float, min_score: float, max_score: float) -> float:
     return max(0.0, min(100.0, normalized))
 
 
+def calculate_idf(doc_freq: int, total_docs: int) -> float:
+    """
+    Calculate the smoothed BM25 inverse document frequency of a term.
+    
+    Args:
+        doc_freq: Number of documents containing the term
+        total_docs: Total number of documents
+        
+    Returns:
+        IDF weight (always positive)
+    """
+    return math.log((total_docs - doc_freq + 0.5) / (doc_freq + 0.5) + 1.0)
+
+
+def calculate_bm25_term_score(
+    tf: int,
+    idf: float,
+    doc_length: int,
+    avg_doc_length: float,
+    k1: float = 1.5,
+    b: float = 0.75
+) -> float:
+    """
+    Calculate the BM25 contribution of a single term to a document score.
+    
+    Args:
+        tf: Frequency of the term in the document
+        idf: IDF weight of the term (see calculate_idf)
+        doc_length: Length of the document
+        avg_doc_length: Average document length in corpus
+        k1: Term frequency saturation parameter (default: 1.5)
+        b: Document length normalization parameter (default: 0.75)
+        
+    Returns:
+        BM25 term score
+    """
+    numerator = tf * (k1 + 1)
+    denominator = tf + k1 * (1 - b + b * (doc_length / avg_doc_length))
+    return idf * (numerator / denominator)
+
+
 def calculate_bm25_score(
     query_terms: list[str],
     doc_terms: list[str],
@@ -163,20 +403,12 @@ def calculate_bm25_score(
         if term not in doc_term_freq:
             continue
         
-        # Term frequency in document
-        tf = doc_term_freq[term]
-        
         # Document frequency (how many documents contain this term)
-        df = term_doc_freq.get(term, 0)
-        
-        # IDF calculation (with smoothing)
-        idf = math.log((total_docs - df + 0.5) / (df + 0.5) + 1.0)
-        
-        # BM25 formula
-        numerator = tf * (k1 + 1)
-        denominator = tf + k1 * (1 - b + b * (doc_length / avg_doc_length))
+        idf = calculate_idf(term_doc_freq.get(term, 0), total_docs)
         
-        score += idf * (numerator / denominator)
+        score += calculate_bm25_term_score(
+            doc_term_freq[term], idf, doc_length, avg_doc_length, k1, b
+        )
     
     return score
 